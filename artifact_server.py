@@ -0,0 +1,222 @@
+#*******************************************************************************
+#*
+#*    Shared artifact cache HTTP server
+#*
+#*        python3 artifact_server.py --root DIR [--bind ADDR] [--port PORT] [--token TOKEN]
+#*                                   [--policy KIND=MAX_SIZE[:MAX_AGE_DAYS]] ...
+#*
+#*    Stores entries uploaded by 'HttpArtifactCache' as '<root>/<kind>/<key>.tar'
+#*    and '<root>/<kind>/<key>.json'. If token is set (--token or
+#*    ARTIFACT_TOKEN), requests must carry it as 'Authorization: Bearer'
+#*    header. Without token, a server bound to non-loopback address is read
+#*    only. Archive uploads are streamed to temporary files and checked
+#*    against 'X-Content-SHA256' header, files are published by rename, so
+#*    concurrent uploads of the same entry are safe. Eviction policy is
+#*    applied per artifact kind after each upload.
+#*
+#*******************************************************************************
+
+import os
+import re
+import sys
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import http.server
+
+from remote import token_valid, loopback_address
+
+DEFAULT_PORT = 7480
+CHUNK_SIZE   = 1 << 20
+
+#-------------------------------------------------------------------------------
+class ArtifactHandler(http.server.BaseHTTPRequestHandler):
+
+    name_pattern = re.compile(r'^/(\w+)/([0-9a-f]{64})\.(tar|json)$')
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    #-----------------------------------------------------------------
+    def path_of(self):
+        m = self.name_pattern.match(self.path)
+        if not m:
+            self.send_error(404)
+            return None, None
+
+        return m.group(1), os.path.join(self.server.root, m.group(1), m.group(2) + '.' + m.group(3))
+
+    #-----------------------------------------------------------------
+    def authorized(self):
+        token = self.server.token
+        if not token:
+            return True
+
+        auth = self.headers.get('Authorization', '')
+        if auth.startswith('Bearer ') and token_valid(auth[len('Bearer '):], token):
+            return True
+
+        self.send_error(401)
+        return False
+
+    #-----------------------------------------------------------------
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    #-----------------------------------------------------------------
+    def do_GET(self, body=True):
+        if not self.authorized():
+            return
+
+        kind, path = self.path_of()
+        if not path:
+            return
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404)
+            return
+
+        with f:
+            os.utime(path)                              # recently used
+            self.send_response(200)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if body:
+                shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+
+    #-----------------------------------------------------------------
+    def do_PUT(self):
+        if not self.authorized():
+            return
+
+        if self.server.read_only:
+            self.send_error(403, 'uploads require token')
+            return
+
+        kind, path = self.path_of()
+        if not path:
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp  = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        h    = hashlib.sha256()
+        left = int(self.headers.get('Content-Length', 0))
+        try:
+            with open(tmp, 'wb') as f:
+                while left > 0:
+                    chunk = self.rfile.read(min(left, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    h.update(chunk)
+                    f.write(chunk)
+                    left -= len(chunk)
+
+            if left:
+                self.send_error(400, 'incomplete upload')
+                return
+
+            if path.endswith('.tar') and h.hexdigest() != self.headers.get('X-Content-SHA256'):
+                self.send_error(400, 'content hash mismatch')
+                return
+
+            if not os.path.exists(path):
+                os.replace(tmp, path)
+
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        self.server.evict(kind)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+#-------------------------------------------------------------------------------
+class ArtifactServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def __init__(self, addr, root, policy={}, verbose=False, token=''):
+        super().__init__(addr, ArtifactHandler)
+        self.root      = os.path.abspath(root)
+        self.policy    = policy
+        self.verbose   = verbose
+        self.token     = token
+        self.read_only = not token and not loopback_address(addr[0])
+        self.lock      = threading.Lock()
+
+    #-----------------------------------------------------------------
+    #
+    #    Entries (archive with meta) of 'kind' by LRU order are evicted
+    #    if older than max_age or until total size fits max_size
+    #
+    def evict(self, kind):
+        if kind not in self.policy:
+            return
+
+        max_size, max_age = self.policy[kind]
+        kdir = os.path.join(self.root, kind)
+        with self.lock:
+            entries = []
+            for fn in os.listdir(kdir):
+                if fn.endswith('.tar'):
+                    st = os.stat(os.path.join(kdir, fn))
+                    entries.append((st.st_mtime, st.st_size, fn[:-len('.tar')]))
+
+            entries.sort()
+            total  = sum([e[1] for e in entries])
+            oldest = time.time() - max_age*24*3600 if max_age else 0
+            for mtime, size, key in entries:
+                if mtime >= oldest and (not max_size or total <= max_size):
+                    break
+                for sfx in ['.json', '.tar']:
+                    try:
+                        os.remove(os.path.join(kdir, key + sfx))
+                    except OSError:
+                        pass
+                total -= size
+
+#-------------------------------------------------------------------------------
+def parse_size(text):
+    units = { 'K' : 1 << 10, 'M' : 1 << 20, 'G' : 1 << 30, 'T' : 1 << 40 }
+    if text and text[-1].upper() in units:
+        return int(float(text[:-1])*units[text[-1].upper()])
+
+    return int(text) if text else None
+
+#-------------------------------------------------------------------------------
+def main(argv):
+
+    parser = argparse.ArgumentParser(description='Shared artifact cache server')
+    parser.add_argument('--root',    required=True)
+    parser.add_argument('--bind',    default='127.0.0.1')
+    parser.add_argument('--port',    type=int, default=DEFAULT_PORT)
+    parser.add_argument('--token',   default=os.environ.get('ARTIFACT_TOKEN', ''))
+    parser.add_argument('--policy',  action='append', default=[], help='KIND=MAX_SIZE[:MAX_AGE_DAYS], e.g. ip=200G:30')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    policy = {}
+    for p in args.policy:
+        kind, limits = p.split('=')
+        size, _, age = limits.partition(':')
+        policy[kind] = (parse_size(size), float(age) if age else None)
+
+    server = ArtifactServer((args.bind, args.port), args.root, policy, args.verbose, args.token)
+    print('artifact server: serving ' + server.root + ' at ' + args.bind + ':' + str(server.server_address[1]) +
+          (', read only (no token)' if server.read_only else ''), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main(sys.argv[1:])
+
+#-------------------------------------------------------------------------------
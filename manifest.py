@@ -0,0 +1,228 @@
+#*******************************************************************************
+#*
+#*    Source manifest
+#*
+#*    Sources of a build variant classified once: source list configs are
+#*    read, listed files are dispatched by suffix into ordered sets of
+#*    interned absolute paths (synthesis and simulation HDL, constraints,
+#*    Tcl hooks, IP cores, BDs, HDL files given directly) and include
+#*    directories are collected without duplicates. Manifests are keyed by
+#*    build variant and source list and shared by project script
+#*    generation, simulation work library and HDL include scanner
+#*
+#*******************************************************************************
+
+import os
+import sys
+import threading
+
+import SCons.Util
+import SCons.Scanner
+
+from utils import *
+
+source_manifests      = {}              # { (<build variant>, <sources digest>) : SourceManifest }
+source_manifests_lock = threading.Lock()
+
+#-------------------------------------------------------------------------------
+class SourceManifestException(Exception):
+
+    def __init__(self, msg, rcode=-1):
+        self.msg   = msg
+        self.rcode = rcode
+
+#-------------------------------------------------------------------------------
+#
+#    Insertion ordered set of interned absolute paths
+#
+class OrderedPathSet:
+
+    def __init__(self, paths=[]):
+        self.items = {}
+        self.extend(paths)
+
+    def add(self, path):
+        self.items.setdefault(sys.intern(os.path.abspath(str(path))), None)
+
+    def extend(self, paths):
+        for p in paths:
+            self.add(p)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, path):
+        return os.path.abspath(str(path)) in self.items
+
+    def list(self):
+        return list(self.items)
+
+#-------------------------------------------------------------------------------
+#
+#    Path list construction variable: list or whitespace separated string
+#
+def path_list(value):
+
+    if SCons.Util.is_List(value):
+        return [str(v) for v in value]
+
+    return str(value).split()
+
+#-------------------------------------------------------------------------------
+#
+#    Include directories of INC_PATH: construction variables are expanded,
+#    '#' and relative paths are looked up as SCons does for scanners
+#
+def include_dirs(env, dir=None, target=None, source=None):
+    return [d.abspath for d in SCons.Scanner.FindPathDirs('INC_PATH')(env, dir, target, source)]
+
+#-------------------------------------------------------------------------------
+def source_paths(sources):
+    return [s.abspath if hasattr(s, 'abspath') else os.path.abspath(str(s)) for s in SCons.Util.flatten(sources)]
+
+#-------------------------------------------------------------------------------
+class SourceManifest:
+
+    def __init__(self, env, sources):
+        self.env     = env
+        self.sources = source_paths(sources)
+        self.cwd     = env.fs.getcwd()            # SConscript directory for relative INC_PATH items
+        self.built   = False
+        self.lock    = threading.Lock()
+
+        self.syn     = OrderedPathSet()
+        self.sim     = OrderedPathSet()
+        self.xdc     = OrderedPathSet()
+        self.tcl     = OrderedPathSet()
+        self.ip      = OrderedPathSet()
+        self.bd      = OrderedPathSet()
+        self.hdl     = OrderedPathSet()         # HDL files given directly, e.g. simulation sources
+        self.incpath = OrderedPathSet()
+
+    #-----------------------------------------------------------------
+    def dispatch(self):
+        env = self.env
+
+        sources = { env['CONFIG_SUFFIX']      : 'cfg',
+                    env['TOOL_SCRIPT_SUFFIX'] : 'tcl',
+                    env['IP_CORE_SUFFIX']     : 'ip',
+                    env['BD_SUFFIX']          : 'bd' }
+
+        items   = { env['V_SUFFIX']           : 'hdl',
+                    env['SV_SUFFIX']          : 'hdl',
+                    env['SV_HEADER_SUFFIX']   : 'hdl',
+                    env['SV_PACKAGE_SUFFIX']  : 'hdl' }
+        for sfx in path_list(env['CONSTRAINTS_SUFFIX']):
+            items[sfx] = 'xdc'
+
+        return sources, items
+
+    #-----------------------------------------------------------------
+    def build(self):
+        with self.lock:
+            if not self.built:
+                self.classify()
+                self.built = True
+
+        return self
+
+    #-----------------------------------------------------------------
+    def classify(self):
+        env = self.env
+        sources, items = self.dispatch()
+
+        self.incpath.extend(include_dirs(env, self.cwd))
+
+        for s in self.sources:
+            kind = sources.get(get_suffix(s))
+            if kind == 'ip':
+                self.ip.add(s)
+                continue
+
+            if kind == 'bd':
+                self.bd.add(s)
+                continue
+
+            if kind is None and items.get(get_suffix(s)) == 'hdl':
+                self.hdl.add(s)
+                self.incpath.add(os.path.dirname(s))
+                continue
+
+            try:
+                path = search_file(s, env['CFG_PATH'])
+
+            except SearchFileException as e:
+                raise SourceManifestException(e.msg)
+
+            kind = sources.get(get_suffix(path))
+            if kind == 'tcl':
+                self.tcl.add(path)
+
+            elif kind == 'cfg':
+                try:
+                    paths, used_in = read_sources(path, env['CFG_PATH'], True)
+
+                except SearchFileException as e:
+                    raise SourceManifestException(e.msg)
+
+                for item in paths:
+                    kind = items.get(get_suffix(item))
+                    if kind == 'hdl':
+                        if used_in == 'syn':
+                            self.syn.add(item)
+                        elif used_in == 'sim':
+                            self.sim.add(item)
+                        else:
+                            raise SourceManifestException('unsupported "use_in" value: "' + used_in + '" in ' + path, -2)
+                        self.incpath.add(os.path.dirname(item))
+
+                    elif kind == 'xdc':
+                        self.xdc.add(item)
+            else:
+                raise SourceManifestException('unsupported file type. Only \'yml\', \'tcl\' file types supported')
+
+#-------------------------------------------------------------------------------
+#
+#    Manifest of sources of build variant: registered by pseudo-builder when
+#    SConstruct is read, built on first use. Sources given as strings or
+#    nodes select the same manifest
+#
+def source_manifest(env, sources):
+
+    sources = source_paths(sources)
+    key     = (env['BUILD_VARIANT'], text_digest(sources))
+    with source_manifests_lock:
+        if key not in source_manifests:
+            source_manifests[key] = SourceManifest(env, sources)
+
+        return source_manifests[key]
+
+#-------------------------------------------------------------------------------
+def variant_manifests(env):
+
+    with source_manifests_lock:
+        return [m for (variant, digest), m in source_manifests.items() if variant == env['BUILD_VARIANT']]
+
+#-------------------------------------------------------------------------------
+#
+#    Scanner path function: include path of construction environment and
+#    directories of the variant HDL sources
+#
+def hdl_include_path(env, dir, target=None, source=None, argument=None):
+
+    incpath = SCons.Scanner.FindPathDirs('INC_PATH')(env, dir, target, source)
+    for manifest in variant_manifests(env):
+        try:
+            dirs = [env.Dir(d) for d in manifest.build().incpath]
+
+        except SourceManifestException:
+            continue                    # reported by the builder
+
+        incpath += tuple([d for d in dirs if d not in incpath])
+
+    return incpath
+
+#-------------------------------------------------------------------------------
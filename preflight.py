@@ -0,0 +1,325 @@
+#*******************************************************************************
+#*
+#*    Build graph pre-flight check
+#*
+#*        scons preflight [targets]
+#*
+#*    Tool pseudo-builders register checks of their inputs (configs, source
+#*    lists, include directories, BD scripts) for the targets they create.
+#*    If 'preflight' target is requested, nothing is built: other command
+#*    line targets (default targets if none) only select the checks. The
+#*    checks of all targets the selected ones depend on are run in parallel
+#*    and all found problems are reported at once
+#*
+#*******************************************************************************
+
+import os
+import re
+import time
+import yaml
+import concurrent.futures
+
+import SCons.Node
+
+from utils import *
+
+PREFLIGHT_JOBS  = 8                 # checks are I/O bound: run at least that many threads
+PREFLIGHT_ALIAS = 'preflight'
+
+preflight_checks = {}               # { <target node> : [PreflightCheck, ...] }
+preflight_alias  = None
+
+#-------------------------------------------------------------------------------
+class PreflightCheck:
+
+    def __init__(self, descr, func, args):
+        self.descr = descr
+        self.func  = func
+        self.args  = args
+        self.key   = (func, repr(args))
+
+    def run(self):
+        try:
+            return self.func(*self.args)
+
+        except SystemExit:
+            return [problem('check aborted, see messages above')]
+
+        except Exception as e:
+            return [problem('check failed: ' + type(e).__name__ + ': ' + str(e))]
+
+#-------------------------------------------------------------------------------
+#
+#    Problem is a pair of message and paths of missing file candidates,
+#    the problem is dropped if any of candidates is a target of a builder
+#
+def problem(msg):
+    return (msg, [])
+
+#-------------------------------------------------------------------------------
+def missing(msg, candidates):
+    return (msg, candidates)
+
+#-------------------------------------------------------------------------------
+#
+#    Called by tools on load: if pre-flight is requested, the only build
+#    target is alias which runs the checks. As targets are given on command
+#    line, Default() calls of SConstruct do not change build targets
+#
+def init_preflight():
+
+    global preflight_alias
+
+    if preflight_alias is not None or PREFLIGHT_ALIAS not in COMMAND_LINE_TARGETS:
+        return
+
+    env = Environment(tools=[])
+    preflight_alias = env.Alias(PREFLIGHT_ALIAS, [], run_preflight)
+    env.AlwaysBuild(preflight_alias)
+
+    BUILD_TARGETS[:] = preflight_alias
+
+#-------------------------------------------------------------------------------
+def preflight_enabled():
+    return preflight_alias is not None
+
+#-------------------------------------------------------------------------------
+#
+#    Register check 'func(*args)' for targets, 'func' returns list of problems
+#
+def preflight(env, targets, descr, func, *args):
+
+    if not preflight_enabled():
+        return
+
+    check = PreflightCheck(descr, func, args)
+    for t in env.arg2nodes(env.Flatten(targets), env.fs.Entry):
+        preflight_checks.setdefault(t, []).append(check)
+
+#-------------------------------------------------------------------------------
+#
+#    Raw (not evaluated) parameters of config for pseudo-builders in
+#    pre-flight mode, config problems are reported by the checks
+#
+def preflight_params(fn, param_sect='parameters'):
+
+    try:
+        cfg = load_yaml(search_file(fn))
+
+    except (SearchFileException, OSError, yaml.YAMLError):
+        return {}
+
+    if not isinstance(cfg, dict) or not isinstance(cfg.get(param_sect), dict):
+        return {}
+
+    return dict(cfg[param_sect])
+
+#-------------------------------------------------------------------------------
+def selected_nodes(env):
+
+    nodes = []
+    for t in [t for t in COMMAND_LINE_TARGETS if t != PREFLIGHT_ALIAS] or DEFAULT_TARGETS:
+        if isinstance(t, SCons.Node.Node):
+            nodes.append(t)
+            continue
+
+        node = None
+        for lookup in SCons.Node.arg2nodes_lookups:
+            node = lookup(t)
+            if node is not None:
+                break
+
+        nodes.append(node if node is not None else env.fs.Entry(t))
+
+    return nodes
+
+#-------------------------------------------------------------------------------
+def target_closure(nodes):
+
+    closure = set()
+    stack   = list(nodes)
+    while stack:
+        n = stack.pop()
+        if n in closure:
+            continue
+        closure.add(n)
+        stack.extend(n.children(scan=0))
+
+    return closure
+
+#-------------------------------------------------------------------------------
+def generated(env, path):
+    try:
+        return env.fs.Entry(path).has_builder()
+
+    except Exception:
+        return False
+
+#-------------------------------------------------------------------------------
+def run_preflight(target, source, env):
+
+    start = time.time()
+
+    nodes = selected_nodes(env)
+    if not nodes or [n for n in nodes if isinstance(n, SCons.Node.FS.Dir)]:
+        targets = list(preflight_checks)                # whole tree is selected
+    else:
+        targets = [n for n in target_closure(nodes) if n in preflight_checks]
+
+    checks = {}
+    for t in targets:
+        for c in preflight_checks[t]:
+            checks[c.key] = c
+    checks = list(checks.values())
+
+    jobs = max(GetOption('num_jobs'), PREFLIGHT_JOBS)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(lambda c: c.run(), checks))
+
+    count = 0
+    for check, problems in sorted(zip(checks, results), key=lambda x: x[0].descr):
+        problems = [msg for msg, candidates in problems if not [c for c in candidates if generated(env, c)]]
+        if not problems:
+            continue
+
+        print_error('E: ' + check.descr)
+        for msg in problems:
+            print_error('    ' + msg.replace(os.linesep, os.linesep + ' '*4))
+        count += len(problems)
+
+    summary = 'preflight: ' + str(len(checks)) + ' checks of ' + str(len(targets)) + ' targets, ' + \
+              '{:.2f}'.format(time.time() - start) + ' s, problems: ' + str(count)
+    if count:
+        print_error(summary)
+        return -1
+
+    print_success(summary)
+    return None
+
+#-------------------------------------------------------------------------------
+#
+#    Checks
+#
+#---------------------------------------------------------------------
+#
+#    Config file: imports, syntax, parameter section and evaluation
+#
+def check_config(fn, param_sect='parameters', search_path=[], suffix='yml'):
+
+    try:
+        path = search_file(fn)
+        config_imports(path, search_path + get_search_path(), suffix)
+        cfg = load_yaml(path)
+
+    except (SearchFileException, ConfigImportException) as e:
+        return [problem(e.msg)]
+
+    except yaml.YAMLError as e:
+        return [problem('syntax error: ' + str(e))]
+
+    if not isinstance(cfg, dict) or param_sect not in cfg:
+        return [problem('section "' + param_sect + '" not found in ' + path)]
+
+    try:
+        read_config(path, param_sect)
+
+    except SearchFileException as e:
+        return [problem(e.msg)]
+
+    return []
+
+#---------------------------------------------------------------------
+#
+#    Source list files: parameter substitutions and source paths,
+#    HDL sources are checked for unresolved includes
+#
+def check_src_lists(cfgs, search_path, inc_path, hdl_suffixes):
+
+    res     = []
+    sources = []
+    for fn in cfgs:
+        try:
+            path = search_file(fn, search_path)
+            cfg  = load_yaml(path)
+
+        except SearchFileException as e:
+            res.append(problem(e.msg))
+            continue
+
+        except yaml.YAMLError as e:
+            res.append(problem('syntax error: ' + str(e)))
+            continue
+
+        if not cfg:
+            continue
+
+        params = {}
+        if 'parameters' in cfg:
+            try:
+                params = read_config(path, 'parameters', search_path)
+            except SearchFileException as e:
+                res.append(problem(e.msg))
+
+        prefix_path = source_prefix_path(search_path)
+        for s in cfg.get('sources') or []:
+            p = re.search(r'\$(\w+)', s)
+            if p:
+                if p.group(1) not in params:
+                    res.append(problem('undefined substitution parameter "' + p.group(1) + '" in ' + path))
+                    continue
+                if not params[p.group(1)]:
+                    continue
+                s = s.replace('$' + p.group(1), params[p.group(1)])
+
+            candidates = [os.path.abspath(os.path.join(pp, s)) for pp in prefix_path]
+            found = [c for c in candidates if os.path.exists(c)]
+            if found:
+                sources.append(found[0])
+            elif not source_excluded(s):
+                res.append(missing('file at relative path "' + s + '" not exists, listed in ' + path, candidates))
+
+    hdl = [s for s in sources if get_suffix(s) in hdl_suffixes]
+
+    return res + check_hdl_includes(hdl, inc_path + get_dirs(hdl))
+
+#---------------------------------------------------------------------
+def check_hdl_files(files, inc_path, hdl_suffixes):
+
+    res = []
+    hdl = []
+    for f in files:
+        if not os.path.exists(f):
+            res.append(missing('source file "' + f + '" not exists', [f]))
+        elif get_suffix(f) in hdl_suffixes:
+            hdl.append(f)
+
+    return res + check_hdl_includes(hdl, inc_path + get_dirs(hdl))
+
+#---------------------------------------------------------------------
+def check_hdl_includes(files, inc_path):
+
+    pattern = r'^\s*`include\s+\"([\w\-\/]+\.s?vh)\"'
+
+    res = []
+    for f in files:
+        with open(f, errors='replace') as src:
+            includes = re.findall(pattern, src.read(), re.MULTILINE)
+
+        for i in includes:
+            candidates = [os.path.join(os.path.abspath(d), i) for d in [os.path.dirname(f)] + inc_path]
+            if not [c for c in candidates if os.path.exists(c)]:
+                res.append(missing('include file "' + i + '" not found, included in ' + f, candidates))
+
+    return res
+
+#---------------------------------------------------------------------
+def check_dirs(dirs, what):
+
+    res = []
+    for d in dirs:
+        if not os.path.isdir(d):
+            res.append(missing(what + ' "' + d + '" not exists', [d]))
+
+    return res
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,374 @@
+#*******************************************************************************
+#*
+#*    Remote execution of tool commands on build worker hosts
+#*
+#*    Worker agent:
+#*
+#*        python3 remote.py worker [--bind ADDR] [--port PORT] [--capacity N] [--token TOKEN]
+#*
+#*    Workers and the host running SCons share the file system (build tree
+#*    and tools are at the same paths). Protocol: JSON lines over TCP, one
+#*    request per connection. Requests carry shared token (REMOTE_TOKEN),
+#*    a worker bound to non-loopback address refuses to start without it
+#*
+#*        { "op" : "info" }  ->  { "capacity" : N, "busy" : n }
+#*        { "op" : "run", "argv" : [...], "wdir" : path, "env" : {...},
+#*          "files" : { path : text or null } }
+#*                           ->  { "out" : line } ... { "rc" : code } or { "error" : msg }
+#*
+#*    "files" holds contents of shipped (generated) files which are written
+#*    at worker if differ, only files under "wdir" are shipped; for inputs
+#*    (value is size) the worker checks that they are visible with the same
+#*    size
+#*
+#*******************************************************************************
+
+import os
+import sys
+import json
+import time
+import hmac
+import socket
+import socketserver
+import subprocess
+import threading
+import argparse
+import ipaddress
+
+DEFAULT_PORT    = 7471
+SHIP_SIZE_LIMIT = 1 << 20           # larger files are verified, not shipped
+RETRY_MIN       = 5                 # offline worker re-probe backoff, seconds
+RETRY_MAX       = 300
+
+#-------------------------------------------------------------------------------
+#
+#    Command could not be started remotely, it may be run elsewhere
+#
+class RemoteError(Exception):
+
+    def __init__(self, msg):
+        self.msg = msg
+
+#-------------------------------------------------------------------------------
+#
+#    Command was submitted to a worker and may still run there, so it must
+#    not be run again
+#
+class RemoteRunError(RemoteError):
+    pass
+
+#-------------------------------------------------------------------------------
+def token_valid(token, expected):
+    return hmac.compare_digest(str(token).encode('utf8'), expected.encode('utf8'))
+
+#-------------------------------------------------------------------------------
+def loopback_address(addr):
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(addr)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+#-------------------------------------------------------------------------------
+def path_under(path, root):
+    root = os.path.realpath(root)
+    path = os.path.realpath(path)
+
+    return path.startswith(root + os.sep)
+
+#-------------------------------------------------------------------------------
+def send_msg(wfile, msg):
+    wfile.write((json.dumps(msg) + '\n').encode('utf8'))
+    wfile.flush()
+
+#-------------------------------------------------------------------------------
+def recv_msg(rfile):
+    line = rfile.readline()
+    if not line:
+        return None
+
+    return json.loads(line.decode('utf8'))
+
+#-------------------------------------------------------------------------------
+#
+#    Worker agent
+#
+class WorkerHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        server = self.server
+        try:
+            req = recv_msg(self.rfile)
+        except ValueError:
+            return
+
+        if not req or not token_valid(req.get('token', ''), server.token):
+            send_msg(self.wfile, { 'error' : 'access denied' })
+            return
+
+        if req['op'] == 'info':
+            send_msg(self.wfile, { 'capacity' : server.capacity, 'busy' : server.busy })
+
+        elif req['op'] == 'run':
+            with server.slots:
+                server.busy += 1
+                try:
+                    self.run(req)
+                finally:
+                    server.busy -= 1
+        else:
+            send_msg(self.wfile, { 'error' : 'unknown operation: ' + str(req['op']) })
+
+    #-----------------------------------------------------------------
+    def run(self, req):
+        if not os.path.isdir(req['wdir']):
+            send_msg(self.wfile, { 'error' : 'working directory not available at worker: ' + req['wdir'] })
+            return
+
+        files   = req.get('files', {})
+        outside = [path for path, item in files.items() if isinstance(item, str) and not path_under(path, req['wdir'])]
+        if outside:
+            send_msg(self.wfile, { 'error' : 'shipped files outside working directory: ' + ', '.join(outside) })
+            return
+
+        missing = check_files(files)
+        if missing:
+            send_msg(self.wfile, { 'error' : 'inputs not available at worker: ' + ', '.join(missing) })
+            return
+
+        try:
+            p = subprocess.Popen(req['argv'],
+                                 cwd    = req['wdir'],
+                                 env    = req['env'],
+                                 stdin  = subprocess.DEVNULL,
+                                 stdout = subprocess.PIPE,
+                                 stderr = subprocess.STDOUT,
+                                 universal_newlines = True,
+                                 encoding = 'utf8',
+                                 errors   = 'replace')
+        except OSError as e:
+            send_msg(self.wfile, { 'error' : str(e) })
+            return
+
+        try:
+            for line in p.stdout:
+                send_msg(self.wfile, { 'out' : line })
+            send_msg(self.wfile, { 'rc' : p.wait() })
+
+        except OSError:                     # dispatcher is gone
+            p.kill()
+            p.wait()
+
+#-------------------------------------------------------------------------------
+def check_files(files):
+    missing = []
+    for path, item in files.items():
+        if isinstance(item, str):
+            try:
+                with open(path) as f:
+                    if f.read() == item:
+                        continue
+            except (OSError, UnicodeDecodeError):
+                pass
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'w') as f:
+                    f.write(item)
+            except OSError:
+                missing.append(path)
+
+        elif not os.path.exists(path) or (item is not None and os.path.getsize(path) != item):
+            missing.append(path)
+
+    return missing
+
+#-------------------------------------------------------------------------------
+class WorkerServer(socketserver.ThreadingTCPServer):
+
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self, addr, capacity, token=''):
+        super().__init__(addr, WorkerHandler)
+        self.capacity = capacity
+        self.token    = token
+        self.busy     = 0
+        self.slots    = threading.BoundedSemaphore(capacity)
+
+#-------------------------------------------------------------------------------
+#
+#    Dispatcher: spreads commands over workers respecting their capacity
+#
+class RemoteWorker:
+
+    def __init__(self, spec):
+        fields        = spec.split(':')
+        self.host     = fields[0]
+        self.port     = int(fields[1]) if len(fields) > 1 and fields[1] else DEFAULT_PORT
+        self.capacity = int(fields[2]) if len(fields) > 2 else None
+        self.busy     = 0
+        self.online   = True
+        self.backoff  = 0
+        self.retry_at = 0
+
+    def __str__(self):
+        return self.host + ':' + str(self.port)
+
+    #-----------------------------------------------------------------
+    def set_online(self, online):
+        self.online = online
+        if online:
+            self.backoff = 0
+        else:
+            self.backoff  = min(max(2*self.backoff, RETRY_MIN), RETRY_MAX)
+            self.retry_at = time.time() + self.backoff
+
+#-------------------------------------------------------------------------------
+class RemoteDispatcher:
+
+    def __init__(self, workers, token='', timeout=10):
+        self.workers = [RemoteWorker(w) for w in workers]
+        self.token   = token
+        self.timeout = timeout
+        self.cond    = threading.Condition()
+        self.probed  = False
+
+    #-----------------------------------------------------------------
+    def request(self, worker, msg):
+        sock = socket.create_connection((worker.host, worker.port), self.timeout)
+        sock.settimeout(None)
+        msg  = dict(msg, token=self.token)
+        wfile = sock.makefile('wb')
+        rfile = sock.makefile('rb')
+        send_msg(wfile, msg)
+
+        return sock, rfile
+
+    #-----------------------------------------------------------------
+    #
+    #    Workers without capacity specified are probed at first use, offline
+    #    workers are probed again after backoff time
+    #
+    def probe(self):
+        if not self.probed:
+            workers = [w for w in self.workers if w.capacity is None]
+            self.probed = True
+        else:
+            now     = time.time()
+            workers = [w for w in self.workers if not w.online and w.retry_at <= now]
+
+        for w in workers:
+            try:
+                sock, rfile = self.request(w, { 'op' : 'info' })
+                with sock:
+                    info = recv_msg(rfile)
+                if w.capacity is None:
+                    w.capacity = info['capacity']
+                w.set_online(True)
+            except (OSError, ValueError, KeyError, TypeError):
+                w.set_online(False)
+
+    #-----------------------------------------------------------------
+    def acquire(self):
+        with self.cond:
+            self.probe()
+            while True:
+                online = [w for w in self.workers if w.online and w.capacity]
+                if not online:
+                    raise RemoteError('no remote workers available')
+                free = [w for w in online if w.busy < w.capacity]
+                if free:
+                    w = min(free, key=lambda w: w.busy/w.capacity)   # least loaded
+                    w.busy += 1
+                    return w
+                self.cond.wait()
+
+    #-----------------------------------------------------------------
+    def release(self, worker, online=True):
+        with self.cond:
+            worker.busy -= 1
+            if not online:
+                worker.set_online(False)
+            self.cond.notify_all()
+
+    #-----------------------------------------------------------------
+    #
+    #    Run command at a free worker, 'callback' gets output lines.
+    #    Raises RemoteError if the command could not be started remotely,
+    #    RemoteRunError if connection is lost after the command was sent.
+    #    Only connection failures are retried at another worker
+    #
+    def run(self, argv, wdir, env, files=[], callback=print):
+        manifest = {}
+        for path in files:
+            path = os.path.abspath(str(path))
+            try:
+                size = os.path.getsize(path)
+                manifest[path] = size
+                if size <= SHIP_SIZE_LIMIT and path_under(path, wdir):
+                    with open(path) as f:
+                        manifest[path] = f.read()
+
+            except UnicodeDecodeError:
+                pass
+
+            except OSError as e:
+                raise RemoteError('command input not available: ' + path + ' (' + str(e.strerror) + ')')
+
+        msg = { 'op' : 'run', 'argv' : argv, 'wdir' : os.path.abspath(str(wdir)), 'env' : dict(env), 'files' : manifest }
+
+        while True:
+            worker = self.acquire()
+            try:
+                sock, rfile = self.request(worker, msg)
+            except OSError:
+                self.release(worker, online=False)         # try another worker
+                continue
+
+            try:
+                with sock:
+                    while True:
+                        reply = recv_msg(rfile)
+                        if reply is None:
+                            raise OSError('connection to worker ' + str(worker) + ' lost')
+                        if 'out' in reply:
+                            callback(reply['out'])
+                        elif 'rc' in reply:
+                            self.release(worker)
+                            return reply['rc']
+                        else:
+                            self.release(worker)
+                            raise RemoteError('worker ' + str(worker) + ': ' + reply.get('error', 'bad reply'))
+
+            except (OSError, ValueError) as e:
+                self.release(worker, online=False)
+                raise RemoteRunError(str(e))                 # command may still run at the worker
+
+#-------------------------------------------------------------------------------
+def main(argv):
+
+    parser = argparse.ArgumentParser(description='Build worker agent')
+    parser.add_argument('mode',       choices=['worker'])
+    parser.add_argument('--bind',     default='127.0.0.1')
+    parser.add_argument('--port',     type=int, default=DEFAULT_PORT)
+    parser.add_argument('--capacity', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--token',    default=os.environ.get('REMOTE_TOKEN', ''))
+    args = parser.parse_args(argv)
+
+    if not args.token and not loopback_address(args.bind):
+        print('worker: token is required to listen at non-loopback address ' + args.bind +
+              ' (--token or REMOTE_TOKEN)', file=sys.stderr)
+        return 2
+
+    server = WorkerServer((args.bind, args.port), args.capacity, args.token)
+    print('worker: listening at ' + args.bind + ':' + str(server.server_address[1]) +
+          ', capacity: ' + str(args.capacity), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------
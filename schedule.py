@@ -0,0 +1,196 @@
+#*******************************************************************************
+#*
+#*    Critical path aware scheduling of build actions
+#*
+#*    Duration of each executed build task is recorded per target into the
+#*    history file. On the next builds the Taskmaster visits children of a
+#*    node in order of the longest historical path below them, so under '-j'
+#*    long chains (e.g. HLS module -> IP -> project synthesis) are started
+#*    first. At exit the report shows predicted (from history) and actual
+#*    makespan of executed actions
+#*
+#*******************************************************************************
+
+import os
+import json
+import time
+import atexit
+import threading
+
+import SCons.Node
+import SCons.Node.FS
+import SCons.Taskmaster
+import SCons.Script.Main
+
+from utils import *
+
+SCHEDULE_HISTORY_WEIGHT = 0.5           # weight of the last run in the duration estimate
+SCHEDULE_REPORT_MIN     = 10            # actual makespan, s, from which the report is printed
+SCHEDULE_RECORD_MIN     = 0.1           # shorter actions are not added to the history
+
+#-------------------------------------------------------------------------------
+class BuildSchedule:
+
+    def __init__(self):
+        self.path     = None
+        self.history  = {}              # { <target path> : { 'time' : <s>, 'tool' : <s> } }
+        self.records  = {}              # executed in this build: { <target path> : (start, end, tool time, node) }
+        self.priority = {}
+        self.lock     = threading.Lock()
+
+    #-----------------------------------------------------------------
+    def open(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.history = json.load(f)
+        except (OSError, ValueError):
+            self.history = {}
+
+        atexit.register(self.close)
+
+    #-----------------------------------------------------------------
+    def close(self):
+        if not self.records:
+            return
+
+        self.report()
+
+        for key, (start, end, tool, node) in self.records.items():
+            prev = self.history.get(key)
+            dt   = end - start
+            if not prev and dt < SCHEDULE_RECORD_MIN:
+                continue
+            if prev:
+                w  = SCHEDULE_HISTORY_WEIGHT
+                dt = w*dt + (1 - w)*prev['time']
+            self.history[key] = { 'time' : round(dt, 3), 'tool' : round(tool, 3) }
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_if_changed(self.path, json.dumps(self.history, indent=1, sort_keys=True))
+        except OSError as e:
+            print_warning('W: build schedule: unable to save duration history: ' + str(e))
+
+    #-----------------------------------------------------------------
+    def duration(self, node):
+        item = self.history.get(node_key(node))
+        return item['time'] if item else 0
+
+    #-----------------------------------------------------------------
+    #
+    #    Longest historical path from leaves to the node including it
+    #
+    def path_length(self, node):
+        if node in self.priority:
+            return self.priority[node]
+
+        self.priority[node] = 0                     # guards against cycles
+        children = node.children(scan=0)
+        longest  = max([self.path_length(c) for c in children]) if children else 0
+        self.priority[node] = self.duration(node) + longest
+
+        return self.priority[node]
+
+    #-----------------------------------------------------------------
+    #
+    #    Taskmaster pops the last candidate first
+    #
+    def order(self, nodes):
+        if not self.history:
+            return nodes
+
+        return sorted(nodes, key=self.path_length)
+
+    #-----------------------------------------------------------------
+    #
+    #    Runs in Job worker thread, tool run time of the task is
+    #    accumulated by 'pexec'
+    #
+    def execute(self, task, execute):
+        pexec_time.total = 0
+        start = time.time()
+        try:
+            execute(task)
+        finally:
+            end  = time.time()
+            tool = pexec_time.total
+            pexec_time.total = None
+            with self.lock:
+                for t in task.targets:
+                    self.records[node_key(t)] = (start, end, tool, t)
+
+    #-----------------------------------------------------------------
+    def report(self):
+        start    = min([r[0] for r in self.records.values()])
+        end      = max([r[1] for r in self.records.values()])
+        makespan = end - start
+        if makespan < SCHEDULE_REPORT_MIN:
+            return
+
+        jobs   = GetOption('num_jobs')
+        nodes  = set([r[3] for r in self.records.values()])
+        est    = {}
+        known  = 0
+
+        def predicted_path(node):
+            if node not in est:
+                est[node] = 0
+                children  = [c for c in node.children(scan=0) if c in nodes]
+                longest   = max([predicted_path(c) for c in children]) if children else 0
+                est[node] = self.duration(node) + longest
+            return est[node]
+
+        for n in nodes:
+            if node_key(n) in self.history:
+                known += 1
+
+        tasks     = set([(r[0], r[1]) for r in self.records.values()])
+        total     = sum([self.duration(n) for n in nodes])
+        critical  = max([predicted_path(n) for n in nodes])
+        predicted = max(critical, total/jobs)
+
+        print_info('build schedule: jobs: ' + str(jobs) + ', actions: ' + str(len(tasks)) +
+                   ', with history: ' + str(known) + '/' + str(len(nodes)) + ' targets')
+        print_info('    makespan predicted: ' + '{:.1f}'.format(predicted) + ' s' +
+                   ' (critical path: ' + '{:.1f}'.format(critical) + ' s)' +
+                   ', actual: ' + '{:.1f}'.format(makespan) + ' s')
+
+        longest = sorted(self.records.items(), key=lambda r: r[1][0] - r[1][1])[:3]
+        for key, (s, e, tool, node) in longest:
+            print_info('    ' + '{:8.1f}'.format(e - s) + ' s' + ' (tool: ' + '{:.1f}'.format(tool) + ' s) ' + str(node))
+
+#-------------------------------------------------------------------------------
+def node_key(node):
+    if isinstance(node, SCons.Node.FS.Base):
+        return node.get_abspath()
+
+    return node.__class__.__name__ + ':' + str(node)
+
+#-------------------------------------------------------------------------------
+build_schedule = BuildSchedule()
+
+#-------------------------------------------------------------------------------
+#
+#    Called by tools on load, the first call installs the hooks
+#
+def init_schedule(history_path):
+
+    if build_schedule.path is not None:
+        return
+
+    build_schedule.open(history_path)
+
+    tm_init = SCons.Taskmaster.Taskmaster.__init__
+    def taskmaster_init(self, targets=[], tasker=None, order=None, trace=None):
+        base = order if order else lambda l: l
+        targets = sorted(targets, key=build_schedule.path_length, reverse=True) if build_schedule.history else targets
+        tm_init(self, targets, tasker, lambda nodes: build_schedule.order(base(nodes)), trace)
+    SCons.Taskmaster.Taskmaster.__init__ = taskmaster_init
+
+    task_execute = SCons.Script.Main.BuildTask.execute
+    def execute(self):
+        build_schedule.execute(self, task_execute)
+    SCons.Script.Main.BuildTask.execute = execute
+
+#-------------------------------------------------------------------------------
@@ -8,11 +8,24 @@
 
 import os
 import re
+import json
+import time
+import zlib
+import shutil
+import concurrent.futures
 
 import SCons.Builder
 import SCons.Scanner
 
 from utils import *
+from site_scons.site_tools.vivado.cache import artifact_cache
+from preflight import init_preflight, preflight, check_hdl_files, check_dirs
+from schedule  import init_schedule
+from manifest  import OrderedPathSet, path_list, source_manifest, SourceManifestException
+
+WORKLIB_COMPILE_HISTORY = 20           # compile time records kept
+
+vopt_snapshots = {}                    # { <sim build path> : { <snapshot name> : snapshot node } }
 
 #-------------------------------------------------------------------------------
 #
@@ -29,6 +42,18 @@ def simlib(target, source, env):
 
     print_action('compile sim libraries at:  \'' + trg_path + '\'')
 
+    #-------------------------------------------------------
+    #
+    #   Restore compiled libraries from cache
+    #
+    cache  = artifact_cache(env, 'simlib') if env['SIMLIB_CACHE'] else None
+    trees  = { 'simlib' : trg_path }
+    digest = simlib_digest(do_files, env) if cache else None
+    meta   = cache.meta(digest) if cache and cache.contains(digest) else None
+    if meta and cache.restore(digest, trees, { meta['simlib_path'] : trg_path }):
+        print_info('restore sim libraries from cache')
+        return None
+
     if not os.path.exists(trg_path):
         print_info('create root simlib directory')
         Execute( Mkdir(trg_path) )
@@ -61,12 +86,17 @@ def simlib(target, source, env):
             for item in cmd_list:
                 cmd = item.replace('\\\n', ' ')
                 cmd = cmd.replace('"', '')
-                rcode = pexec(cmd, trg_path, exec_env=env['ENV'])
+                rcode = pexec(cmd, trg_path, exec_env=env['ENV'], remote=remote_backend(env))
                 if rcode:
                     Execute( Delete(trg_path) )
                     return rcode
                 print('-'*80)
 
+    if cache:
+        meta = { 'simlib_path'     : trg_path,
+                 'sim_script_path' : env['SIM_SCRIPT_PATH'] }
+        cache.store(digest, trees, meta)
+
     return None
     
 #-------------------------------------------------------------------------------
@@ -77,6 +107,15 @@ def work_lib(target, source, env):
     trg_dir  = str(trg.dir)
     
     simlibs = simlib_list(env['SIMLIB_PATH'])
+
+    try:
+        manifest = source_manifest(env, source).build()
+
+    except SourceManifestException as e:
+        print_error('E: ' + e.msg)
+        print_error('    while running "CompileWorkLib" builder')
+        return e.rcode
+
     #-----------------------------------------------------------------
     #
     #   Create work library
@@ -99,21 +138,20 @@ def work_lib(target, source, env):
     #
     #   Create handoff file
     #
+    glbl = []
     if 'vivado' in env['TOOLS']:
-        glbl_path = File(os.path.join(env['XILINX_VIVADO'], 'data/verilog/src/glbl.v'))
-        source.append(glbl_path)
+        glbl = [os.path.join(env['XILINX_VIVADO'], 'data/verilog/src/glbl.v')]
      
     # simlib stuff
-    lib_opt = ''
-    if simlibs.keys():
-        lib_opt  += ' -L ' +' -L '.join(simlibs.keys())
-        
+    lib_opt = simlib_opt(env)
+
     hdl_wrappers  = glob.glob(os.path.join(env['BUILD_SYN_PATH'], env['VIVADO_PROJECT_NAME'] + '.gen', 'sources_1/bd/*/hdl/*_wrapper*'), recursive=True)
     hdl_wrappers += glob.glob(os.path.join(env['BUILD_SYN_PATH'], env['VIVADO_PROJECT_NAME'] + '.srcs', 'sources_1/**/hdl/*_wrapper*'), recursive=True)   # '<name>_sim_wrapper.v' support 
                                                                                                                                                           # for Versal NoC Simulation
     # source files and other options
-    src_list = ' '.join(['{' + os.path.join(f.abspath) + '}' for f in source] + hdl_wrappers)
-    incpath  = ' '.join(env['SIM_INC_PATH'])
+    files    = OrderedPathSet(manifest.hdl.list() + glbl + hdl_wrappers).list()
+    src_list = ' '.join(['{' + f + '}' for f in files])
+    incpath  = ' '.join(path_list(env['SIM_INC_PATH']))
     
     out = ''
 
@@ -125,34 +163,71 @@ def work_lib(target, source, env):
     out += 'set VLOG_FLAGS {' + env['VLOG_FLAGS'] + '}'           + os.linesep
     out += 'set VOPT_FLAGS {' + env['VOPT_FLAGS'] + lib_opt + '}' + os.linesep
     out += 'set VSIM_FLAGS {' + env['VSIM_FLAGS'] + '}'           + os.linesep
+    out += handoff_text(sim_log_settings(env))
     
     handoff_path = os.path.join( str(trg.dir), 'handoff.do')
-    with open(handoff_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(handoff_path, out)
         
     #-----------------------------------------------------------------
     #
     #   Compile work library
     #
-    cmd  = env['QUESTASIM'] + ' -c'
-    cmd += ' -do ' + env['SIM_CMD_SCRIPT']
-    cmd += ' -do c'      
-    cmd += ' -do exit'
-
-    print(cmd)
-    msg = colorize('Compile project work library', 'yellow')
+    msg   = colorize('Compile project work library', 'yellow')
     print(colorize('-'*80, 'yellow'))
     print(' '*20, msg, os.linesep)
-    rcode = pexec(cmd, trg_dir, exec_env=env['ENV'], filter=env['VOPT_FILTER_RULES'])
+
+    start = time.time()
+    if vlog_partitioned(env):
+        rcode, stages = compile_worklib_partitioned(env, trg_path, trg_dir, files, lib_opt)
+    else:
+        cmd  = env['QUESTASIM'] + ' -c'
+        cmd += ' -do ' + env['SIM_CMD_SCRIPT']
+        cmd += ' -do c'
+        cmd += ' -do exit'
+
+        print(cmd)
+        update_worklib_manifest(env, trg_dir, { env['SIM_WORKLIB_NAME'] : files })
+        rcode  = pexec(cmd, trg_dir, exec_env=env['ENV'], filter=env['VOPT_FILTER_RULES'])
+        stages = {}
+
     print(colorize('-'*80, 'yellow'))
     if rcode:
         return rcode
-                
+
+    record_worklib_compile_time(env, trg_dir, len(files), time.time() - start, stages)
+
+    return None
+
+#-------------------------------------------------------------------------------
+#
+#    Named optimized design 'opt_<testbench>_<snapshot>' is built from the
+#    compiled work library with its own vopt flags, target is stamp file
+#    holding vopt command
+#
+def vopt_snapshot(target, source, env):
+
+    trg     = target[0]
+    trg_dir = str(trg.dir)
+    name    = env['SNAPSHOT_NAME']
+    flags   = env['VOPT_SNAPSHOTS'][name]
+
+    cmd = vopt_command(env, trg_dir, simlib_opt(env), snapshot_design_name(env, name), ' ' + flags.strip())
+
+    print_info('optimize design snapshot: \'' + name + '\'')
+    print(cmd)
+    rcode = pexec(cmd, trg_dir, exec_env=env['ENV'], filter=env['VOPT_FILTER_RULES'])
+    if rcode:
+        return rcode
+
+    with open(str(trg), 'w') as f:
+        f.write(cmd + os.linesep)
+
     return None
 
 #-------------------------------------------------------------------------------
 def questa_gui(target, source, env):
-    cmd = env['QUESTASIM'] + ' -do ' + env['SIM_CMD_SCRIPT']
+    update_handoff(env, sim_log_settings(env, gui=True))
+    cmd = env['QUESTASIM'] + snapshot_do(env) + ' -do ' + env['SIM_CMD_SCRIPT']
     print(cmd)
     env.Execute('cd ' + env['BUILD_SIM_PATH'] + ' && ' + cmd)
     
@@ -160,7 +235,8 @@ def questa_gui(target, source, env):
     
 #-------------------------------------------------------------------------------
 def questa_run(target, source, env):
-    cmd = env['QUESTASIM'] + ' -batch ' + ' -do ' + env['SIM_CMD_SCRIPT'] + ' -do run_sim'
+    update_handoff(env, sim_log_settings(env))
+    cmd = env['QUESTASIM'] + ' -batch ' + snapshot_do(env) + ' -do ' + env['SIM_CMD_SCRIPT'] + ' -do run_sim'
     print(cmd)
     rcode = env.Execute('cd ' + env['BUILD_SIM_PATH'] + ' && ' + cmd)
     print('-'*80)
@@ -174,6 +250,78 @@ def questa_run(target, source, env):
 #    Helper functions
 #
 
+#-------------------------------------------------------------------------------
+#
+#    Waveform logging settings passed to 'questa.tcl' via handoff file.
+#    Interactive sessions always log all signals without WLF limits
+#
+SIM_LOG_POLICIES = ['none', 'top', 'list', 'full']
+
+def sim_log_settings(env, gui=False):
+
+    policy = env['SIM_LOG_POLICY']
+    if policy not in SIM_LOG_POLICIES:
+        print_error('E: invalid SIM_LOG_POLICY value "' + policy + '", must be one of: ' + ', '.join(SIM_LOG_POLICIES))
+        Exit(-1)
+
+    signals = env['SIM_LOG_SIGNALS'] if SCons.Util.is_List(env['SIM_LOG_SIGNALS']) else [env['SIM_LOG_SIGNALS']]
+    if policy == 'list' and not signals:
+        print_warning('W: SIM_LOG_POLICY is "list" but SIM_LOG_SIGNALS is empty, no signals are logged')
+
+    wlf = ' -wlfcompress' if env['SIM_WLF_COMPRESS'] else ' -nowlfcompress'
+    if gui:
+        policy = 'full'
+    else:
+        if env['SIM_WLF_SIZE_LIMIT']:
+            wlf += ' -wlfslim ' + str(env['SIM_WLF_SIZE_LIMIT'])
+        if env['SIM_WLF_TIME_LIMIT']:
+            wlf += ' -wlftlim {' + env['SIM_WLF_TIME_LIMIT'] + '}'
+
+    return { 'LOG_POLICY'  : policy,
+             'LOG_SIGNALS' : ' '.join(['{' + s + '}' for s in signals]),
+             'WLF_FLAGS'   : wlf }
+
+#-------------------------------------------------------------------------------
+def handoff_text(items):
+    return ''.join(['set ' + name + ' {' + items[name] + '}' + os.linesep for name in items])
+
+#-------------------------------------------------------------------------------
+#
+#    Replace run settings in the handoff file written at work library compile
+#
+def update_handoff(env, items):
+
+    path = os.path.join(env['BUILD_SIM_PATH'], 'handoff.do')
+    if not os.path.exists(path):
+        return
+
+    with open(path) as f:
+        lines = f.read().splitlines(True)
+
+    lines = [l for l in lines if l.split()[1:2] not in [[name] for name in items]]
+    write_if_changed(path, ''.join(lines) + handoff_text(items))
+
+#-------------------------------------------------------------------------------
+def snapshot_design_name(env, name):
+    return 'opt_' + env['TESTBENCH_NAME'] + '_' + name
+
+#-------------------------------------------------------------------------------
+#
+#    Simulation is started from the snapshot selected by SIM_SNAPSHOT,
+#    empty value selects design optimized at work library compile
+#
+def snapshot_do(env):
+
+    name = env['SIM_SNAPSHOT']
+    if not name:
+        return ''
+
+    if name not in env['VOPT_SNAPSHOTS']:
+        print_error('E: simulation snapshot "' + name + '" is not defined in VOPT_SNAPSHOTS')
+        Exit(-1)
+
+    return ' -do "quietly set OPT_DESIGN_NAME ' + snapshot_design_name(env, name) + '"'
+
 #-------------------------------------------------------------------------------
 def vmap_vendor_libs(env, trg_dir):
 
@@ -205,6 +353,277 @@ def vmap_simlib(env, libpath, trg_dir):
     rcode = pexec(cmd, trg_dir, exec_env=env['ENV'])                               # map logical name to physical lib
     return rcode
           
+#-------------------------------------------------------------------------------
+#
+#    Partitioned work library compile
+#
+#    Files defining packages and top level units (testbench and units named
+#    in VOPT_FLAGS, e.g. 'glbl') are compiled in package dependency order
+#    into the work library. Other files are spread over VLOG_JOBS partition
+#    libraries '<work lib>_p<N>' by path hash (a file stays in its library
+#    between builds), partitions are compiled by concurrent vlog processes,
+#    each one writes its own library, so no library locking is needed.
+#    vopt is run once with the partition libraries as '-L' search libraries
+#
+def sv_design_units(path):
+
+    with open(path, errors='replace') as f:
+        text = re.sub(r'//[^\n]*|/\*.*?\*/', '', f.read(), flags=re.S)
+
+    pkgs  = re.findall(r'^\s*package\s+(?:automatic\s+|static\s+)?(\w+)\s*;', text, re.M)
+    refs  = set(re.findall(r'\b(\w+)::', text)) - set(pkgs)
+    units = re.findall(r'^\s*(?:module|interface|program)\s+(?:automatic\s+|static\s+)?(\w+)', text, re.M)
+
+    return pkgs, refs, units
+
+#-------------------------------------------------------------------------------
+def vopt_top_units(env):
+
+    units = [t for t in env['VOPT_FLAGS'].split() if t[0] not in '-+']
+
+    return set(units + [env['TESTBENCH_NAME']])
+
+#-------------------------------------------------------------------------------
+def worklib_partitions(files, top_units, jobs):
+
+    design = {}
+    for f in files:
+        design[f] = sv_design_units(f) if os.path.exists(f) else ([], set(), [])
+
+    owner = {}
+    for f in files:
+        for p in design[f][0]:
+            owner[p] = f
+
+    main = []
+    def visit(f, chain):
+        if f in main or f in chain:
+            return
+        for p in sorted(design[f][1]):
+            if p in owner:
+                visit(owner[p], chain + [f])
+        main.append(f)
+
+    for f in files:
+        if design[f][0] or set(design[f][2]) & top_units:
+            visit(f, [])
+
+    parts = [[] for i in range(jobs)]
+    for f in files:
+        if f not in main:
+            parts[zlib.crc32(f.encode('utf8')) % jobs].append(f)
+
+    return main, parts
+
+#-------------------------------------------------------------------------------
+#
+#    Library which lost some of its files since the previous compile is
+#    recreated, otherwise stale design units would be found by vopt.
+#    Partition libraries not used anymore are deleted
+#
+def read_worklib_manifest(env, trg_dir):
+
+    path = os.path.join(trg_dir, env['SIM_WORKLIB_NAME'] + '-manifest.json')
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+#-------------------------------------------------------------------------------
+def update_worklib_manifest(env, trg_dir, libs):
+
+    prev  = read_worklib_manifest(env, trg_dir)
+    stale = []
+    for name in prev:
+        if name not in libs:
+            print_info('remove library: \'' + name + '\'')
+            pexec(env['VMAPCOM'] + ' -del ' + name, trg_dir, exec_env=env['ENV'])
+            shutil.rmtree(os.path.join(trg_dir, name), ignore_errors=True)
+        elif not set(prev[name]) <= set(libs[name]):
+            stale.append(name)
+
+    path = os.path.join(trg_dir, env['SIM_WORKLIB_NAME'] + '-manifest.json')
+    write_if_changed(path, json.dumps(libs, indent=1))
+
+    return stale
+
+#-------------------------------------------------------------------------------
+#
+#    vopt command: partition libraries of the work library (if any) are
+#    passed as search libraries
+#
+def vopt_command(env, trg_dir, lib_opt, out_name, flags=''):
+
+    wlib = env['SIM_WORKLIB_NAME']
+    libs = [name for name in read_worklib_manifest(env, trg_dir) if name != wlib]
+
+    cmd  = env['VOPTCOM'] + ' -work ' + wlib + env['VOPT_FLAGS'] + flags + lib_opt
+    cmd += ''.join([' -L ' + name for name in libs])
+    cmd += ' ' + env['TESTBENCH_NAME'] + ' -o ' + out_name
+
+    return cmd
+
+#-------------------------------------------------------------------------------
+def simlib_opt(env):
+
+    simlibs = simlib_list(env['SIMLIB_PATH'])
+    if not simlibs:
+        return ''
+
+    return ' -L ' + ' -L '.join(simlibs.keys())
+
+#-------------------------------------------------------------------------------
+#
+#    Partitioned compile runs separate vlog calls, while with '-mfcu' macros
+#    defined in one file are visible in all files of the same vlog call: such
+#    sources may fail to compile in partitions, so single compile is used
+#
+def vlog_partitioned(env):
+
+    if env['VLOG_JOBS'] <= 1:
+        return False
+
+    if '-mfcu' in env['VLOG_FLAGS'].split():
+        print_warning('W: VLOG_JOBS ignored: partitioned compile is not supported with \'-mfcu\' in VLOG_FLAGS,')
+        print_warning('   macros would not be visible across partitions. Remove \'-mfcu\' to compile in partitions')
+        return False
+
+    return True
+
+#-------------------------------------------------------------------------------
+def compile_worklib_partitioned(env, trg_path, trg_dir, files, lib_opt):
+
+    wlib  = env['SIM_WORKLIB_NAME']
+    jobs  = env['VLOG_JOBS']
+    main, parts = worklib_partitions(files, vopt_top_units(env), jobs)
+
+    libs  = { wlib : main }
+    for i, p in enumerate(parts):
+        if p:
+            libs[wlib + '_p' + str(i)] = p
+
+    stale = update_worklib_manifest(env, trg_dir, libs)
+    for name in libs:
+        lib_path = os.path.join(trg_dir, name)
+        if name in stale:
+            print_info('recreate library: \'' + name + '\'')
+            shutil.rmtree(lib_path, ignore_errors=True)
+        if not os.path.exists(lib_path):
+            rcode = pexec(env['VLIBCOM'] + ' ' + name, trg_dir, exec_env=env['ENV'])
+            if rcode: return rcode, {}
+            if name != wlib:
+                rcode = vmap_simlib(env, os.path.abspath(lib_path), trg_dir)
+                if rcode: return rcode, {}
+
+    incdirs = sorted(OrderedPathSet(get_dirs(files) + [env['CFG_PATH']] + path_list(env['SIM_INC_PATH'])))
+    vlog    = env['VLOGCOM'] + ' +incdir+' + '+'.join(incdirs) + env['VLOG_FLAGS']
+
+    def vlog_cmd(name, srcs):
+        opts = ' -work ' + name
+        if name != wlib:
+            opts += ' -L ' + wlib
+        return vlog + opts + ' ' + ' '.join(srcs)
+
+    stages = {}
+
+    #-------------------------------------------------------
+    #
+    #   Packages and top units
+    #
+    print_info('compile packages and top units: ' + str(len(main)) + ' files')
+    start = time.time()
+    if main:
+        rcode = pexec(vlog_cmd(wlib, main), trg_dir, exec_env=env['ENV'])
+        if rcode: return rcode, stages
+    stages['vlog_main'] = time.time() - start
+
+    #-------------------------------------------------------
+    #
+    #   Partitions
+    #
+    part_libs = [name for name in libs if name != wlib]
+    print_info('compile partitions: ' + ', '.join([name + ': ' + str(len(libs[name])) for name in part_libs]))
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        rcodes = list(pool.map(lambda name: pexec(vlog_cmd(name, libs[name]), trg_dir, exec_env=env['ENV']), part_libs))
+    stages['vlog_partitions'] = time.time() - start
+    for rcode in rcodes:
+        if rcode: return rcode, stages
+
+    #-------------------------------------------------------
+    #
+    #   Optimization
+    #
+    cmd = vopt_command(env, trg_dir, lib_opt, 'opt_' + env['TESTBENCH_NAME'])
+
+    print(cmd)
+    start = time.time()
+    rcode = pexec(cmd, trg_dir, exec_env=env['ENV'], filter=env['VOPT_FILTER_RULES'])
+    stages['vopt'] = time.time() - start
+
+    return rcode, stages
+
+#-------------------------------------------------------------------------------
+#
+#    Compile times are kept for comparison of single and partitioned modes
+#
+def record_worklib_compile_time(env, trg_dir, count, total, stages):
+
+    path = os.path.join(trg_dir, env['SIM_WORKLIB_NAME'] + '-compile-times.json')
+    try:
+        with open(path) as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        history = []
+
+    mode  = 'partitioned' if stages else 'single'        # single compile has no stages
+    entry = { 'date'  : time.strftime('%Y-%m-%d %H:%M:%S'),
+              'mode'  : mode,
+              'jobs'  : env['VLOG_JOBS'] if mode == 'partitioned' else 1,
+              'files' : count,
+              'total' : round(total, 2) }
+    for s in stages:
+        entry[s] = round(stages[s], 2)
+
+    text = 'work library compile: ' + '{:.1f}'.format(total) + ' s, ' + mode
+    if stages:
+        text += ' (' + ', '.join([s + ': ' + '{:.1f}'.format(stages[s]) + ' s' for s in stages]) + ')'
+    other = [e for e in history if e['mode'] != mode and e['files'] == count]
+    if other:
+        text += ', last ' + other[-1]['mode'] + ': ' + '{:.1f}'.format(other[-1]['total']) + ' s'
+    print_info(text)
+
+    history = (history + [entry])[-WORKLIB_COMPILE_HISTORY:]
+    write_if_changed(path, json.dumps(history, indent=1))
+
+#-------------------------------------------------------------------------------
+#
+#    Simulation library cache key: simulator, compile flags, compile scripts
+#    with build tree paths dropped and contents of the compiled sources
+#
+def simlib_digest(do_files, env):
+
+    hdl_suffixes = ['v', 'sv', 'vh', 'svh', 'vhd', 'vhdl']
+    build_paths  = [env['SIM_SCRIPT_PATH']]
+    if 'IP_OOC_PATH' in env:
+        build_paths.append(env['IP_OOC_PATH'])
+
+    items = [env['QUESTABIN'], env['VLOG_FLAGS'], env['VCOM_FLAGS'], env['VENDOR_LIB_PATH']]
+    for f in sorted(do_files):
+        with open(f) as file:
+            contents = file.read()
+
+        for token in contents.replace('"', ' ').split():
+            if get_suffix(token) in hdl_suffixes and os.path.isfile(token):
+                items.append(file_digest(token))
+
+        for p in build_paths:
+            contents = contents.replace(p, '')
+        items.append(contents)
+
+    return text_digest(items)
+
 #-------------------------------------------------------------------------------
 def simlib_list(libpath):
     libs = {}
@@ -303,15 +722,84 @@ def compile_worklib(env, src):
     trg     = env.Dir(os.path.join(env['BUILD_SIM_PATH'], env['SIM_WORKLIB_NAME']))
     trg_dir = str(trg.dir)
     create_dirs([trg_dir])
-    return env.WorkLib(trg, src)
+
+    incpath = path_list(env['SIM_INC_PATH'])
+    files   = [env.File(s).abspath for s in env.Flatten(src)]
+    preflight(env, trg, 'simulation sources', check_hdl_files, files, incpath, ['v', 'sv', 'vh', 'svh', 'pkg'])
+    preflight(env, trg, 'simulation include directories', check_dirs, incpath, 'include directory')
+
+    wlib = env.WorkLib(trg, src)
+    source_manifest(env, wlib[0].sources)                 # shared with HDL include scanner
+
+    return wlib
+
+#-------------------------------------------------------------------------------
+#
+#    Snapshot targets for VOPT_SNAPSHOTS items, each one is re-optimized
+#    when the work library sources or its own flags change
+#
+def create_vopt_snapshots(env, wlib):
+
+    wlib = env.Flatten(wlib)
+    src  = []
+    for w in wlib:
+        src += w.sources
+
+    # vopt runs write to the same work library: run them one at a time
+    lock  = os.path.join(env['BUILD_SIM_PATH'], env['SIM_WORKLIB_NAME'] + '.vopt')
+    snaps = vopt_snapshots.setdefault(env['BUILD_SIM_PATH'], {})
+
+    res = []
+    for name in sorted(env['VOPT_SNAPSHOTS']):
+        flags = env['VOPT_SNAPSHOTS'][name]
+        trg   = os.path.join(env['BUILD_SIM_PATH'], snapshot_design_name(env, name) + '.' + env['VOPT_SNAPSHOT_SUFFIX'])
+        deps  = [env.Value(env['TESTBENCH_NAME'] + env['VOPT_FLAGS'] + ' ' + flags.strip())]
+        snap  = env.VoptSnapshot(trg, src + deps, SNAPSHOT_NAME=name)
+        env.Depends(snap, wlib)
+        env.SideEffect(lock, snap)
+        snaps[name] = snap
+        res  += snap
+
+    return res
+
+#-------------------------------------------------------------------------------
+#
+#    Simulation started from snapshot depends on its node, snapshots must
+#    be created by 'CreateVoptSnapshots' before
+#
+def snapshot_deps(env, name):
+
+    if not name:
+        return []
+
+    snaps = vopt_snapshots.get(env['BUILD_SIM_PATH'], {})
+    if name not in snaps:
+        print_error('E: simulation snapshot "' + name + '" is not created, see VOPT_SNAPSHOTS and CreateVoptSnapshots')
+        Exit(-1)
+
+    return snaps[name]
 
 #-------------------------------------------------------------------------------
-def launch_questa_gui(env, src = []):
-    return env.QuestaGui('launch_questa_gui', src)
+def launch_questa_gui(env, src = [], snapshot = None):
+    if snapshot is not None:
+        res = env.QuestaGui('launch_questa_gui', src, SIM_SNAPSHOT=snapshot)
+    else:
+        res = env.QuestaGui('launch_questa_gui', src)
+        snapshot = env['SIM_SNAPSHOT']
+
+    env.Depends(res, snapshot_deps(env, snapshot))
+    return res
     
 #-------------------------------------------------------------------------------
-def launch_questa_run(env, src = []):
-    return env.QuestaRun('launch_questa_run', src)
+def launch_questa_run(env, src = [], snapshot = None):
+    if snapshot is not None:
+        res = env.QuestaRun('launch_questa_run', src, SIM_SNAPSHOT=snapshot)
+    else:
+        res = env.QuestaRun('launch_questa_run', src)
+        snapshot = env['SIM_SNAPSHOT']
+
+    env.Depends(res, snapshot_deps(env, snapshot))
+    return res
 
 #-------------------------------------------------------------------------------
 
@@ -362,12 +850,22 @@ def generate(env):
     env['VLIBCOM']        = os.path.join(env['QUESTABIN'], 'vlib')
     env['VMAPCOM']        = os.path.join(env['QUESTABIN'], 'vmap')
     env['VSIMCOM']        = os.path.join(env['QUESTABIN'], 'vsim')
+    env['VOPTCOM']        = os.path.join(env['QUESTABIN'], 'vopt')
     
     env['VLOG_FLAGS']        = ' -incr -sv -mfcu'
     env['VCOM_FLAGS']        = ' -64 -93'
     env['VLOG_OPTIMIZATION'] = ' -O5'
     env['VOPT_FLAGS']        = ''
     env['VSIM_FLAGS']        = ''
+    env['VLOG_JOBS']         = 0                        # > 1: partitioned work library compile by concurrent vlog, needs no '-mfcu'
+    env['VOPT_SNAPSHOTS']    = {}                       # { <snapshot name> : <vopt flags> }, e.g. { 'debug' : '+acc' }
+    env['SIM_SNAPSHOT']      = ''                       # snapshot used by simulation run/GUI, '' - default design
+    env['SIM_LOG_POLICY']    = 'full'                   # batch run waveform logging: none, top, list, full; GUI: full
+    env['SIM_LOG_SIGNALS']   = []                       # 'list' policy: 'log' command arguments, e.g. '-r /top_tb/dut/*'
+    env['SIM_WLF_COMPRESS']  = True
+    env['SIM_WLF_SIZE_LIMIT']= 0                        # batch run WLF size limit, MB, 0 - no limit
+    env['SIM_WLF_TIME_LIMIT']= ''                       # batch run WLF time limit, e.g. '100 us'
+    env['VOPT_SNAPSHOT_SUFFIX'] = 'snapshot'
     if 'vivado' in env['TOOLS']:
         env['VOPT_FLAGS'] = ' glbl'
         
@@ -377,26 +875,46 @@ def generate(env):
     env['SIM_INC_PATH']      = ''
                              
     env['SIM_SCRIPT_SUFFIX'] = 'do'
+
+    env.SetDefault(CONFIG_SUFFIX      = 'yml',           # source manifest suffixes, set by 'vivado' tool
+                   TOOL_SCRIPT_SUFFIX = 'tcl',
+                   IP_CORE_SUFFIX     = 'xci',
+                   BD_SUFFIX          = 'bd',
+                   V_SUFFIX           = 'v',
+                   SV_SUFFIX          = 'sv',
+                   SV_HEADER_SUFFIX   = 'svh',
+                   SV_PACKAGE_SUFFIX  = 'pkg',
+                   CONSTRAINTS_SUFFIX = 'xdc')
                              
     env['BUILD_SIM_PATH']    = os.path.join(root_dir, 'build', build_variant, 'sim')
+    env['BUILD_HISTORY_PATH']= os.path.abspath(os.path.join(root_dir, 'build', '.cache', 'durations.json'))
     env['SIM_CMD_SCRIPT']    = os.path.abspath(os.path.join(root_dir, 'site_scons', 'site_tools', 'questa.tcl' ))
     
     env['VOPT_FILTER_RULES'] = []
+    env['SIMLIB_CACHE']      = True                       # reuse compiled sim libraries from artifact cache
+    
+    env['REMOTE_WORKERS']    = os.environ.get('SCONS_REMOTE_WORKERS', '').split()   # '<host>[:<port>[:<capacity>]]'
+    env['REMOTE_TOKEN']      = os.environ.get('SCONS_REMOTE_TOKEN', '')
     
     env['VERBOSE'] = True
 
+    init_preflight()                            # 'preflight' target: check inputs instead of build
+    init_schedule(env['BUILD_HISTORY_PATH'])    # start long action chains first
+
     #-----------------------------------------------------------------
     #
     #   Builders
     #
     SimLib         = Builder(action = simlib, target_factory = env.fs.Dir)
     WorkLib        = Builder(action = work_lib,  target_factory = env.fs.Dir)
+    VoptSnapshot   = Builder(action = vopt_snapshot)
     QuestaGui      = Builder(action = questa_gui)
     QuestaRun      = Builder(action = questa_run)
     
     Builders = {
         'Simlib'    : SimLib,
         'WorkLib'   : WorkLib,
+        'VoptSnapshot' : VoptSnapshot,
         'QuestaGui' : QuestaGui,
         'QuestaRun' : QuestaRun
     }
@@ -409,6 +927,7 @@ def generate(env):
     #
     env.AddMethod(compile_simlib,    'CompileSimLib')
     env.AddMethod(compile_worklib,   'CompileWorkLib')
+    env.AddMethod(create_vopt_snapshots, 'CreateVoptSnapshots')
     env.AddMethod(launch_questa_gui, 'LaunchQuestaGui')
     env.AddMethod(launch_questa_run, 'LaunchQuestaRun')
         
@@ -35,6 +35,13 @@ echo "**************************************************************************
 #
 quietly source handoff.do
 
+if {![info exists LOG_POLICY]} {
+    quietly set LOG_POLICY full
+}
+if {![info exists WLF_FLAGS]} {
+    quietly set WLF_FLAGS {}
+}
+
 quietly set DesignName $TB_NAME
 quietly set WaveFileName    ${DesignName}
 quietly append WaveFileName "_wave.do"
@@ -110,8 +117,13 @@ if {[info exists TimeResolution]} {
 }
 quietly append vsim_flags " " ${VSIM_FLAGS}
 quietly append vsim_flags " -wlf func.wlf";
+quietly append vsim_flags " " ${WLF_FLAGS}
 quietly append vsim_flags " -quiet";
-quietly append vsim_flags " " $OptimizedDesignName;
+if {[info exists OPT_DESIGN_NAME]} {
+    quietly append vsim_flags " " $OPT_DESIGN_NAME;
+} else {
+    quietly append vsim_flags " " $OptimizedDesignName;
+}
 
 #-------------------------------------------------------------------------------
 #
@@ -144,6 +156,30 @@ proc compile {} {
     }
 }
 #-------------------------------------------------------------------------------
+#
+#     Waveform logging policy: none, top (top level signals), list
+#     (LOG_SIGNALS items are 'log' command arguments), full
+#
+proc log_signals { } {
+    global LOG_POLICY LOG_SIGNALS DesignName;
+
+    switch -- $LOG_POLICY {
+        none {
+        }
+        top {
+            log /$DesignName/*
+        }
+        list {
+            foreach s $LOG_SIGNALS {
+                eval log $s
+            }
+        }
+        default {
+            log -r /*
+        }
+    }
+}
+#-------------------------------------------------------------------------------
 proc sim_begin { } {
     global vsim_cmd vsim_flags;
 
@@ -155,7 +191,7 @@ proc sim_begin { } {
     set cmd [concat ${vsim_cmd} ${vsim_flags}];
     eval ${cmd}
     radix -hex
-    log -r /*
+    log_signals
 
     puts "StdArithNoWarnings   = $StdArithNoWarnings"
     puts "NumericStdNoWarnings = $NumericStdNoWarnings"
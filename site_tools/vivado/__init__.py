@@ -9,17 +9,17 @@
 import os
 import sys
 import re
+import importlib
 
+import SCons.Action
 import SCons.Builder
 import SCons.Scanner
 
 from utils import *
 
-from site_scons.site_tools.vivado.ipcores import *
-from site_scons.site_tools.vivado.bd      import *
-from site_scons.site_tools.vivado.params  import *
-from site_scons.site_tools.vivado.project import *
-from site_scons.site_tools.vivado.hls     import *
+from preflight import init_preflight
+from schedule  import init_schedule
+from manifest  import hdl_include_path
 
 #-------------------------------------------------------------------------------
 #
@@ -34,32 +34,15 @@ def scan_cfg_files(node, env, path):
     fname = str(node)
     if get_suffix(fname) != env['CONFIG_SUFFIX']:
         return env.File([])
-        
-    with open(fname) as f:
-        cfg = yaml.safe_load(f)
-        
-    if 'import' in cfg and cfg['import']:
-        imports = []
-        imps = cfg['import'].split()
-        for i in imps:
-            fn = i + '.' + env['CONFIG_SUFFIX']
-            found = False
-            for p in path:
-                full_path = os.path.join(p.path, fn)
-                if os.path.exists(full_path):
-                    imports.append(full_path)
-                    found = True
-                    break
-
-            if not found:
-                print_error('E: import config file ' + fn + ' not found')
-                print_error('    raised during processing "' + fname + '"' )
-                Exit(-2)
-
-        return env.File(imports)
-
-    else:
-        return env.File([])
+
+    try:
+        imports = config_imports(fname, [p.abspath for p in path], env['CONFIG_SUFFIX'])
+
+    except ConfigImportException as e:
+        print_error('E: ' + e.msg)
+        Exit(-2)
+
+    return env.File(imports)
 
 #---------------------------------------------------------------------
 #
@@ -88,6 +71,27 @@ def scan_hdl_files(node, env, path):
     
     return env.File(inclist)
     
+#---------------------------------------------------------------------
+#
+#    C/C++ scanner (HLS sources)
+#
+def scan_cxx_files(node, env, path):
+
+    fname = node.abspath
+    if get_suffix(fname) not in env['HLS_CXX_SUFFIXES']:
+        return env.File([])
+
+    inclist = []
+    dirs    = [os.path.dirname(fname)] + [os.path.abspath(str(p)) for p in path]
+    for i in vivado_module('hls').hls_include_cache(env).includes(fname):
+        for d in dirs:
+            full_path = os.path.join(d, i)
+            if os.path.exists(full_path):
+                inclist.append(full_path)
+                break
+
+    return env.File(inclist)
+
 #---------------------------------------------------------------------
 #
 #    Tcl scanner
@@ -117,6 +121,116 @@ def scan_tcl_files(node, env, path):
 
 #-------------------------------------------------------------------------------
 
+#-------------------------------------------------------------------------------
+#
+#    Lazy loading: tool submodules are imported when a pseudo-builder is
+#    called or a builder action is signed/executed the first time, so flows
+#    which are not used in the build cost nothing at startup. Tool binaries
+#    are checked when an action which runs them is executed
+#
+VIVADO_ACTIONS = {
+    'ip_create_script'     : ('ipcores', []),
+    'ip_syn_script'        : ('ipcores', []),
+    'ip_create'            : ('ipcores', ['VIVADO_BIN']),
+    'ip_synthesize'        : ('ipcores', ['VIVADO_BIN']),
+    'bd_ooc_create'        : ('bd',      ['VIVADO_BIN']),
+    'bd_ooc_create_batch'  : ('bd',      ['VIVADO_BIN']),
+    'hls_csynth_script'    : ('hls',     []),
+    'hls_csynth'           : ('hls',     ['HLS_BIN', 'VIVADO_BIN']),
+    'hls_repo_module'      : ('hls',     ['HLS_BIN', 'VIVADO_BIN']),
+    'hls_ip_create_batch'  : ('hls',     ['VIVADO_BIN']),
+    'hls_sim'              : ('hls',     ['HLS_BIN']),
+    'hls_sim_report'       : ('hls',     []),
+    'cfg_params_header'    : ('params',  []),
+    'cfg_params_tcl'       : ('params',  []),
+    'vivado_project'       : ('project', ['VIVADO_BIN']),
+    'synth_vivado_project' : ('project', ['VIVADO_BIN']),
+    'impl_vivado_project'  : ('project', ['VIVADO_BIN']),
+    'open_vivado_project'  : ('project', ['VIVADO_BIN'])
+}
+
+VIVADO_METHODS = {
+    'IpCreateScripts'          : ('ipcores', 'ip_create_scripts'),
+    'IpSynScripts'             : ('ipcores', 'ip_syn_scripts'),
+    'CreateIps'                : ('ipcores', 'create_ips'),
+    'SynIps'                   : ('ipcores', 'syn_ips'),
+    'CreateOocBd'              : ('bd',      'create_ooc_bd'),
+    'CreateHlsCSynthScript'    : ('hls',     'create_hls_csynth_script'),
+    'LaunchHlsCSynth'          : ('hls',     'launch_hls_csynth'),
+    'LaunchHlsCSynthBatch'     : ('hls',     'launch_hls_csynth_batch'),
+    'LaunchHlsCSim'            : ('hls',     'launch_hls_csim'),
+    'LaunchHlsCoSim'           : ('hls',     'launch_hls_cosim'),
+    'HlsIpSynScripts'          : ('hls',     'hlsip_syn_scripts'),
+    'CreateCfgParamsHeader'    : ('params',  'create_cfg_params_header'),
+    'CreateCfgParamsTcl'       : ('params',  'create_cfg_params_tcl'),
+    'CreateVivadoProject'      : ('project', 'create_vivado_project'),
+    'LaunchSynthVivadoProject' : ('project', 'launch_synth_vivado_project'),
+    'LaunchImplVivadoProject'  : ('project', 'launch_impl_vivado_project'),
+    'LaunchOpenVivadoProject'  : ('project', 'launch_open_vivado_project')
+}
+
+TOOL_BINARIES = { 'VIVADO_BIN' : 'Vivado', 'HLS_BIN' : 'Vitis HLS' }
+
+#-------------------------------------------------------------------------------
+def vivado_module(name):
+    return importlib.import_module('site_scons.site_tools.vivado.' + name)
+
+#-------------------------------------------------------------------------------
+def check_tool_binaries(env, tools):
+
+    for t in tools:
+        if not os.path.exists(env[t]):
+            print_error('E: ' + TOOL_BINARIES[t] + ' not found at the path: ' + env[t])
+            return -1
+
+    return None
+
+#-------------------------------------------------------------------------------
+#
+#    Function action resolved on first use, signature is the same as of
+#    the plain function action, so switching to lazy loading does not
+#    cause rebuilds
+#
+class LazyFunctionAction(SCons.Action.FunctionAction):
+
+    def __init__(self, name, **kw):
+        self.name     = name
+        self.module, self.tools = VIVADO_ACTIONS[name]
+        self.func     = None
+        self.contents = None
+        SCons.Action._ActionAction.__init__(self, **kw)
+
+    @property
+    def execfunction(self):
+        if self.func is None:
+            self.func = getattr(vivado_module(self.module), self.name)
+        return self.func
+
+    @property
+    def funccontents(self):
+        if self.contents is None:
+            self.contents = SCons.Action._callable_contents(self.execfunction)
+        return self.contents
+
+    def function_name(self):
+        return self.name
+
+    def execute(self, target, source, env, executor=None):
+        rcode = check_tool_binaries(env, self.tools)
+        if rcode:
+            return rcode
+
+        return super().execute(target, source, env, executor)
+
+#-------------------------------------------------------------------------------
+def lazy_method(module, name):
+
+    def method(env, *args, **kwargs):
+        return getattr(vivado_module(module), name)(env, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
 #-------------------------------------------------------------------------------
 #
 #    Set up tool construction environment
@@ -141,14 +255,6 @@ def generate(env):
         
     VIVADO = os.path.join(env['XILINX_VIVADO'], 'bin', 'vivado')
     HLS    = os.path.join(env['XILINX_HLS'], 'bin', 'vitis_hls')
-    
-    if not os.path.exists(VIVADO):
-        print_error('E: Vivado not found at the path: ' + VIVADO)
-        Exit(-1)
-    
-    if not os.path.exists(HLS):
-        print_error('E: Vitis HLS not found at the path: ' + HLS)
-        Exit(-1)
 
     #-----------------------------------------------------------------
     #
@@ -163,13 +269,25 @@ def generate(env):
     
     
     env['VIVADO_VERNUM']         = version_number(env['XILINX_VIVADO'])
+    env['VIVADO_VERSION']        = os.path.basename(os.path.normpath(env['XILINX_VIVADO']))   # full release, artifact cache keys
+    env['HLS_VERSION']           = os.path.basename(os.path.normpath(env['XILINX_HLS']))
     env['VIVADO_PROJECT_NAME']   = 'vivado_project'
     env['TOP_NAME']              = 'top'
     env['DEVICE']                = 'xc7a200tfbg676-2'
 
     env['VIVADO_PROJECT_MODE']   = True
     env['CLEAR_PROJECT_DIR']     = False                              # clear project directory when create new project
-
+    env['BD_CACHE']              = True                               # reuse generated block designs from artifact cache
+    env['BD_BATCH_CREATE']       = False                              # create all OOC BDs by one builder in a Vivado session pool
+    env['BD_SESSION_POOL_SIZE']  = 2                                  # max Vivado sessions used by batch BD create
+    env['HLS_CACHE']             = True                               # reuse HLS IP repo modules from artifact cache
+    env['HLS_CACHE_SIZE_LIMIT']  = 20*1024**3                         # HLS cache size limit in bytes
+    env['HLS_MAX_JOBS']          = 0                                  # max concurrent vitis_hls runs (licenses), 0: no limit
+    env['IP_CACHE']              = True                               # reuse created and synthesized IP cores from artifact cache
+    env['ARTIFACT_CACHE_POLICY'] = {}                                 # { <kind> : { 'max_size' : <bytes>, 'max_age' : <days> } }
+
+    env['VIVADO_BIN']            = VIVADO                             # checked when action running it is executed
+    env['HLS_BIN']               = HLS
     env['SYNCOM']                = VIVADO + ' -mode batch '
     env['SYNSHELL']              = VIVADO + ' -mode tcl '
     env['SYNGUI']                = VIVADO + ' -mode gui '
@@ -181,6 +299,9 @@ def generate(env):
     env['SYN_JOURNAL']           = ' -nojournal'
     env['PROJECT_CREATE_FLAGS']  = ''
     env['HLSFLAGS']              = ''
+    env['HLS_CSIM_FLAGS']        = ''
+    env['HLS_COSIM_FLAGS']       = ''
+    env['HLS_SIM_MODE']          = 'csim'
 
     env['VERBOSE']               = True
 
@@ -193,14 +314,27 @@ def generate(env):
     env['BD_OOC_PATH']           = os.path.join(root_dir, 'build', build_variant, 'bd')
     env['BUILD_HLS_PATH']        = os.path.join(env['BUILD_SYN_PATH'], 'hls')
     env['INC_PATH']              = ''
+    env['ARTIFACT_CACHE_PATH']   = os.path.join(env['ROOT_PATH'], 'build', '.cache')  # shared between build variants
+    env['ARTIFACT_SHARED_CACHE'] = os.environ.get('SCONS_ARTIFACT_SHARED_CACHE', '')  # team cache: directory or http://<host>:<port>
+    env['ARTIFACT_SHARED_TOKEN'] = os.environ.get('SCONS_ARTIFACT_TOKEN', '')          # token of team cache server
+    env['REMOTE_WORKERS']        = os.environ.get('SCONS_REMOTE_WORKERS', '').split()  # '<host>[:<port>[:<capacity>]]'
+    env['REMOTE_TOKEN']          = os.environ.get('SCONS_REMOTE_TOKEN', '')
 
     env['IP_SCRIPT_DIRNAME']     = '_script'
     env['BD_SCRIPT_DIRNAME']     = '_script'
     env['SIM_SCRIPT_DIRNAME']    = 'sim_script'
     env['SIM_SCRIPT_PATH']       = os.path.join(env['BUILD_SYN_PATH'], env['SIM_SCRIPT_DIRNAME'])
     env['HLS_SCRIPT_DIRNAME']    = '_script'
+    env['BD_DIGEST_NAME']        = '.bd_digest'
+    env['HLS_IP_DIGEST_NAME']    = '.component_digest'
+    env['IP_DIGEST_NAME']        = '.ip_digest'
 
     env['HLS_IP_NAME_SUFFIX']    = '_hlsip'
+    env['HLS_CXX_SUFFIXES']      = ['c', 'cc', 'cpp', 'cxx', 'h', 'hh', 'hpp', 'hxx']
+    env['HLS_INC_PATH']          = []
+    env['HLS_INC_CACHE_PATH']    = os.path.join(env['ARTIFACT_CACHE_PATH'], 'hls-includes.pickle')
+    env['CFG_SNAPSHOT_PATH']     = os.path.join(env['ARTIFACT_CACHE_PATH'], 'cfg-snapshot.pickle')
+    env['BUILD_HISTORY_PATH']    = os.path.join(env['ARTIFACT_CACHE_PATH'], 'durations.json')  # action durations for scheduling
     
     env['CONFIG_SUFFIX']         = 'yml'
     env['TOOL_SCRIPT_SUFFIX']    = 'tcl'
@@ -218,10 +352,18 @@ def generate(env):
     env['HLS_TARGET_SUFFIX']     = 'zip'
 
     env['USER_DEFINED_PARAMS']   = {}
+    env['CFG_EVAL_JOBS']         = 1             # config evaluation processes, 0: CPU count, 1: serial
+    env['CFG_EVAL_POOL_MIN']     = 4             # minimal number of config files worth process pool startup
+    env['CFG_PARAMS_GROUPED']    = False         # SV package per config file in parameters header
+    env['CFG_PARAMS_HDL_SOURCES']= []            # if specified, only parameters referenced in HDL are emitted
 
     env.Append(SYNFLAGS = env['SYN_TRACE'])
     env.Append(SYNFLAGS = env['SYN_JOURNAL'])
 
+    open_config_snapshot(lambda: env['CFG_SNAPSHOT_PATH']) # path is read at first use, '' or None disables snapshot
+    init_preflight()                                   # 'preflight' target: check inputs instead of build
+    init_schedule(env['BUILD_HISTORY_PATH'])           # start long action chains first
+
 
     #-----------------------------------------------------------------
     #
@@ -230,7 +372,7 @@ def generate(env):
     CfgImportScanner = Scanner(name  = 'CfgImportScanner',
                        function      = scan_cfg_files,
                        skeys         = ['.' + env['CONFIG_SUFFIX']],
-                       recursive     = True,
+                       recursive     = False,            # returns transitive closure
                        path_function = SCons.Scanner.FindPathDirs('CONFIG_SEARCH_PATH')
                       )
 
@@ -238,7 +380,13 @@ def generate(env):
                        function      = scan_hdl_files,
                        skeys         = ['.' + env['V_SUFFIX'], '.' + env['SV_SUFFIX']],
                        recursive     = True,
-                       path_function = SCons.Scanner.FindPathDirs('INC_PATH')
+                       path_function = hdl_include_path
+                      )
+    CxxSourceScanner = Scanner(name  = 'CxxSourceScanner',
+                       function      = scan_cxx_files,
+                       skeys         = ['.' + i for i in env['HLS_CXX_SUFFIXES']],
+                       recursive     = True,
+                       path_function = SCons.Scanner.FindPathDirs('HLS_INC_PATH')
                       )
     TclSourceScanner = Scanner(name  = 'TclSourceScanner',
                        function      = scan_tcl_files,
@@ -246,49 +394,63 @@ def generate(env):
                        recursive     = True,
                        path_function = SCons.Scanner.FindPathDirs('BUILD_SRC_PATH')
                       )
+    HlsSimScanner    = SCons.Scanner.Selector(dict([(k, CxxSourceScanner) for k in CxxSourceScanner.skeys] +
+                                                   [('.' + env['CONFIG_SUFFIX'], CfgImportScanner)]))
     
     #-----------------------------------------------------------------
     #
     #   Builders
     #
-    IpCreateScript     = Builder(action         = ip_create_script,
+    IpCreateScript     = Builder(action         = LazyFunctionAction('ip_create_script'),
                                  suffix         = env['TOOL_SCRIPT_SUFFIX'],
                                  #src_suffix     = env['IP_CONFIG_SUFFIX'],
                                  source_scanner = CfgImportScanner)
 
-    IpSynScript        = Builder(action         = ip_syn_script,
+    IpSynScript        = Builder(action         = LazyFunctionAction('ip_syn_script'),
                                  suffix         = env['TOOL_SCRIPT_SUFFIX'],
                                  source_scanner = CfgImportScanner)
 
 
-    IpCreate           = Builder(action     = ip_create,
+    IpCreate           = Builder(action     = LazyFunctionAction('ip_create'),
                                  suffix     = env['IP_CORE_SUFFIX'],
                                  src_suffix = env['TOOL_SCRIPT_SUFFIX'])
 
-    IpSyn              = Builder(action     = ip_synthesize,
+    IpSyn              = Builder(action     = LazyFunctionAction('ip_synthesize'),
                                  suffix     = env['DCP_SUFFIX'],
                                  src_suffix = env['IP_CORE_SUFFIX'])
 
-    BdCreate           = Builder(action         = bd_ooc_create, 
+    BdCreate           = Builder(action         = LazyFunctionAction('bd_ooc_create'), 
+                                 source_scanner = TclSourceScanner)
+
+    BdCreateBatch      = Builder(action         = LazyFunctionAction('bd_ooc_create_batch'),
                                  source_scanner = TclSourceScanner)
     
-    HlsCSynthScript    = Builder(action         = hls_csynth_script, chdir=False, 
+    HlsCSynthScript    = Builder(action         = LazyFunctionAction('hls_csynth_script'), chdir=False, 
                                  source_scanner = CfgImportScanner)
 
-    HlsCSynth          = Builder(action         = hls_csynth, chdir=False,
+    HlsCSynth          = Builder(action         = LazyFunctionAction('hls_csynth'), chdir=False,
                                  suffix         = env['IP_CORE_SUFFIX'],
-                                 src_suffix     = env['TOOL_SCRIPT_SUFFIX'])
+                                 src_suffix     = env['TOOL_SCRIPT_SUFFIX'],
+                                 source_scanner = CxxSourceScanner)
+
+    HlsRepoModule      = Builder(action         = LazyFunctionAction('hls_repo_module'), chdir=False,
+                                 source_scanner = CxxSourceScanner)
+    HlsIpCreateBatch   = Builder(action         = LazyFunctionAction('hls_ip_create_batch'), chdir=False)
+
+    HlsSim             = Builder(action         = LazyFunctionAction('hls_sim'), chdir=False,
+                                 source_scanner = HlsSimScanner)            # config imports and C++ includes
+    HlsSimReport       = Builder(action         = LazyFunctionAction('hls_sim_report'), chdir=False)
     
-    CfgParamsHeader    = Builder(action = cfg_params_header, source_scanner = CfgImportScanner)
-    CfgParamsTcl       = Builder(action = cfg_params_tcl,    source_scanner = CfgImportScanner)
+    CfgParamsHeader    = Builder(action = LazyFunctionAction('cfg_params_header'), source_scanner = CfgImportScanner)
+    CfgParamsTcl       = Builder(action = LazyFunctionAction('cfg_params_tcl'),    source_scanner = CfgImportScanner)
 
-    VivadoProject      = Builder(action = vivado_project)
+    VivadoProject      = Builder(action = LazyFunctionAction('vivado_project'))
 
-    SynthVivadoProject = Builder(action = synth_vivado_project, source_scanner = HdlSourceScanner)
-    ImplVivadoProject  = Builder(action = impl_vivado_project)
+    SynthVivadoProject = Builder(action = LazyFunctionAction('synth_vivado_project'), source_scanner = HdlSourceScanner)
+    ImplVivadoProject  = Builder(action = LazyFunctionAction('impl_vivado_project'))
 
 
-    OpenVivadoProject  = Builder(action = open_vivado_project)
+    OpenVivadoProject  = Builder(action = LazyFunctionAction('open_vivado_project'))
 
     Builders = {
         'IpCreateScript'      : IpCreateScript,
@@ -297,9 +459,14 @@ def generate(env):
         'IpSyn'               : IpSyn,
 
         'BdCreate'            : BdCreate,
+        'BdCreateBatch'       : BdCreateBatch,
         
         'HlsCSynthScript'     : HlsCSynthScript,
         'HlsCSynth'           : HlsCSynth,
+        'HlsRepoModule'       : HlsRepoModule,
+        'HlsIpCreateBatch'    : HlsIpCreateBatch,
+        'HlsSim'              : HlsSim,
+        'HlsSimReport'        : HlsSimReport,
 
         'CfgParamsHeader'     : CfgParamsHeader,
         'CfgParamsTcl'        : CfgParamsTcl,
@@ -318,25 +485,8 @@ def generate(env):
     #
     #   IP core processing pseudo-builders
     #
-    env.AddMethod(ip_create_scripts,        'IpCreateScripts')
-    env.AddMethod(ip_syn_scripts,           'IpSynScripts')
-    env.AddMethod(create_ips,               'CreateIps')
-    env.AddMethod(syn_ips,                  'SynIps')
-                                            
-    env.AddMethod(create_ooc_bd,            'CreateOocBd')
-
-    env.AddMethod(create_hls_csynth_script, 'CreateHlsCSynthScript')
-    env.AddMethod(launch_hls_csynth,        'LaunchHlsCSynth')
-    env.AddMethod(hlsip_syn_scripts,        'HlsIpSynScripts')
-
-    env.AddMethod(create_cfg_params_header,    'CreateCfgParamsHeader')
-    env.AddMethod(create_cfg_params_tcl,       'CreateCfgParamsTcl')
-    env.AddMethod(create_vivado_project,       'CreateVivadoProject')
-
-    env.AddMethod(launch_synth_vivado_project, 'LaunchSynthVivadoProject')
-    env.AddMethod(launch_impl_vivado_project,  'LaunchImplVivadoProject')
-
-    env.AddMethod(launch_open_vivado_project,  'LaunchOpenVivadoProject')
+    for name in VIVADO_METHODS:
+        env.AddMethod(lazy_method(*VIVADO_METHODS[name]), name)
 
 
 #-------------------------------------------------------------------------------
@@ -7,8 +7,19 @@
 #-------------------------------------------------------------------------------
 
 import os
+import re
+import threading
 
 from utils import *
+from site_scons.site_tools.vivado.cache import artifact_cache
+from preflight import preflight, problem, missing
+
+#-------------------------------------------------------------------------------
+#
+#    Markers printed by batch create script, used to split Vivado session log
+#
+BD_BATCH_BEGIN = '>>>>>>>> BD_BATCH_BEGIN'
+BD_BATCH_END   = '>>>>>>>> BD_BATCH_END'
 
 #-------------------------------------------------------------------------------
 def bd_create_script(env, trg, bd_config_path):
@@ -59,70 +70,333 @@ def bd_create_script(env, trg, bd_config_path):
     out += generate_footer('#')
 
     create_dirs( [os.path.dirname(script_path)])
-    with open(script_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(script_path, out)
     
     return script_path
 
 #-------------------------------------------------------------------------------
 #
-#    Action functions
+#    Block design inputs: BD Tcl and all scripts sourced from it
 #
-#---------------------------------------------------------------------
+def bd_tcl_sources(bd_config_path, env, visited=None):
+
+    pattern = '^\s*source\s+\$\w+\/([\w\-]+\.\w+)'
+
+    if visited is None:
+        visited = []
+
+    path = os.path.abspath(bd_config_path)
+    if path in visited:
+        return visited
+
+    visited.append(path)
+    if not os.path.exists(path):
+        return visited
+
+    with open(path) as f:
+        includes = re.findall(pattern, f.read(), re.MULTILINE)
+
+    for i in includes:
+        bd_tcl_sources(os.path.join(env['BUILD_SRC_PATH'], i), env, visited)
+
+    return visited
+
+#-------------------------------------------------------------------------------
 #
-#    Build Tcl script to create OOC IP
+#    Pre-flight check of BD script: sourced scripts exist (or are built)
+#    and braces are balanced
 #
-def bd_ooc_create(target, source, env):
+def check_bd_script(bd_config_path, env):
+
+    res = []
+    for path in bd_tcl_sources(bd_config_path, env):
+        if not os.path.exists(path):
+            res.append(missing('Tcl script "' + path + '" not exists, sourced by BD script', [path]))
+            continue
+
+        with open(path) as f:
+            text = re.sub(r'\\.', '', f.read())        # drop escaped characters
+        if text.count('{') != text.count('}'):
+            res.append(problem('unbalanced braces in "' + path + '"'))
+
+    return res
+
+#-------------------------------------------------------------------------------
+def bd_digest(bd_config_path, env):
+
+    items = [get_name(bd_config_path), env['DEVICE'], env['VIVADO_VERSION']]
+    for path in bd_tcl_sources(bd_config_path, env):
+        items.append(os.path.basename(path))
+        items.append(file_digest(path) if os.path.exists(path) else 'missing')
+
+    return text_digest(items)
 
-    src = source[0]
-    trg = target[0]
+#-------------------------------------------------------------------------------
+def bd_up_to_date(trg_path, digest_path, digest):
+
+    if not os.path.exists(trg_path) or not os.path.exists(digest_path):
+        return False
+
+    with open(digest_path) as f:
+        return f.read().strip() == digest
+
+#-------------------------------------------------------------------------------
+#
+#    Prepare block design job: returns None if the block design is up to date
+#    or restored from cache, otherwise job description for Vivado run
+#
+def bd_prepare(trg, src, env):
 
     src_path = str(src)
     trg_path = str(trg)
     
-    trg_base_path = os.path.join(env['BD_OOC_PATH'], get_name(src_path)) 
+    bd_name       = get_name(src_path)
+    trg_base_path = os.path.join(env['BD_OOC_PATH'], bd_name)
+    sim_path      = os.path.join(env['SIM_SCRIPT_PATH'], bd_name)
+    digest_path   = os.path.join(trg_base_path, env['BD_DIGEST_NAME'])
 
     print(trg_base_path)
     
     print_action('create block design:       \'' + trg.name + '\'')
  
+    digest = bd_digest(src_path, env)
+    if bd_up_to_date(trg_path, digest_path, digest):
+        print_info('block design is up to date: \'' + bd_name + '\'')
+        return None
+
     script = bd_create_script(env, trg_path, src_path)
-       
+
+    #-------------------------------------------------------
+    #
+    #   Restore block design from cache
+    #
+    cache = artifact_cache(env, 'bd') if env['BD_CACHE'] else None
+    trees = { 'bd' : trg_base_path, 'sim' : sim_path }
+    meta  = cache.meta(digest) if cache and cache.contains(digest) else None
+    if meta:                                        # no meta: broken or missing entry
+        subst = { meta['bd_path']         : trg_base_path,
+                  meta['sim_path']        : sim_path,
+                  meta['sim_script_path'] : env['SIM_SCRIPT_PATH'],
+                  meta['build_src_path']  : env['BUILD_SRC_PATH'] }
+        if cache.restore(digest, trees, subst):
+            print_info('restore block design from cache: \'' + bd_name + '\'')
+            return None
+
     Execute( Delete(trg_base_path) )
     Execute( Mkdir(trg_base_path) )
-    
-    logfile  = os.path.join(trg_base_path, 'create.log')
+
+    job = { 'name'        : bd_name,
+            'path'        : trg_base_path,
+            'script'      : script,
+            'digest'      : digest,
+            'digest_path' : digest_path,
+            'cache'       : cache,
+            'trees'       : trees,
+            'logfile'     : os.path.join(trg_base_path, 'create.log') }
+
+    return job
+
+#-------------------------------------------------------------------------------
+def bd_commit(job, env):
+
+    with open(job['digest_path'], 'w') as f:
+        f.write(job['digest'] + os.linesep)
+
+    if job['cache']:
+        meta = { 'name'            : job['name'],
+                 'device'          : env['DEVICE'],
+                 'bd_path'         : job['path'],
+                 'sim_path'        : job['trees']['sim'],
+                 'sim_script_path' : env['SIM_SCRIPT_PATH'],
+                 'build_src_path'  : env['BUILD_SRC_PATH'] }
+        job['cache'].store(job['digest'], job['trees'], meta)
+
+#-------------------------------------------------------------------------------
+#
+#    Script for a single Vivado session which creates several block designs
+#    one by one. Each block design project is created in its own directory
+#    and closed before the next one
+#
+def bd_batch_script(jobs, script_path):
+
+    title_text =\
+    'Block design batch create script' + os.linesep*2 + \
+    'This file is automatically generated. Do not edit the file manually.'
+
+    text  = 'set BD_JOBS {' + os.linesep
+    for job in jobs:
+        text += '    {' + job['name'] + '} {' + job['path'] + '} {' + job['script'] + '}' + os.linesep
+    text += '}' + os.linesep*2
+
+    text += 'set rcode 0'                                                   + os.linesep
+    text += 'foreach {bd_job_name bd_job_dir bd_job_script} $BD_JOBS {'     + os.linesep
+    text += '    puts "' + BD_BATCH_BEGIN + ' $bd_job_name"'                + os.linesep
+    text += '    cd $bd_job_dir'                                            + os.linesep
+    text += '    if {[catch {source $bd_job_script} err]} {'                + os.linesep
+    text += '        puts "ERROR: \\[BD_BATCH\\] $err"'                     + os.linesep
+    text += '        set rcode 1'                                           + os.linesep
+    text += '    } else {'                                                  + os.linesep
+    text += '        puts "' + BD_BATCH_END + ' $bd_job_name"'              + os.linesep
+    text += '    }'                                                         + os.linesep
+    text += '    catch {close_project}'                                     + os.linesep
+    text += '}'                                                             + os.linesep*2
+    text += 'exit $rcode'                                                   + os.linesep
+
+    out = generate_title(title_text, '#')
+    out += text
+    out += generate_footer('#')
+
+    write_if_changed(script_path, out)
+
+#-------------------------------------------------------------------------------
+#
+#    Run a Vivado session for a group of block design jobs, session output is
+#    split into per-BD 'create.log' files by markers printed from batch script
+#
+def bd_batch_session(jobs, script_path, env):
+
+    bd_batch_script(jobs, script_path)
+
+    logs = { job['name'] : job for job in jobs }
+    done = []
+    state = { 'log' : None }
+
+    def handler(line):
+        if line.startswith(BD_BATCH_BEGIN):
+            if state['log']:
+                state['log'].close()
+            job = logs[line.split()[-1]]
+            state['log'] = open(job['logfile'], 'w')
+        elif line.startswith(BD_BATCH_END):
+            done.append(line.split()[-1])
+
+        if state['log']:
+            state['log'].write(line if line.endswith('\n') else line + '\n')
+
+    logfile  = drop_suffix(script_path) + '.log'
     cmd = []
     cmd.append(env['SYNCOM'])
     cmd.append(env['SYNFLAGS'])
     cmd.append('-log ' + logfile)
-    cmd.append(' -source ' + script)
+    cmd.append(' -source ' + script_path)
     cmd = ' '.join(cmd)
 
     if env['VERBOSE']:
         print(cmd)
 
-    rcode = pexec(cmd, trg_base_path, exec_env=env['ENV'])
+    try:
+        pexec(cmd, env['BD_OOC_PATH'], exec_env=env['ENV'], handler=handler)
+    finally:
+        if state['log']:
+            state['log'].close()
 
-    return rcode
+    return done
+
+#-------------------------------------------------------------------------------
+#
+#    Action functions
+#
+#---------------------------------------------------------------------
+#
+#    Build Tcl script to create OOC IP
+#
+def bd_ooc_create(target, source, env):
+
+    job = bd_prepare(target[0], source[0], env)
+    if not job:
+        return None
+
+    cmd = []
+    cmd.append(env['SYNCOM'])
+    cmd.append(env['SYNFLAGS'])
+    cmd.append('-log ' + job['logfile'])
+    cmd.append(' -source ' + job['script'])
+    cmd = ' '.join(cmd)
+
+    if env['VERBOSE']:
+        print(cmd)
+
+    rcode = pexec(cmd, job['path'], exec_env=env['ENV'])
+    if rcode:
+        return rcode
+
+    bd_commit(job, env)
+
+    return None
     
+#---------------------------------------------------------------------
+#
+#    Create several OOC block designs in a bounded pool of Vivado sessions
+#
+def bd_ooc_create_batch(target, source, env):
+
+    jobs = []
+    for trg, src in zip(target, source):
+        job = bd_prepare(trg, src, env)
+        if job:
+            jobs.append(job)
+
+    if not jobs:
+        return None
+
+    sessions = max(1, min(int(env['BD_SESSION_POOL_SIZE']), len(jobs)))
+    groups   = [jobs[i::sessions] for i in range(sessions)]
+    done     = []
+
+    script_dir = os.path.join(env['BD_OOC_PATH'], env['BD_SCRIPT_DIRNAME'])
+    create_dirs([script_dir])
+
+    def run(idx, group):
+        script_path = os.path.join(script_dir, 'bd-batch-' + str(idx) + '.' + env['TOOL_SCRIPT_SUFFIX'])
+        done.extend( bd_batch_session(group, script_path, env) )
+
+    print_info('create ' + str(len(jobs)) + ' block design(s) in ' + str(sessions) + ' Vivado session(s)')
+    threads = [threading.Thread(target=run, args=(i, g)) for i, g in enumerate(groups)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    rcode = None
+    for job in jobs:
+        if job['name'] in done:
+            bd_commit(job, env)
+        else:
+            print_error('E: block design "' + job['name'] + '" creation failed, see log: ' + job['logfile'])
+            rcode = -2
+
+    return rcode
+
 #-------------------------------------------------------------------------------
 def create_ooc_bd(env, src):
     
     res = []
     bd_wrappers = []
+    targets = []
+    sources = []
     
     for s in src:
         source  = os.path.abspath(s)
         bd_name = get_name(s)
         target  = os.path.join(env['BD_OOC_PATH'], bd_name, bd_name + '.srcs', 'sources_1', 'bd', bd_name, bd_name + '.' + env['BD_SUFFIX'])
-        res.append( env.BdCreate(target, source) )
+        if env['BD_BATCH_CREATE']:
+            targets.append(target)
+            sources.append(source)
+        else:
+            bd = env.BdCreate(target, source)
+            env.Precious(bd)            # keep BD tree for up-to-date check
+            res.append(bd)
+        preflight(env, target, 'BD script: ' + source, check_bd_script, source, env)
         wname = os.path.join( env['BD_OOC_PATH'], bd_name, bd_name + '.gen', 'sources_1', 'bd', bd_name, 'hdl', bd_name + '_wrapper.v' )
         bd_wrappers.append(Glob(wname))
         
+    if targets:
+        bd_list = env.BdCreateBatch(targets, sources)
+        env.Precious(bd_list)
+        res = [[bd] for bd in bd_list]
+
     env['BD_WRAPPERS'] = bd_wrappers
         
     return res
     
 #-------------------------------------------------------------------------------
-
@@ -0,0 +1,512 @@
+#-------------------------------------------------------------------------------
+#
+#    Artifact Cache Support for Xilinx Vivado SCons Tool
+#
+#    Author: Harry E. Zhurov
+#
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import json
+import time
+import socket
+import tarfile
+import hashlib
+import threading
+
+from utils import *
+
+#-------------------------------------------------------------------------------
+#
+#    Text file types which may contain absolute paths of the build tree
+#
+RELOCATABLE_SUFFIXES = ['do', 'sh', 'tcl', 'f', 'txt', 'v', 'sv', 'vhd', 'xml', 'prj', 'ini', 'xci']
+
+#-------------------------------------------------------------------------------
+def tmp_suffix() -> str:
+    return '.' + socket.gethostname() + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+
+#-------------------------------------------------------------------------------
+#
+#    Content-addressed cache of generated directory trees
+#
+#    Each cache entry is a directory '<root>/<key[:2]>/<key>' which holds
+#    named subtrees and 'meta.json' with arbitrary entry description and
+#    SHA-256 of each file for integrity check on restore. Entries are
+#    published by rename, so the cache may be shared by concurrent writers
+#    (including hosts using the same NFS path). If 'max_size' (bytes) or
+#    'max_age' (days) is specified, entries are evicted after each store.
+#
+class ArtifactCache:
+
+    META_NAME  = 'meta.json'
+    STATS_NAME = 'stats.json'
+
+    lock = threading.Lock()
+
+    def __init__(self, root: str, max_size=None, max_age=None):
+        self.root     = os.path.abspath(root)
+        self.max_size = max_size
+        self.max_age  = max_age
+
+    #-----------------------------------------------------------------
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    #-----------------------------------------------------------------
+    def contains(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.entry_path(key), self.META_NAME))
+
+    #-----------------------------------------------------------------
+    def meta(self, key: str):
+        path = os.path.join(self.entry_path(key), self.META_NAME)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return json.load(f)
+
+    #-----------------------------------------------------------------
+    #
+    #    trees: { <subtree name> : <source directory path> }
+    #
+    def store(self, key: str, trees: dict, meta: dict) -> bool:
+        if self.contains(key):
+            return True
+
+        tmp = self.entry_path(key) + tmp_suffix()
+        try:
+            if os.path.exists(tmp):
+                shutil.rmtree(tmp)
+            os.makedirs(tmp)
+            for name in trees:
+                if os.path.exists(trees[name]):
+                    shutil.copytree(trees[name], os.path.join(tmp, name), symlinks=True)
+
+            meta = dict(meta, size=tree_size(tmp), files=tree_hashes(tmp))
+            with open(os.path.join(tmp, self.META_NAME), 'w') as f:
+                json.dump(meta, f, indent=4)
+
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print_warning('W: artifact cache: unable to store entry ' + key + ': ' + str(e))
+            return False
+
+        return self.publish(key, tmp)
+
+    #-----------------------------------------------------------------
+    #
+    #    Atomically move complete entry directory 'tmp' to the cache
+    #
+    def publish(self, key: str, tmp: str) -> bool:
+        try:
+            os.makedirs(os.path.dirname(self.entry_path(key)), exist_ok=True)
+            os.rename(tmp, self.entry_path(key))
+
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if self.contains(key):              # concurrent writer wins
+                return True
+            print_warning('W: artifact cache: unable to store entry ' + key + ': ' + str(e))
+            return False
+
+        if self.max_size or self.max_age:
+            self.evict(self.max_size, self.max_age)
+
+        return True
+
+    #-----------------------------------------------------------------
+    #
+    #    Copy complete entry to 'dst' directory (used by tiered cache)
+    #
+    def get_entry(self, key: str, dst: str) -> bool:
+        if not self.contains(key):
+            return False
+
+        shutil.copytree(self.entry_path(key), dst, symlinks=True)
+        os.utime(self.entry_path(key))
+
+        return True
+
+    #-----------------------------------------------------------------
+    def put_entry(self, key: str, src: str) -> bool:
+        if self.contains(key):
+            return True
+
+        tmp = self.entry_path(key) + tmp_suffix()
+        try:
+            shutil.copytree(src, tmp, symlinks=True)
+        except OSError as e:
+            shutil.rmtree(tmp, ignore_errors=True)
+            print_warning('W: artifact cache: unable to store entry ' + key + ': ' + str(e))
+            return False
+
+        return self.publish(key, tmp)
+
+    #-----------------------------------------------------------------
+    def entries(self) -> list:
+        res = []
+        if not os.path.exists(self.root):
+            return res
+
+        for d in os.listdir(self.root):
+            dpath = os.path.join(self.root, d)
+            if len(d) != 2 or not os.path.isdir(dpath):
+                continue
+            for key in os.listdir(dpath):
+                meta_path = os.path.join(dpath, key, self.META_NAME)
+                if key.endswith('.tmp') or not os.path.exists(meta_path):
+                    continue
+                try:
+                    with open(meta_path) as f:
+                        size = json.load(f).get('size', 0)
+                    res.append( (os.path.getmtime(os.path.join(dpath, key)), size, key) )
+                except (OSError, ValueError):
+                    continue
+
+        return res
+
+    #-----------------------------------------------------------------
+    #
+    #    Drop entries not used for 'max_age' days, then least recently
+    #    used ones until total size fits 'max_size'
+    #
+    def evict(self, max_size=None, max_age=None):
+        entries = sorted(self.entries())              # least recently used first
+        total   = sum([e[1] for e in entries])
+        oldest  = time.time() - max_age*24*3600 if max_age else 0
+        for mtime, size, key in entries:
+            if mtime >= oldest and (not max_size or total <= max_size):
+                break
+            shutil.rmtree(self.entry_path(key), ignore_errors=True)
+            total -= size
+            print_info('artifact cache: evict entry ' + key)
+
+    #-----------------------------------------------------------------
+    def remove(self, key: str):
+        shutil.rmtree(self.entry_path(key), ignore_errors=True)
+
+    #-----------------------------------------------------------------
+    def record(self, hit: bool) -> dict:
+        path = os.path.join(self.root, self.STATS_NAME)
+        with ArtifactCache.lock:
+            stats = { 'hits' : 0, 'misses' : 0 }
+            try:
+                with open(path) as f:
+                    stats.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+
+            stats['hits' if hit else 'misses'] += 1
+
+            os.makedirs(self.root, exist_ok=True)
+            tmp = path + tmp_suffix()
+            with open(tmp, 'w') as f:
+                json.dump(stats, f, indent=4)
+            os.replace(tmp, path)
+
+        return stats
+
+    #-----------------------------------------------------------------
+    #
+    #    trees: { <subtree name> : <destination directory path> }
+    #    subst: { <original path> : <new path> } for relocation of text files
+    #
+    #    Entry which fails integrity check is removed from the cache
+    #
+    def restore(self, key: str, trees: dict, subst={}) -> bool:
+        if not self.contains(key):
+            return False
+
+        entry  = self.entry_path(key)
+        hashes = self.meta(key).get('files')
+        staged = []
+        for name in trees:
+            src = os.path.join(entry, name)
+            dst = trees[name]
+            if not os.path.exists(src):
+                continue
+
+            tmp = dst + tmp_suffix()
+            shutil.rmtree(tmp, ignore_errors=True)
+            shutil.copytree(src, tmp, symlinks=True)
+            staged.append((tmp, dst))
+
+            if hashes is not None and not tree_verify(tmp, name, hashes):
+                print_warning('W: artifact cache: entry ' + key + ' is corrupted, removed from cache')
+                for tmp, dst in staged:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                self.remove(key)
+                return False
+
+        for tmp, dst in staged:
+            relocate_tree(tmp, subst)
+            if os.path.exists(dst):
+                shutil.rmtree(dst)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.rename(tmp, dst)
+
+        os.utime(entry)                         # mark entry as recently used
+
+        return True
+
+#-------------------------------------------------------------------------------
+#
+#    Artifact cache served over HTTP (see 'artifact_server.py'). Entry of
+#    kind 'k' is stored as '<url>/k/<key>.tar' archive of the entry
+#    directory and '<url>/k/<key>.json' meta with archive SHA-256. Archives
+#    are streamed through temporary files, 'token' is sent as bearer token
+#
+class HttpArtifactCache:
+
+    CHUNK_SIZE = 1 << 20
+
+    def __init__(self, url: str, kind: str, token='', timeout=30):
+        self.url     = url.rstrip('/') + '/' + kind + '/'
+        self.token   = token
+        self.timeout = timeout
+
+    #-----------------------------------------------------------------
+    #
+    #    urllib is imported on first request, it is not needed by local
+    #    builds; its URLError is subclass of OSError
+    #
+    def request(self, name, method='GET', data=None, headers={}):
+        import urllib.request
+
+        headers = dict(headers)
+        if self.token:
+            headers['Authorization'] = 'Bearer ' + self.token
+
+        req = urllib.request.Request(self.url + name, data=data, method=method, headers=headers)
+        return urllib.request.urlopen(req, timeout=self.timeout)
+
+    #-----------------------------------------------------------------
+    def contains(self, key: str) -> bool:
+        try:
+            with self.request(key + '.json', 'HEAD'):
+                return True
+        except OSError:
+            return False
+
+    #-----------------------------------------------------------------
+    def meta(self, key: str):
+        try:
+            with self.request(key + '.json') as r:
+                return json.loads(r.read().decode('utf8'))
+        except (OSError, ValueError):
+            return None
+
+    #-----------------------------------------------------------------
+    def get_entry(self, key: str, dst: str) -> bool:
+        meta = self.meta(key)
+        if not meta:
+            return False
+
+        archive = dst + '.tar'
+        os.makedirs(os.path.dirname(archive), exist_ok=True)
+        try:
+            try:
+                with self.request(key + '.tar') as r, open(archive, 'wb') as f:
+                    shutil.copyfileobj(r, f, self.CHUNK_SIZE)
+            except OSError:
+                return False
+
+            if file_digest(archive) != meta.get('archive_sha256'):
+                print_warning('W: artifact cache: corrupted archive of entry ' + key + ' at ' + self.url)
+                return False
+
+            with tarfile.open(archive) as tar:
+                if hasattr(tarfile, 'tar_filter'):
+                    tar.extractall(dst, filter='tar')
+                else:
+                    tar.extractall(dst)
+
+        finally:
+            if os.path.exists(archive):
+                os.remove(archive)
+
+        return True
+
+    #-----------------------------------------------------------------
+    def put_entry(self, key: str, src: str) -> bool:
+        if self.contains(key):
+            return True
+
+        archive = src + tmp_suffix() + '.tar'
+        try:
+            with tarfile.open(archive, mode='w') as tar:
+                for name in sorted(os.listdir(src)):
+                    tar.add(os.path.join(src, name), name)
+            digest = file_digest(archive)
+
+            with open(os.path.join(src, ArtifactCache.META_NAME)) as f:
+                meta = dict(json.load(f), archive_sha256=digest)
+
+            try:
+                with open(archive, 'rb') as f:
+                    self.request(key + '.tar', 'PUT', f, { 'X-Content-SHA256' : digest,
+                                                           'Content-Length'   : str(os.path.getsize(archive)) }).close()
+                self.request(key + '.json', 'PUT', json.dumps(meta).encode('utf8'),
+                             { 'Content-Type' : 'application/json' }).close()
+
+            except OSError as e:
+                print_warning('W: artifact cache: unable to upload entry ' + key + ': ' + str(e))
+                return False
+
+        finally:
+            if os.path.exists(archive):
+                os.remove(archive)
+
+        return True
+
+#-------------------------------------------------------------------------------
+#
+#    Local cache backed by shared team cache: entries missing locally are
+#    fetched from the shared one, stored entries are uploaded to it
+#
+class TieredArtifactCache:
+
+    def __init__(self, local: ArtifactCache, shared):
+        self.local  = local
+        self.shared = shared
+
+    #-----------------------------------------------------------------
+    def contains(self, key: str) -> bool:
+        return self.local.contains(key) or self.shared.contains(key)
+
+    #-----------------------------------------------------------------
+    def meta(self, key: str):
+        return self.local.meta(key) if self.local.contains(key) else self.shared.meta(key)
+
+    #-----------------------------------------------------------------
+    def fetch(self, key: str) -> bool:
+        if self.local.contains(key):
+            return True
+
+        tmp = self.local.entry_path(key) + tmp_suffix()
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not self.shared.get_entry(key, tmp):
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+
+        print_info('artifact cache: fetch shared entry ' + key)
+        return self.local.publish(key, tmp)
+
+    #-----------------------------------------------------------------
+    def store(self, key: str, trees: dict, meta: dict) -> bool:
+        if not self.local.store(key, trees, meta):
+            return False
+
+        self.shared.put_entry(key, self.local.entry_path(key))
+        return True
+
+    #-----------------------------------------------------------------
+    def restore(self, key: str, trees: dict, subst={}) -> bool:
+        return self.fetch(key) and self.local.restore(key, trees, subst)
+
+    #-----------------------------------------------------------------
+    def record(self, hit: bool) -> dict:
+        return self.local.record(hit)
+
+#-------------------------------------------------------------------------------
+def tree_size(path: str) -> int:
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for fn in filenames:
+            fpath = os.path.join(dirpath, fn)
+            if not os.path.islink(fpath):
+                size += os.path.getsize(fpath)
+
+    return size
+
+#-------------------------------------------------------------------------------
+#
+#    SHA-256 of regular files: { <subtree name>/<relative path> : digest }
+#
+def tree_hashes(path: str) -> dict:
+    res = {}
+    for dirpath, dirnames, filenames in os.walk(path):
+        for fn in filenames:
+            fpath = os.path.join(dirpath, fn)
+            if not os.path.islink(fpath) and fn != ArtifactCache.META_NAME:
+                res[os.path.relpath(fpath, path).replace(os.sep, '/')] = file_digest(fpath)
+
+    return res
+
+#-------------------------------------------------------------------------------
+def tree_verify(path: str, name: str, hashes: dict) -> bool:
+    prefix = name + '/'
+    found  = tree_hashes(path)
+    expect = { k[len(prefix):] : hashes[k] for k in hashes if k.startswith(prefix) }
+
+    return found == expect
+
+#-------------------------------------------------------------------------------
+def relocate_tree(path: str, subst: dict):
+
+    if not subst:
+        return
+
+    items = [(k, subst[k]) for k in sorted(subst, key=len, reverse=True) if k != subst[k]]
+    if not items:
+        return
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        for fn in filenames:
+            if get_suffix(fn) not in RELOCATABLE_SUFFIXES:
+                continue
+
+            fpath = os.path.join(dirpath, fn)
+            if os.path.islink(fpath):
+                continue
+
+            try:
+                with open(fpath, encoding='utf8') as f:
+                    contents = f.read()
+            except UnicodeDecodeError:
+                continue
+
+            new_contents = contents
+            for old, new in items:
+                new_contents = new_contents.replace(old, new)
+
+            if new_contents != contents:
+                with open(fpath, 'w', encoding='utf8') as f:
+                    f.write(new_contents)
+
+#-------------------------------------------------------------------------------
+#
+#    Cache of artifacts of 'kind' ('ip', 'bd', 'hls', 'simlib', ...).
+#
+#    ARTIFACT_CACHE_POLICY: { <kind> : { 'max_size' : <bytes>, 'max_age' : <days> } },
+#                           'max_size' argument is the default size limit
+#    ARTIFACT_SHARED_CACHE: shared team cache, directory (e.g. at NFS) or
+#                           'http://<host>:<port>' of artifact server
+#    ARTIFACT_SHARED_TOKEN: token of artifact server
+#
+def artifact_cache(env, kind: str, max_size=None):
+
+    if not env.get('ARTIFACT_CACHE_PATH'):
+        return None
+
+    policy   = env.get('ARTIFACT_CACHE_POLICY', {}).get(kind, {})
+    max_size = policy.get('max_size', max_size)
+    max_age  = policy.get('max_age')
+    local    = ArtifactCache(os.path.join(env['ARTIFACT_CACHE_PATH'], kind), max_size, max_age)
+
+    shared = env.get('ARTIFACT_SHARED_CACHE')
+    if not shared:
+        return local
+
+    if shared.startswith('http://') or shared.startswith('https://'):
+        return TieredArtifactCache(local, HttpArtifactCache(shared, kind, env.get('ARTIFACT_SHARED_TOKEN', '')))
+
+    if shared.startswith('file://'):
+        shared = shared[len('file://'):]
+
+    return TieredArtifactCache(local, ArtifactCache(os.path.join(shared, kind), max_size, max_age))
+
+#-------------------------------------------------------------------------------
+
@@ -9,10 +9,26 @@
 import os
 import sys
 import re
-
+import json
+import time
+import zlib
+import pickle
+import atexit
+import shutil
+import zipfile
+import threading
+import contextlib
+
+from stat  import S_IREAD, S_IRGRP, S_IROTH
 from utils import *
+from site_scons.site_tools.vivado.cache import artifact_cache
+from preflight import preflight, preflight_enabled, preflight_params, problem, check_config, check_src_lists, check_dirs
+
+hls_jobs_lock = threading.Lock()
+hls_jobs      = {}
 
-top_path = os.path.abspath(str(Dir('#'))) # <- scons-chdir fix!!!
+hls_include_caches      = {}
+hls_include_caches_lock = threading.Lock()
 
 #-------------------------------------------------------------------------------
 class Params:
@@ -92,26 +108,52 @@ class Params:
 
         #-----------------------------------------------------------------
         # flags
-        if not 'cflags' in self.params:
-            self.cflags = []
+        self.cflags    = hls_flags(self.params, 'cflags', env)
+        self.csimflags = hls_flags(self.params, 'csimflags', env)
+                        
+#-------------------------------------------------------------------------------
+#
+#    Compiler flags of HLS module with relative '-I' paths made absolute
+#    against BUILD_HLS_PATH (work directory of vitis_hls before modules got
+#    their own work directories), so flags mean the same in any work
+#    directory and for the include scanner
+#
+def hls_flags(params, name, env):
+
+    flags = params[name] if name in params else []
+    if not SCons.Util.is_List(flags):
+        flags = flags.split()
+
+    res  = []
+    path = False
+    for flag in flags:
+        if path:
+            res.append(hls_include_path(flag, env))
+            path = False
+        elif flag == '-I':
+            res.append(flag)
+            path = True
+        elif flag.startswith('-I'):
+            res.append('-I' + hls_include_path(flag[2:], env))
         else:
-            if not SCons.Util.is_List(self.params['cflags']):
-                self.cflags = self.params['cflags'].split()
-            else:
-                self.cflags = self.params['cflags']
+            res.append(flag)
+
+    return res
 
-        if not 'csimflags' in self.params:
-            self.csimflags = []
-        else:
-            if not SCons.Util.is_List(self.params['csimflags']):
-                self.csimflags = self.params['csimflags'].split()
-            else:
-                self.csimflags = self.params['csimflags']
-                        
 #-------------------------------------------------------------------------------
-def generate_csynth_script(script_path, trg_path, params, env):
+def hls_include_path(path, env):
 
-    text  = generate_title('This file is automatically generated. Do not edit the file!', '#')
+    path = path.strip('"\'')
+    if path.startswith('$'):                   # resolved by vitis_hls Tcl/shell
+        return path
+
+    return os.path.normpath(os.path.join(env['BUILD_HLS_PATH'], path))
+
+#-------------------------------------------------------------------------------
+#
+#    HLS project and solution setup common for synthesis and simulation
+#
+def emit_hls_project(text, params, env):
 
     #-----------------------------------------------------------------
     # generate script body
@@ -124,24 +166,23 @@ def generate_csynth_script(script_path, trg_path, params, env):
     text += 'open_project -reset ${PROJECT_NAME}' + os.linesep*2
 
     text += '# Add syn sources'                   + os.linesep
+    cflags = ' ' 
+    if params.cflags:
+        cflags = ' -cflags "' + ' '.join(params.cflags) + '" '
     for s in params.src_syn_list: 
-        cflags = ' ' 
-        if params.cflags:
-            cflags = ' -cflags "' + ' '.join(params.cflags) + '" '
         if s.endswith('.json'):
             # HLS blackboxes
-            text += 'add_files -blackbox ' + s + os.linesep
+            text.line('add_files -blackbox ' + s)
         else:
             # normal HLS sources
-            text += 'add_files ' + cflags + s + os.linesep
+            text.line('add_files ' + cflags + s)
     text += os.linesep*2
 
     text += '# Add sim sources' + os.linesep
-    for s in params.src_sim_list:
-        csimflags = ' ' 
-        if params.csimflags:
-            csimflags = ' -csimflags "' + ' '.join(params.csimflags) + '" '
-        text += 'add_files -tb' + csimflags + s + os.linesep
+    csimflags = ' ' 
+    if params.csimflags:
+        csimflags = ' -csimflags "' + ' '.join(params.csimflags) + '" '
+    text.lines(params.src_sim_list, 'add_files -tb' + csimflags)
     text += os.linesep*2
 
 #   text += '# Add hooks' + os.linesep
@@ -159,10 +200,16 @@ def generate_csynth_script(script_path, trg_path, params, env):
         text += 'set_clock_uncertainty ' + str(params.clock_uncertainty)      + os.linesep*2
 
     text += '# Add hooks' + os.linesep
-    for h in params.hook_list:
-        text += 'source ' + h + os.linesep
+    text.lines(params.hook_list, 'source ')
     text += os.linesep*2
 
+#-------------------------------------------------------------------------------
+def generate_csynth_script(script_path, trg_path, params, env):
+
+    text  = Emitter()
+    text.title('This file is automatically generated. Do not edit the file!', '#')
+    emit_hls_project(text, params, env)
+
     text += 'csynth_design' + os.linesep*2
 
     text += 'export_design -rtl verilog -format ip_catalog' + \
@@ -173,10 +220,30 @@ def generate_csynth_script(script_path, trg_path, params, env):
     text += 'exit'
 
 
-    text += generate_footer('#')
+    text.footer('#')
+
+    write_if_changed(script_path, text.text())
+    
+#-------------------------------------------------------------------------------
+#
+#    C simulation / co-simulation script, 'mode' is 'csim' or 'cosim'
+#
+def generate_sim_script(script_path, mode, params, env):
 
-    with open(script_path, 'w') as ofile:
-        ofile.write(text)
+    text  = Emitter()
+    text.title('This file is automatically generated. Do not edit the file!', '#')
+    emit_hls_project(text, params, env)
+
+    text += 'csim_design ' + env['HLS_CSIM_FLAGS'] + os.linesep*2
+    if mode == 'cosim':
+        text += 'csynth_design' + os.linesep
+        text += 'cosim_design ' + env['HLS_COSIM_FLAGS'] + os.linesep*2
+
+    text += 'exit'
+
+    text.footer('#')
+
+    write_if_changed(script_path, text.text())
     
 #-------------------------------------------------------------------------------
 def generate_hls_ip_create_script(script_path, ip_repo_module, name, env):
@@ -208,21 +275,120 @@ def generate_hls_ip_create_script(script_path, ip_repo_module, name, env):
     text += 'exit ' + os.linesep
     text += generate_footer('#')
 
-    with open(script_path, 'w') as ofile:
-        ofile.write(text)
+    write_if_changed(script_path, text)
         
 #-------------------------------------------------------------------------------
-def compile_hls_ip_repo_module(csynth_script_path, trg_path, env):
+#
+#    Create IPs for several HLS repo modules in one Vivado session with
+#    single IP catalog update
+#
+def generate_hls_ip_batch_script(script_path, jobs, env):
+
+    print_info('generate script:           \'' + os.path.basename(script_path) + '\'')
+
+    text  = generate_title('This file is automatically generated. Do not edit the file!', '#')
+
+    text += 'set DEVICE     ' + env['DEVICE']                                 + os.linesep
+    text += 'set BASE_PATH  ' + env['BUILD_SYN_PATH']                         + os.linesep*2
+
+    text += 'create_project -in_memory -part ${DEVICE}' + os.linesep
+    text += 'set_property ip_repo_paths ${BASE_PATH}/hls/ip [current_project]' + os.linesep
+    text += 'update_ip_catalog' + os.linesep
+    text += 'set_part  ${DEVICE}' + os.linesep*2
+
+    for job in jobs:
+        ip_component = os.path.join(job['repo_module'], 'component.xml')
+
+        text += 'set ip_name    ' + job['ip_name']                                   + os.linesep
+        text += 'set IP_OOC_DIR ' + os.path.join(env['IP_OOC_PATH'], job['ip_name']) + os.linesep
+        text += 'puts "create IP from HLS repo: ${ip_name}"' + os.linesep
+        text += 'set core [ipx::open_core -set_current false ' + ip_component + ']' + os.linesep
+        text += 'set vlnv [get_property vlnv $core]' + os.linesep
+        text += 'ipx::unload_core $core' + os.linesep
+        text += 'create_ip -vlnv $vlnv -module_name ${ip_name} -dir ${IP_OOC_DIR}' + os.linesep
+        text += 'generate_target all [get_ips  ${ip_name}]' + os.linesep
+        text += 'export_simulation -of_objects [get_ips ${ip_name}] -simulator questa -absolute_path -force -directory ${BASE_PATH}/sim_script' + os.linesep*2
+    
+    text += 'exit ' + os.linesep
+    text += generate_footer('#')
+
+    write_if_changed(script_path, text)
+
+#-------------------------------------------------------------------------------
+#
+#    Cache key of HLS module: csynth script with comments and output path
+#    dropped, contents of all files added/sourced by the script, contents of
+#    extra dependencies (e.g. headers) and HLS version
+#
+def hls_csynth_digest(csynth_script_path, deps, env):
+
+    items = [env['HLS_VERSION']]
+    with open(csynth_script_path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+
+            words = line.split()
+            if words[0] in ['add_files', 'source']:
+                path = words[-1]
+                items.append(' '.join(words[:-1]))
+                items.append(file_digest(path) if os.path.exists(path) else path)
+            elif words[0] == 'export_design':
+                items.append(re.sub('-output\s+\S+', '', line))
+            else:
+                items.append(line)
+
+    for d in sorted(deps):
+        if os.path.isfile(d):
+            items.append(d)
+            items.append(file_digest(d))
+
+    return text_digest(items)
+
+#-------------------------------------------------------------------------------
+#
+#    Limit of concurrent vitis_hls runs (HLS_MAX_JOBS, e.g. number of
+#    available licenses), independent of SCons '-j' value. Zero means no limit
+#
+def hls_job_slot(env):
+
+    limit = int(env['HLS_MAX_JOBS'])
+    if limit <= 0:
+        return contextlib.nullcontext()
+
+    with hls_jobs_lock:
+        if limit not in hls_jobs:
+            hls_jobs[limit] = threading.BoundedSemaphore(limit)
+
+        return hls_jobs[limit]
+
+#-------------------------------------------------------------------------------
+def compile_hls_ip_repo_module(csynth_script_path, trg_path, env, deps=[]):
     
     name         = get_name(trg_path)
-    exec_dir     = env['BUILD_HLS_PATH']
-    hls_prj_path = os.path.join(exec_dir, name)
+    exec_dir     = os.path.join(env['BUILD_HLS_PATH'], name)    # isolated work directory of HLS module
     print_info('compile HDL IP from HLS:   \'' + name + '\'')
 
-    Execute( Delete(hls_prj_path) )
-    Execute( Delete(trg_path) )
+    #-------------------------------------------------------
+    #
+    #   Restore HLS IP repo module from cache
+    #
+    cache = artifact_cache(env, 'hls', env['HLS_CACHE_SIZE_LIMIT']) if env['HLS_CACHE'] else None
+    if cache:
+        digest = hls_csynth_digest(csynth_script_path, deps, env)
+        hit    = cache.contains(digest) and cache.restore(digest, { 'ip' : trg_path })
+        stats  = cache.record(hit)                  # failed restore counts as miss
+        label  = 'HLS cache ' + ('hit:' if hit else 'miss:')
+        print_info(label.ljust(27) + '\'' + name + '\'' + \
+                   ' (hits: ' + str(stats['hits']) + ', misses: ' + str(stats['misses']) + ')')
+        if hit:
+            return 0
+
+    Execute( Delete(exec_dir) )
+    Execute( Mkdir(exec_dir) )
     
-    logfile = os.path.join(hls_prj_path, 'create.log')
+    logfile = os.path.join(exec_dir, 'create.log')
     
     cmd = []
     cmd.append(env['HLSCOM'])
@@ -234,16 +400,100 @@ def compile_hls_ip_repo_module(csynth_script_path, trg_path, env):
     if env['VERBOSE']:
         print(cmd)
 
-    rcode = pexec(cmd, exec_dir, exec_env=env['ENV'])
+    with hls_job_slot(env):
+        rcode = pexec(cmd, exec_dir, exec_env=env['ENV'], remote=remote_backend(env), manifest=[csynth_script_path])
 
-    import zipfile
     zipfn = trg_path + '.zip'
-    with zipfile.ZipFile(zipfn, 'r') as ziparchive:
-        ziparchive.extractall(trg_path)
-        Execute( Delete(zipfn) )
+    if rcode or not os.path.exists(zipfn):
+        print_error('E: HLS module compile ends with error code ' + str(rcode) + ', see log: ' + logfile)
+        return rcode if rcode else -2
+
+    rcode = extract_hls_ip(zipfn, trg_path)
+    if rcode:
+        return rcode
+    Execute( Delete(zipfn) )
+
+    if cache:
+        cache.store(digest, { 'ip' : trg_path }, { 'name' : name, 'device' : env['DEVICE'] })
 
     return rcode
     
+#-------------------------------------------------------------------------------
+def file_crc32(path):
+
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(chunk, crc)
+
+    return crc
+
+#-------------------------------------------------------------------------------
+#
+#    Extract exported HLS IP into repo module: members are streamed into a
+#    staging directory, members with the same CRC as in the existing repo
+#    module are hard linked (keep timestamps), then the staging directory
+#    replaces the module by rename. If nothing changed, the existing module
+#    is left untouched. Members with paths outside of the module are refused
+#
+def extract_hls_ip(zipfn, trg_path):
+
+    stage = os.path.normpath(trg_path) + '.stage'
+    old   = trg_path + '.old'
+    if os.path.exists(old) and not os.path.exists(trg_path):
+        os.rename(old, trg_path)                    # previous swap was interrupted
+    for d in [stage, old]:
+        if os.path.exists(d):
+            shutil.rmtree(d)
+
+    changed = 0
+    members = []
+    with zipfile.ZipFile(zipfn, 'r') as ziparchive:
+        for info in ziparchive.infolist():
+            dst = os.path.normpath(os.path.join(stage, info.filename))
+            if os.path.isabs(info.filename) or not dst.startswith(stage + os.sep):
+                shutil.rmtree(stage, ignore_errors=True)
+                print_error('E: HLS IP archive member outside of module directory: \'' + info.filename + '\'')
+                print_error('    archive: ' + zipfn)
+                return -1
+
+            if info.is_dir():
+                os.makedirs(dst, exist_ok=True)
+                continue
+
+            members.append(os.path.normpath(info.filename))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            cur = os.path.join(trg_path, info.filename)
+            if os.path.isfile(cur) and os.path.getsize(cur) == info.file_size and file_crc32(cur) == info.CRC:
+                try:
+                    os.link(cur, dst)
+                except OSError:
+                    shutil.copy2(cur, dst)
+            else:
+                with ziparchive.open(info) as fsrc, open(dst, 'wb') as fdst:
+                    shutil.copyfileobj(fsrc, fdst)
+                changed += 1
+
+    existing = []
+    for dirpath, dirnames, filenames in os.walk(trg_path):
+        existing += [os.path.relpath(os.path.join(dirpath, f), trg_path) for f in filenames]
+
+    if not changed and sorted(existing) == sorted(members):
+        shutil.rmtree(stage)
+        print_info('HLS IP repo module is unchanged: \'' + os.path.basename(trg_path) + '\'')
+        return 0
+
+    if os.path.exists(trg_path):
+        os.rename(trg_path, old)
+    os.rename(stage, trg_path)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+
+    print_info('HLS IP repo module updated:      \'' + os.path.basename(trg_path) + '\'' + \
+               ' (changed files: ' + str(changed) + ' of ' + str(len(members)) + ')')
+
+    return 0
+
 #-------------------------------------------------------------------------------
 def create_hls_ip(script_path, trg_path, exec_dir, env):
     
@@ -268,12 +518,99 @@ def create_hls_ip(script_path, trg_path, exec_dir, env):
 
     rcode = pexec(cmd, exec_dir, exec_env=env['ENV'])
     
-    from stat import S_IREAD, S_IRGRP, S_IROTH
     
     os.chmod(trg_path, S_IREAD | S_IRGRP | S_IROTH)  # make target (xci) read only to disable changing during IP synthesis
 
     return rcode
 
+#-------------------------------------------------------------------------------
+#
+#    Persistent cache of C/C++ '#include' directives of HLS sources. Entries
+#    are validated by file mtime and size, so unchanged files are not read
+#    on no-op builds. The cache is saved at exit if anything was updated
+#
+class IncludeCache:
+
+    pattern = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+
+    def __init__(self, path):
+        self.path  = path
+        self.data  = None
+        self.dirty = False
+        self.lock  = threading.Lock()
+
+    #-----------------------------------------------------------------
+    def load(self):
+        self.data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f:
+                    self.data = pickle.load(f)
+            except Exception:
+                self.data = {}
+
+    #-----------------------------------------------------------------
+    def save(self):
+        if not self.dirty:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+        with self.lock:
+            with open(tmp, 'wb') as f:
+                pickle.dump(self.data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+            self.dirty = False
+
+    #-----------------------------------------------------------------
+    def includes(self, fpath):
+        st  = os.stat(fpath)
+        sig = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if self.data is None:
+                self.load()
+            item = self.data.get(fpath)
+            if item and item[0] == sig:
+                return item[1]
+
+        with open(fpath, errors='replace') as f:
+            res = self.pattern.findall(f.read())
+
+        with self.lock:
+            self.data[fpath] = (sig, res)
+            self.dirty       = True
+
+        return res
+
+#-------------------------------------------------------------------------------
+def hls_include_cache(env):
+
+    path = env['HLS_INC_CACHE_PATH']
+    with hls_include_caches_lock:
+        if path not in hls_include_caches:
+            hls_include_caches[path] = IncludeCache(path)
+            atexit.register(hls_include_caches[path].save)
+
+        return hls_include_caches[path]
+
+#-------------------------------------------------------------------------------
+#
+#    Include directories from '-I' options of HLS module 'cflags', resolved
+#    the same way as in generated scripts
+#
+def hls_include_dirs(params, env):
+
+    cflags = hls_flags(params, 'cflags', env)
+
+    dirs = []
+    for idx, flag in enumerate(cflags):
+        if flag == '-I' and idx + 1 < len(cflags):
+            dirs.append(cflags[idx + 1])
+        elif flag.startswith('-I') and len(flag) > 2:
+            dirs.append(flag[2:])
+
+    return [d for d in dirs if not d.startswith('$')]
+
 #-------------------------------------------------------------------------------
 def add_sim_stuff(name, env):
 
@@ -288,17 +625,31 @@ def add_sim_stuff(name, env):
          msg = colorize('create symbolic link for ', 'magenta')
          print(msg, f + ' in ' + env['BUILD_SIM_PATH'])
 
+#-------------------------------------------------------------------------------
+def hls_module_name(csynth_script_path):
+
+    # retrieve parameters from source script
+    with open(csynth_script_path, 'r') as sf:
+        src_contents = sf.read();
+        
+    pattern = 'export_design.+-ipname\s(\w+)\s+-version\s(\d+\.\d+)\s+-vendor\s(\w+)\s+-library\s(\w+)'
+    res = re.search(pattern, src_contents)
+    
+    if not res:
+        print_error('E: invalid HLS module create script: \'' + csynth_script_path + '\'')
+        Exit(-1)
+        
+    return res.groups()[0]
+
 #-------------------------------------------------------------------------------
 #
 #   Builders
 #
 def hls_csynth_script(target, source, env):
 
-    os.chdir(top_path)   # <- scons-chdir fix!!!
-
     src         = source[0]
     trg         = target[0]
-    src_path    = str(src)
+    src_path    = src.abspath
     trg_path    = os.path.abspath( str(trg) )
     trg_name    = drop_suffix( os.path.basename(trg_path) )
 
@@ -319,7 +670,7 @@ def hls_csynth_script(target, source, env):
     hls_path           = env['BUILD_HLS_PATH']
     hls_script_path    = os.path.join(hls_path, env['HLS_SCRIPT_DIRNAME'])
     hls_ip_repo_path   = os.path.join(hls_path, 'ip')
-    hls_ip_repo_module = os.path.join(hls_ip_repo_path, module_name)
+    hls_ip_repo_module = os.path.abspath(os.path.join(hls_ip_repo_path, module_name))
     
     # generate csynth script
     csynth_script_path = os.path.join(hls_script_path, module_name + '-csynth' + '.' + env['TOOL_SCRIPT_SUFFIX'])
@@ -338,18 +689,7 @@ def hls_csynth(target, source, env):
     
     print_action('create HLS module from:    \'' + src_path + '\'')
 
-    # retrieve parameters from source script
-    with open(src_path, 'r') as sf:
-        src_contents = sf.read();
-        
-    pattern = 'export_design.+-ipname\s(\w+)\s+-version\s(\d+\.\d+)\s+-vendor\s(\w+)\s+-library\s(\w+)'
-    res = re.search(pattern, src_contents)
-    
-    if not res:
-        print_error('E: invalid HLS module create script: \'' + src_path + '\'')
-        Exit(-1)
-        
-    module_name = res.groups()[0]
+    module_name = hls_module_name(src_path)
     
     # paths and names
     hls_path           = env['BUILD_HLS_PATH']
@@ -359,7 +699,10 @@ def hls_csynth(target, source, env):
     ip_create_script   = os.path.join(env['IP_OOC_PATH'], env['IP_SCRIPT_DIRNAME'], 
                                       trg_name + '-create.' + env['TOOL_SCRIPT_SUFFIX'])
     # create hls ip
-    compile_hls_ip_repo_module(src_path, hls_ip_repo_module, env)
+    deps = [str(n) for n in (trg.implicit or [])]
+    rcode = compile_hls_ip_repo_module(src_path, hls_ip_repo_module, env, deps)
+    if rcode:
+        return rcode
     
     # generate hls ip create script
     generate_hls_ip_create_script(ip_create_script, hls_ip_repo_module, module_name, env)
@@ -370,6 +713,202 @@ def hls_csynth(target, source, env):
     
     return None
 
+#-------------------------------------------------------------------------------
+#
+#    Compile HLS IP repo module only, IP is created by 'hls_ip_create_batch'
+#
+def hls_repo_module(target, source, env):
+
+    src         = source[0]
+    trg         = target[0]
+    src_path    = str(src)
+
+    print_action('create HLS module from:    \'' + src_path + '\'')
+
+    module_name        = hls_module_name(src_path)
+    hls_ip_repo_module = os.path.dirname(trg.abspath)
+
+    deps = [str(n) for n in (trg.implicit or [])]
+
+    return compile_hls_ip_repo_module(src_path, hls_ip_repo_module, env, deps)
+
+#-------------------------------------------------------------------------------
+#
+#    Create IPs from all HLS repo modules in one Vivado session
+#
+def hls_ip_create_batch(target, source, env):
+
+
+    jobs = []
+    for trg, src in zip(target, source):
+        ip_name     = drop_suffix(trg.name)
+        log_dir     = os.path.join(env['IP_OOC_PATH'], ip_name)
+        digest_path = os.path.join(log_dir, env['HLS_IP_DIGEST_NAME'])
+        digest      = text_digest([file_digest(src.abspath), env['DEVICE'], env['VIVADO_VERSION']])
+
+        if os.path.exists(trg.abspath) and os.path.exists(digest_path):
+            with open(digest_path) as f:
+                if f.read().strip() == digest:
+                    print_info('HLS IP is up to date:      \'' + trg.name + '\'')
+                    continue
+
+        print_info('create IP from HLS repo:   \'' + trg.name + '\'')
+        Execute( Delete(os.path.dirname(trg.abspath)) )
+        jobs.append({ 'ip_name'     : ip_name,
+                      'trg_path'    : trg.abspath,
+                      'repo_module' : os.path.dirname(src.abspath),
+                      'digest'      : digest,
+                      'digest_path' : digest_path })
+
+    if not jobs:
+        return None
+
+    script_path = os.path.join(env['IP_OOC_PATH'], env['IP_SCRIPT_DIRNAME'], 
+                               'hls-ip-batch-create.' + env['TOOL_SCRIPT_SUFFIX'])
+    generate_hls_ip_batch_script(script_path, jobs, env)
+
+    logfile = os.path.join(env['IP_OOC_PATH'], 'hls-ip-batch-create.log')
+    cmd = []
+    cmd.append(env['SYNCOM'])
+    cmd.append(env['SYNFLAGS'])
+    cmd.append('-log ' + logfile)
+    cmd.append('-source ' + script_path)
+    cmd = ' '.join(cmd)
+
+    if env['VERBOSE']:
+        print(cmd)
+
+    rcode = pexec(cmd, env['IP_OOC_PATH'], exec_env=env['ENV'])
+
+    for job in jobs:
+        if not os.path.exists(job['trg_path']):
+            print_error('E: HLS IP "' + job['ip_name'] + '" is not created, see log: ' + logfile)
+            rcode = rcode if rcode else -2
+            continue
+
+        os.chmod(job['trg_path'], S_IREAD | S_IRGRP | S_IROTH)  # make target (xci) read only to disable changing during IP synthesis
+        add_sim_stuff(job['ip_name'], env)
+        with open(job['digest_path'], 'w') as f:
+            f.write(job['digest'] + os.linesep)
+
+    return rcode
+
+#-------------------------------------------------------------------------------
+#
+#    Run C simulation or co-simulation of HLS module in isolated directory,
+#    result file contains status, run time and inputs digest. Passed results
+#    are cached, failed simulation fails the target
+#
+def hls_sim(target, source, env):
+
+    src      = source[0]
+    trg      = target[0]
+    src_path = src.abspath
+    mode     = env['HLS_SIM_MODE']
+
+    try:
+        params = Params( read_config(src_path), src_path, env )
+
+    except SearchFileException as e:
+        print_error('E: HLS config read: ' + e.msg)
+        print_error('    while building target: "' + str(trg) + '"')
+        Exit(-1)
+
+    if params.error:
+        return -2
+
+    print_action('HLS ' + (mode + ':').ljust(23) + '\'' + params.name + '\'')
+
+    files  = params.src_syn_list + params.src_sim_list + params.hook_list
+    files += [str(n) for n in (trg.implicit or [])]
+    items  = [mode, env['HLS_VERSION'], env['DEVICE'], params.clock_period,
+              params.cflags, params.csimflags, env['HLS_CSIM_FLAGS'], env['HLS_COSIM_FLAGS']]
+    for f in sorted(set(files)):
+        items += [f, file_digest(f) if os.path.isfile(f) else 'missing']
+    digest = text_digest(items)
+
+    result = { 'name' : params.name, 'mode' : mode, 'digest' : digest }
+
+    cache = artifact_cache(env, 'hls_' + mode) if env['HLS_CACHE'] else None
+    meta  = cache.meta(digest) if cache and cache.contains(digest) else None
+    if meta:
+        cache.record(True)
+        result.update(meta['result'], cached = True)
+        print_info('HLS ' + mode + ' passed (cached):  \'' + params.name + '\'')
+        rcode = 0
+    else:
+        exec_dir = os.path.dirname(trg.abspath)
+        Execute( Delete(exec_dir) )
+        Execute( Mkdir(exec_dir) )
+
+        script_path = os.path.join(exec_dir, params.name + '-' + mode + '.' + env['TOOL_SCRIPT_SUFFIX'])
+        generate_sim_script(script_path, mode, params, env)
+
+        logfile = os.path.join(exec_dir, mode + '.log')
+        cmd = []
+        cmd.append(env['HLSCOM'])
+        cmd.append(env['HLSFLAGS'])
+        cmd.append('-l ' + logfile)
+        cmd.append(script_path)
+        cmd = ' '.join(cmd)
+
+        if env['VERBOSE']:
+            print(cmd)
+
+        start = time.time()
+        with hls_job_slot(env):
+            rcode = pexec(cmd, exec_dir, exec_env=env['ENV'])
+
+        result.update(status  = 'FAIL' if rcode else 'PASS',
+                      time    = round(time.time() - start, 1),
+                      log     = logfile,
+                      cached  = False)
+        if cache:
+            cache.record(False)
+            if not rcode:
+                cache.store(digest, {}, { 'name' : params.name, 'result' : { 'status' : 'PASS', 'time' : result['time'] } })
+
+    with open(trg.abspath, 'w') as f:
+        json.dump(result, f, indent=4)
+
+    if rcode:
+        print_error('E: HLS ' + mode + ' of \'' + params.name + '\' ends with error code ' + str(rcode) + ', see log: ' + result['log'])
+
+    return rcode
+
+#-------------------------------------------------------------------------------
+def hls_sim_report(target, source, env):
+
+    results = []                            # failed simulation fails its own target, all passed here
+    for src in source:
+        with open(src.abspath) as f:
+            results.append(json.load(f))
+
+    trg = target[0]
+    print_action('HLS simulation report:     \'' + trg.name + '\'')
+
+    name_len = max([len(r['name']) for r in results] + [6])
+    lines    = ['Module'.ljust(name_len) + '  Mode   Status  Time, s  Note']
+    for r in results:
+        note = 'cached' if r.get('cached') else r.get('log', '')
+        lines.append(r['name'].ljust(name_len) + '  ' + r['mode'].ljust(5) + '  ' +
+                     r['status'].ljust(6) + '  ' + str(r.get('time', '')).rjust(7) + '  ' + note)
+
+    lines.append('')
+    lines.append('Total: '     + str(len(results)) +
+                 ', passed: '  + str(len(results)))
+
+    text = os.linesep.join(lines) + os.linesep
+    with open(trg.abspath, 'w') as f:
+        f.write(text)
+
+    for line in lines:
+        print(line)
+
+    print_success('All HLS simulations passed')
+
+    return None
+
 #-------------------------------------------------------------------------------
 def read_source_list(cfg_path, src_list_name):
     try:
@@ -383,6 +922,37 @@ def read_source_list(cfg_path, src_list_name):
         print_error('    while processing file: "' + cfg_path + '"')
         Exit(-1)
     
+#-------------------------------------------------------------------------------
+#
+#    Pre-flight check of HLS config: module name, synthesis source list and
+#    files listed in source lists (config itself is checked by 'check_config')
+#
+def check_hls_config(cfg):
+
+    try:
+        params = read_config(cfg)
+
+    except SearchFileException:
+        return []
+
+    res = []
+    for key in ['name', 'src_csyn_list']:
+        if key not in params:
+            res.append(problem('"' + key + '" not specified in HLS configuration file: ' + cfg))
+
+    lists = [os.path.basename(params[key]) for key in ['src_csyn_list', 'src_csim_list', 'hook_list'] if key in params]
+
+    return res + check_src_lists(lists, os.path.dirname(cfg), [], [])
+
+#-------------------------------------------------------------------------------
+def preflight_hls_config(env, targets, cfg, params):
+
+    preflight(env, targets, 'HLS config: ' + cfg, check_config,
+              cfg, 'parameters', env['CONFIG_SEARCH_PATH'], env['CONFIG_SUFFIX'])
+    preflight(env, targets, 'HLS config: ' + cfg, check_hls_config, cfg)
+    preflight(env, targets, 'HLS include directories: ' + cfg, check_dirs,
+              hls_include_dirs(params, env), 'include directory')
+
 #-------------------------------------------------------------------------------
 #
 #   Pseudo-builders
@@ -397,99 +967,160 @@ def create_hls_csynth_script(env, src):
     
     # generate dependencies from sources
     for s in src:
-        try:
-            params = read_config(s)
-
-        except SearchFileException as e:
-            print_error('E: HLS config read: ' + e.msg)
-            print_error('    while running "LaunchHlsCSynthScript" builder')
-            Exit(-1)
-        
-        #-----------------------------------------------------------------
-        # synthesis source list
-        if not 'src_csyn_list' in params:
-            print_error('E: HLS module has no synthesis source list in configuration file: \'' + s + '\'')
-            Exit(-2)
-    
-        src_csyn_list = read_source_list(s, params['src_csyn_list'])
-    
-        #-----------------------------------------------------------------
-        # simulation source list
-        if not 'src_csim_list' in params:
-            src_csim_list = []
-        else:
-            src_csim_list = read_source_list(s, params['src_csim_list'])
-    
-        #-----------------------------------------------------------------
-        # hook list
-        if not 'hook_list' in params:
-            hook_list = []
-        else:
-            hook_list = read_source_list(s, params['hook_list'])
-            
-        source = str.split(s) + src_csyn_list + hook_list
+        params, deps = hls_csynth_deps(s, 'CreateHlsCSynthScript')
+        source = str.split(s) + deps
     
         trg_name = get_name(s) + '-csynth.' + env['TOOL_SCRIPT_SUFFIX']
         target   = os.path.join(env['BUILD_HLS_PATH'], env['HLS_SCRIPT_DIRNAME'], trg_name)
-        targets.append( env.HlsCSynthScript(target, source, env) )
+        trg = env.HlsCSynthScript(target, source)
+        preflight_hls_config(env, trg, s, params)
+        targets.append(trg)
 
+    env.Precious(targets)                          # scripts are rewritten only if changed
     return targets
         
 #-------------------------------------------------------------------------------
-def launch_hls_csynth(env, src, cfg=None):
+#
+#    Parameters and synthesis dependencies (sources, hooks) of HLS module.
+#    In pre-flight mode configs are not evaluated: problems are reported by
+#    registered checks, raw parameters are enough to name the targets
+#
+def hls_csynth_deps(cfg, builder_name):
 
-    from site_scons.site_tools.vivado.ipcores import make_trg_nodes
+    if preflight_enabled():
+        return preflight_params(cfg), []
+
+    try:
+        params = read_config(cfg)
+
+    except SearchFileException as e:
+        print_error('E: HLS config read: ' + e.msg)
+        print_error('    while running "' + builder_name + '" builder')
+        Exit(-1)
+
+    #-----------------------------------------------------------------
+    # synthesis source list
+    if not 'src_csyn_list' in params:
+        print_error('E: HLS module has no synthesis source list in configuration file: \'' + cfg + '\'')
+        Exit(-2)
+
+    csyn_list= read_source_list(cfg, params['src_csyn_list'])
+
+    #-----------------------------------------------------------------
+    # hook list
+    if not 'hook_list' in params:
+        hook_list = []
+    else:
+        hook_list = read_source_list(cfg, params['hook_list'])
+        
+    return params, csyn_list + hook_list
+
+#-------------------------------------------------------------------------------
+def zip_hls_src_cfg(src, cfg, builder_name):
 
     if cfg:
         if len(src) != len(cfg):
-            print_error('E: hls_csynth: src count:', len(src), 'must be equal to cfg count:', len(cfg))
+            print_error('E: ' + builder_name + ': src count: ' + str(len(src)) + ' must be equal to cfg count: ' + str(len(cfg)))
             Exit(2)
 
-        src = list(zip(src, cfg))
-    else:
-        if not SCons.Util.is_List(cfg):
-            print_error('E: hls_csynth: "cfg" argument (hls module config YAML file) not specified')
-            Exit(2)
-    
+        return list(zip(src, cfg))
+
+    print_error('E: ' + builder_name + ': "cfg" argument (hls module config YAML file) not specified')
+    Exit(2)
+
+#-------------------------------------------------------------------------------
+def launch_hls_csynth(env, src, cfg=None):
+
+    from site_scons.site_tools.vivado.ipcores import make_trg_nodes
+
+    src = zip_hls_src_cfg(src, cfg, 'hls_csynth')
     
     trglist = []
     src_sfx = '-csynth.'+env['TOOL_SCRIPT_SUFFIX']
     trg_sfx = env['HLS_IP_NAME_SUFFIX'] + '.'+env['IP_CORE_SUFFIX']
-    builder = env.HlsCSynth
     for i in src:
         script = i[0]
         cfg    = i[1]
 
         # generate dependencies from sources
-        try:
-            params = read_config(cfg)
+        params, deps = hls_csynth_deps(cfg, 'LaunchHlsCSynth')
+        builder      = env.Override({ 'HLS_INC_PATH' : hls_include_dirs(params, env) }).HlsCSynth
+            
+        ip_name = get_ip_name(script, src_sfx) + env['HLS_IP_NAME_SUFFIX']
+        trg_dir = os.path.join( env['IP_OOC_PATH'], ip_name, ip_name )
+        trglist.append(make_trg_nodes(script + deps, src_sfx, trg_sfx, trg_dir, builder))
+        preflight_hls_config(env, trglist[-1], cfg, params)
 
-        except SearchFileException as e:
-            print_error('E: HLS config read: ' + e.msg)
-            print_error('    while running "LaunchHlsCSynth" builder')
-            Exit(-1)
+    return trglist
+    
+#-------------------------------------------------------------------------------
+#
+#    Same targets as 'launch_hls_csynth', but IPs of all HLS modules are
+#    created in one Vivado session with single IP catalog update
+#
+def launch_hls_csynth_batch(env, src, cfg=None):
 
-        #-----------------------------------------------------------------
-        # synthesis source list
-        if not 'src_csyn_list' in params:
-            print_error('E: HLS module has no synthesis source list in configuration file: \'' + cfg + '\'')
-            Exit(-2)
+    src = zip_hls_src_cfg(src, cfg, 'hls_csynth_batch')
 
-        csyn_list= read_source_list(cfg, params['src_csyn_list'])
+    components = []
+    xci_list   = []
+    src_sfx    = '-csynth.'+env['TOOL_SCRIPT_SUFFIX']
+    for i in src:
+        script = i[0]
+        cfg    = i[1]
+
+        params, deps = hls_csynth_deps(cfg, 'LaunchHlsCSynthBatch')
+
+        component = os.path.join(env['BUILD_HLS_PATH'], 'ip', params.get('name', get_name(cfg)), 'component.xml')
+        benv   = env.Override({ 'HLS_INC_PATH' : hls_include_dirs(params, env) })
+        module = benv.HlsRepoModule(component, script + deps)
+        env.Precious(module)                       # keep repo module for incremental extraction
+        preflight_hls_config(env, module, cfg, params)
+        components += module
 
-        #-----------------------------------------------------------------
-        # hook list
-        if not 'hook_list' in params:
-            hook_list = []
-        else:
-            hook_list = read_source_list(cfg, params['hook_list'])
-            
         ip_name = get_ip_name(script, src_sfx) + env['HLS_IP_NAME_SUFFIX']
-        trg_dir = os.path.join( env['IP_OOC_PATH'], ip_name, ip_name )
-        trglist.append(make_trg_nodes(script + csyn_list + hook_list, src_sfx, trg_sfx, trg_dir, builder))
+        xci_list.append(os.path.join(env['IP_OOC_PATH'], ip_name, ip_name, ip_name + '.' + env['IP_CORE_SUFFIX']))
 
-    return trglist
+    trglist = env.HlsIpCreateBatch(xci_list, components)
+    env.Precious(trglist)                          # keep IPs for up-to-date check
+
+    return [[t] for t in trglist]
     
+#-------------------------------------------------------------------------------
+#
+#    HLS simulation regression: one result target per module (run under
+#    SCons '-j' and HLS_MAX_JOBS limit) and summary report
+#
+def launch_hls_sim(env, cfg, mode):
+
+    if not SCons.Util.is_List(cfg):
+        cfg = cfg.split()
+
+    results = []
+    for c in cfg:
+        params, deps = hls_csynth_deps(c, 'LaunchHls' + ('CSim' if mode == 'csim' else 'CoSim'))
+        if 'src_csim_list' in params and not preflight_enabled():
+            deps += read_source_list(c, params['src_csim_list'])
+
+        name = params.get('name', get_name(c))
+        trg  = os.path.join(env['BUILD_HLS_PATH'], '_sim', name, mode, name + '-' + mode + '.result')
+        benv = env.Override({ 'HLS_SIM_MODE' : mode, 'HLS_INC_PATH' : hls_include_dirs(params, env) })
+        res  = benv.HlsSim(trg, [os.path.abspath(c)] + deps)
+        preflight_hls_config(env, res, c, params)
+        results += res
+
+    report = os.path.join(env['BUILD_HLS_PATH'], 'hls-' + mode + '-report.txt')
+
+    return env.HlsSimReport(report, results)
+
+#-------------------------------------------------------------------------------
+def launch_hls_csim(env, cfg):
+    return launch_hls_sim(env, cfg, 'csim')
+
+#-------------------------------------------------------------------------------
+def launch_hls_cosim(env, cfg):
+    return launch_hls_sim(env, cfg, 'cosim')
+
 #-------------------------------------------------------------------------------
 def hlsip_syn_scripts(env, src):
     
@@ -503,6 +1134,7 @@ def hlsip_syn_scripts(env, src):
     for i in src:
         trglist.append(make_trg_nodes(i, src_sfx, trg_sfx, trg_dir, builder))
 
+    env.Precious(trglist)                          # scripts are rewritten only if changed
     return trglist
 
 #-------------------------------------------------------------------------------
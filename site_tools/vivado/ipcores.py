@@ -9,6 +9,8 @@
 import os
 
 from utils import *
+from preflight import preflight, check_config
+from site_scons.site_tools.vivado.cache import artifact_cache
 
 #-------------------------------------------------------------------------------
 #
@@ -44,7 +46,9 @@ def ip_create_script(target, source, env):
     'This file is automatically generated. Do not edit the file manually,' + os.linesep + \
     'change parameters of IP in corresponing configuration file (cfg/ip/<IP name>)'
 
-    text  = 'set ip_name    ' + ip_name                                   + os.linesep
+    text  = Emitter()
+    text.title(title_text, '#')
+    text += 'set ip_name    ' + ip_name                                   + os.linesep
     text += 'set DEVICE     ' + env['DEVICE']                             + os.linesep
     text += 'set IP_OOC_DIR ' + os.path.join(env['IP_OOC_PATH'], ip_name) + os.linesep*2
     text += 'set_part  ${DEVICE}'                                         + os.linesep
@@ -59,17 +63,14 @@ def ip_create_script(target, source, env):
 
     text += 'set_property -dict {' + os.linesep
 
+    items = []
     for p in ip_params:
         v = str(ip_params[p])
         if v == 'True' or v == 'False':
             v =  v.lower()
-        v = '{' + v + '}'
-        name_len      = len(p)
-        value_len     = len(v)
-        name_padding  = len(param_sect) + max_pn_len - name_len + 2
-        line  = ' '*4 + param_sect + '.' + p + ' '*name_padding + v
+        items.append((param_sect + '.' + p, '{' + v + '}'))
 
-        text += line + os.linesep
+    text.aligned(items, 2*len(param_sect) + max_pn_len + 3, ' '*4)
 
     text += '} [get_ips ${ip_name}]' + os.linesep
 
@@ -78,13 +79,9 @@ def ip_create_script(target, source, env):
     text += 'export_simulation -of_objects [get_ips ${ip_name}] -simulator questa -absolute_path -force '
     text += '-directory ' + env['SIM_SCRIPT_PATH'] + os.linesep
     text += 'exit'
+    text.footer('#')
 
-    out = generate_title(title_text, '#')
-    out += text
-    out += generate_footer('#')
-
-    with open(trg_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(trg_path, text.text())
 
     return None
 #---------------------------------------------------------------------
@@ -109,7 +106,9 @@ def ip_syn_script(target, source, env):
     'This file is automatically generated. Do not edit the file manually,' + os.linesep + \
     'change parameters of IP in corresponing configuration file (cfg/ip/<IP name>)'
 
-    text  = 'set ip_name    ' + ip_name                                     + os.linesep
+    text  = Emitter()
+    text.title(title_text, '#')
+    text += 'set ip_name    ' + ip_name                                     + os.linesep
     text += 'set DEVICE     ' + env['DEVICE']                               + os.linesep
     text += 'set IP_OOC_DIR ' + env['IP_OOC_PATH']                          + os.linesep
     text += 'set OUT_DIR    '  + out_dir                                    + os.linesep*2
@@ -129,19 +128,33 @@ def ip_syn_script(target, source, env):
     else:
         text += 'synth_ip  [get_ips ${ip_name}]'                            + os.linesep
     text += 'exit'
+    text.footer('#')
 
-    out = generate_title(title_text, '#')
-    out += text
-    out += generate_footer('#')
-
-    #print(out)
-
-    with open(trg_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(trg_path, text.text())
         
     return None
 #---------------------------------------------------------------------
 #
+#    IP cache key: tool script contents with build tree paths dropped,
+#    so the key is the same for any checkout location
+#
+def ip_digest(items, script_path, env):
+
+    with open(script_path) as f:
+        text = f.read()
+
+    for p in [env['IP_OOC_PATH'], env['SIM_SCRIPT_PATH']]:
+        text = text.replace(p, '')
+
+    return text_digest(items + [env['DEVICE'], env['VIVADO_VERSION'], text])
+
+#---------------------------------------------------------------------
+def ip_cache_subst(meta, env):
+    return { meta['ip_ooc_path']     : env['IP_OOC_PATH'],
+             meta['sim_script_path'] : env['SIM_SCRIPT_PATH'] }
+
+#---------------------------------------------------------------------
+#
 #    Generate IP
 #
 def ip_create(target, source, env):
@@ -153,10 +166,23 @@ def ip_create(target, source, env):
     trg_path = str(trg)
     ip_name  = drop_suffix(trg.name)
     trg_dir  = os.path.join(env['IP_OOC_PATH'], ip_name)
+    sim_dir  = os.path.join(env['SIM_SCRIPT_PATH'], ip_name)
     logfile  = os.path.join(trg_dir, 'create.log')
 
     print_action('create IP core:            \'' + trg.name + '\'')
 
+    #-------------------------------------------------------
+    #
+    #   Restore IP core from cache
+    #
+    cache  = artifact_cache(env, 'ip') if env['IP_CACHE'] else None
+    trees  = { 'ip' : trg_dir, 'sim' : sim_dir }
+    digest = ip_digest(['ip-create', ip_name], src_path, env)
+    meta   = cache.meta(digest) if cache and cache.contains(digest) else None
+    if meta and cache.restore(digest, trees, ip_cache_subst(meta, env)):
+        print_info('restore IP core from cache: \'' + ip_name + '\'')
+        return None
+
     Execute( Delete(trg_dir) )
     Execute( Mkdir(trg_dir) )
 
@@ -171,8 +197,20 @@ def ip_create(target, source, env):
         print(cmd)
 
     rcode = pexec(cmd, trg_dir, exec_env=env['ENV'])
+    if rcode:
+        return rcode
+
+    with open(os.path.join(trg_dir, env['IP_DIGEST_NAME']), 'w') as f:
+        f.write(digest + os.linesep)
 
-    return rcode
+    if cache:
+        meta = { 'name'            : ip_name,
+                 'device'          : env['DEVICE'],
+                 'ip_ooc_path'     : env['IP_OOC_PATH'],
+                 'sim_script_path' : env['SIM_SCRIPT_PATH'] }
+        cache.store(digest, trees, meta)
+
+    return None
 
 #---------------------------------------------------------------------
 #
@@ -191,6 +229,24 @@ def ip_synthesize(target, source, env):
 
     print_action('synthesize IP core:        \'' + trg.name + '\'')
 
+    #-------------------------------------------------------
+    #
+    #   Restore synthesized IP core from cache: the key includes
+    #   digest of created IP core, so the synthesis result is
+    #   reused only for the same IP core contents
+    #
+    cache       = artifact_cache(env, 'ip') if env['IP_CACHE'] else None
+    trees       = { 'ip' : trg_dir }
+    digest_path = os.path.join(trg_dir, env['IP_DIGEST_NAME'])
+    digest      = None
+    if cache and os.path.exists(digest_path):
+        with open(digest_path) as f:
+            digest = ip_digest(['ip-syn', ip_name, f.read().strip()], src_path, env)
+        meta = cache.meta(digest) if cache.contains(digest) else None
+        if meta and cache.restore(digest, trees, ip_cache_subst(meta, env)):
+            print_info('restore synthesized IP core from cache: \'' + ip_name + '\'')
+            return None
+
     cmd = []
     cmd.append(env['SYNCOM'])
     cmd.append(env['SYNFLAGS'])
@@ -200,9 +256,18 @@ def ip_synthesize(target, source, env):
 
     if env['VERBOSE']:
         print(cmd)
-    rcode = pexec(cmd, trg_dir, exec_env=env['ENV'])
+    rcode = pexec(cmd, trg_dir, exec_env=env['ENV'], remote=remote_backend(env), manifest=[str(s) for s in source])
+    if rcode:
+        return rcode
+
+    if digest:
+        meta = { 'name'            : ip_name,
+                 'device'          : env['DEVICE'],
+                 'ip_ooc_path'     : env['IP_OOC_PATH'],
+                 'sim_script_path' : env['SIM_SCRIPT_PATH'] }
+        cache.store(digest, trees, meta)
 
-    return rcode
+    return None
 
 #-------------------------------------------------------------------------------
 #
@@ -234,8 +299,12 @@ def ip_create_scripts(env, src):
     create_dirs([trg_dir])
     builder = env.IpCreateScript
     for i in src:
-        res.append(make_trg_nodes(i, src_sfx, trg_sfx, trg_dir, builder))
+        trg = make_trg_nodes(i, src_sfx, trg_sfx, trg_dir, builder)
+        preflight(env, trg, 'IP config: ' + str(i), check_config,
+                  str(i), 'config', env['CONFIG_SEARCH_PATH'], env['CONFIG_SUFFIX'])
+        res.append(trg)
 
+    env.Precious(res)                   # scripts are rewritten only if changed
     return res
 #---------------------------------------------------------------------
 def ip_syn_scripts(env, src):
@@ -247,6 +316,7 @@ def ip_syn_scripts(env, src):
     for i in src:
         res.append(make_trg_nodes(i, src_sfx, trg_sfx, trg_dir, builder))
 
+    env.Precious(res)                   # scripts are rewritten only if changed
     return res
 #---------------------------------------------------------------------
 def create_ips(env, src):
@@ -7,8 +7,45 @@
 #-------------------------------------------------------------------------------
 
 import os
+import re
+import pickle
+import concurrent.futures
+import multiprocessing
 
 from utils import *
+from preflight import preflight, preflight_enabled, check_config, check_src_lists, check_hdl_files
+
+#-------------------------------------------------------------------------------
+#
+#    Evaluate config files concurrently in worker processes, results are in
+#    declared order. Workers are spawned, not forked, as SCons runs actions
+#    in threads (worker functions are in 'utils', importable by spawned
+#    process). Falls back to serial evaluation if the pool is not usable
+#
+def eval_cfg_files(paths, env):
+
+    jobs = env['CFG_EVAL_JOBS'] or os.cpu_count() or 1
+    jobs = min(jobs, len(paths))
+
+    if jobs > 1 and len(paths) >= env['CFG_EVAL_POOL_MIN']:
+        try:
+            ctx = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                                                        initializer=init_cfg_eval_worker,
+                                                        initargs=(get_search_path(), check_exclude_path)) as pool:
+                results = list(pool.map(eval_cfg_worker, paths))
+
+        except (OSError, concurrent.futures.process.BrokenProcessPool, pickle.PicklingError):
+            results = None
+
+        if results is not None:
+            for rcode, params in results:
+                if rcode is not None:
+                    Exit(rcode)
+
+            return [params for rcode, params in results]
+
+    return [eval_cfg_file(p) for p in paths]
 
 #-------------------------------------------------------------------------------
 #
@@ -16,7 +53,8 @@ from utils import *
 #
 def generate_hdl_header(guard_name : str) -> str:
     guard  = 'GUARD_' + guard_name.upper() + '_SVH'
-    text   = generate_title('This file is automatically generated. Do not edit the file!', '//')
+    text   = Emitter()
+    text.title('This file is automatically generated. Do not edit the file!', '//')
     text  += '`ifndef ' + guard + os.linesep
     text  += '`define ' + guard + os.linesep*2
 
@@ -28,50 +66,16 @@ def generate_hdl_header(guard_name : str) -> str:
     
     return guard, text
 #---------------------------------------------------------------------
-def cfg_params_header(target, source, env):
-
-    def_name = get_name(target[0].name) # header with macro definitins
-    pkg_name = get_name(target[1].name) # header with SV package
-    
-    print_action('create cfg params headers: \'' + def_name + '.svh, ' + pkg_name + '.svh\'' )
-    params = {}
-    params_pkg = {}
-    for src in source:
-        try:
-            cfg_params = read_config(str(src))
-            
-        except SearchFileException as e:
-            print_error('E: ' + e.msg)
-            print_error('    while running "CreateCfgParamsHeader" builder')
-            Exit(-1)
-        
-        params.update( prefix_suffix(str(src), cfg_params) )
-
-    guard_name_def, text = generate_hdl_header(def_name)
-    
-    #-----------------------------------------------------------------
-    #
-    #    Define section
-    #
-    max_len = max_str_len(params.keys()) + 2
-    for p in params:
-        value  = str(params[p])
-        if value != '__NO_DEFINE__':
-            text += '`define ' + p + ' '*(max_len - len(p)) + value + os.linesep
-
-    text += os.linesep
-    text_def = text
+#
+#    SV package with localparams, type column is aligned by 'nalign'
+#
+def emit_params_package(text, pkg_name, params, max_len):
 
-    #-----------------------------------------------------------------
-    #
-    #    Package section
-    #
-    guard_name_pkg, text = generate_hdl_header(pkg_name)
-    max_len   = max_str_len(params.keys()) + 2
     val_types = [type(i) for i in params.values()]
     nalign    = [4, 3] if str in val_types else [2, 1] if float in val_types else [1]
     
     text += 'package ' + pkg_name + ';' + os.linesep*2
+    items = []
     for p in params:
         value = params[p]
         
@@ -90,10 +94,112 @@ def cfg_params_header(target, source, env):
             Exit(-1)
             
         if value != '__NO_DEFINE__':
-            text += '    localparam ' + type_spec + p + ' '*(max_len - len(p)) + ' = ' + \
-            qmark + str(value) + qmark + ';' + os.linesep
-                
+            items.append((type_spec + p, qmark + str(value) + qmark))
+
+    type_len = len('int') + nalign[0]               # all type specs have the same length
+    text.aligned(items, max_len + type_len, '    localparam ', ' = ', ';')
     text += os.linesep + 'endpackage : ' + pkg_name + os.linesep
+
+#-------------------------------------------------------------------------------
+#
+#    Identifiers used in HDL sources
+#
+def hdl_identifiers(files):
+    
+    pattern = re.compile(r'[A-Za-z_]\w*')
+    idents  = set()
+    for f in files:
+        with open(f, errors='replace') as ifile:
+            idents.update(pattern.findall(ifile.read()))
+
+    return idents
+
+#-------------------------------------------------------------------------------
+#
+#    HDL sources scanned for parameter references: files or source list
+#    configs in CFG_PARAMS_HDL_SOURCES
+#
+def cfg_params_hdl_sources(env):
+    
+    files = []
+    for s in env['CFG_PARAMS_HDL_SOURCES']:
+        s = str(s)
+        if get_suffix(s) == env['CONFIG_SUFFIX']:
+            files += read_sources(s, env['CFG_PATH'])
+        else:
+            files.append(os.path.abspath(s))
+
+    return files
+
+#-------------------------------------------------------------------------------
+#
+#    Parameters header. Optional modes:
+#
+#      CFG_PARAMS_GROUPED:     SV package per config file named
+#                              <header name>_<config name>_pkg, non-word
+#                              characters of config name are replaced by '_'
+#      CFG_PARAMS_HDL_SOURCES: only parameters referenced in the HDL
+#                              sources are emitted, unused ones are
+#                              reported in <header name>-unused.txt
+#
+def cfg_params_header(target, source, env):
+
+    def_name = get_name(target[0].name) # header with macro definitins
+    pkg_name = get_name(target[1].name) # header with SV package
+    
+    print_action('create cfg params headers: \'' + def_name + '.svh, ' + pkg_name + '.svh\'' )
+    params = {}
+    groups = []
+    try:
+        for src, cfg_params in zip(source, eval_cfg_files([str(src) for src in source], env)):
+            params.update(cfg_params)
+            groups.append( (get_name(str(src)), cfg_params) )
+            
+    except SearchFileException as e:
+        print_error('E: ' + e.msg)
+        print_error('    while running "CreateCfgParamsHeader" builder')
+        Exit(-1)
+
+    if env['CFG_PARAMS_HDL_SOURCES']:
+        hdl_files = [f for f in cfg_params_hdl_sources(env) if os.path.basename(f) not in [target[0].name, target[1].name]]
+        idents    = hdl_identifiers(hdl_files)
+        unused    = [(name, p) for name, group in groups for p in group if p not in idents]
+
+        params = { p : params[p] for p in params if p in idents }
+        groups = [(name, { p : group[p] for p in group if p in idents }) for name, group in groups]
+
+        report_path = os.path.join(str(target[0].dir), def_name + '-unused.txt')
+        report      = Emitter()
+        report.lines([name + ': ' + p for name, p in unused])
+        write_if_changed(report_path, report.text())
+        if unused:
+            print_info('    unused parameters: ' + str(len(unused)) + ', see "' + report_path + '"')
+
+    max_len = max_str_len(list(params.keys()) or ['']) + 2
+
+    guard_name_def, text = generate_hdl_header(def_name)
+    
+    #-----------------------------------------------------------------
+    #
+    #    Define section
+    #
+    text.aligned([(p, str(params[p])) for p in params if str(params[p]) != '__NO_DEFINE__'], max_len, '`define ')
+
+    text += os.linesep
+    text_def = text
+
+    #-----------------------------------------------------------------
+    #
+    #    Package section
+    #
+    guard_name_pkg, text = generate_hdl_header(pkg_name)
+    if env['CFG_PARAMS_GROUPED']:
+        for name, group in groups:
+            if group:
+                emit_params_package(text, def_name + '_' + re.sub(r'\W', '_', name) + '_pkg', group, max_str_len(group.keys()) + 2)
+                text += os.linesep
+    else:
+        emit_params_package(text, pkg_name, params, max_len)
     #-----------------------------------------------------------------
     
     footer_def  = os.linesep + '`endif // ' + guard_name_def + os.linesep
@@ -103,12 +209,10 @@ def cfg_params_header(target, source, env):
     text     += footer_pkg
     
     def_hdr_path = str(target[0])
-    with open(def_hdr_path, 'w') as ofile:
-        ofile.write(text_def)
+    write_if_changed(def_hdr_path, text_def.text())
         
     pkg_hdr_path = str(target[1])
-    with open(pkg_hdr_path, 'w') as ofile:
-        ofile.write(text)
+    write_if_changed(pkg_hdr_path, text.text())
 
     return None
 
@@ -123,31 +227,23 @@ def cfg_params_tcl(target, source, env):
 
     print_action('create cfg params tcl:     \'' + trg.name + '\'')
     params = {}
-    for src in source:
-        try:
-            cfg_params = read_config(str(src))
+    try:
+        for cfg_params in eval_cfg_files([str(src) for src in source], env):
+            params.update(cfg_params)
 
-        except SearchFileException as e:
-            print_error('E: ' + e.msg)
-            print_error('    while running "CreateCfgParamsTcl" builder')
-            Exit(-1)
-                
-        cfg_params = prefix_suffix(str(src), cfg_params)
-        params.update(cfg_params)
+    except SearchFileException as e:
+        print_error('E: ' + e.msg)
+        print_error('    while running "CreateCfgParamsTcl" builder')
+        Exit(-1)
 
     max_len = max_str_len(params.keys()) + 2
 
-    text  = generate_title('This file is automatically generated. Do not edit the file!', '#')
-    for p in params:
-        value = str(params[p])
-        if not value:
-            value = '""'
-        text += 'set ' + p + ' '*(max_len - len(p)) + value + os.linesep
-
-    text += generate_footer('#')
+    text  = Emitter()
+    text.title('This file is automatically generated. Do not edit the file!', '#')
+    text.aligned([(p, str(params[p]) or '""') for p in params], max_len, 'set ')
+    text.footer('#')
 
-    with open(trg_path, 'w') as ofile:
-        ofile.write(text)
+    write_if_changed(trg_path, text.text())
 
     return None
 
@@ -172,7 +268,23 @@ def create_cfg_params_header(env, trg, src):
     trg1      = trg.replace(trg0_name, trg1_name)
     target = [trg, trg1]
 
-    env.CfgParamsHeader(target, source)
+    hdr = env.CfgParamsHeader(target, source)
+    env.Precious(hdr)                                   # headers are rewritten only if changed
+    preflight_configs(env, hdr, source)
+    if env['CFG_PARAMS_HDL_SOURCES'] and preflight_enabled():
+        hdl  = [str(s) for s in env['CFG_PARAMS_HDL_SOURCES']]
+        cfgs = [s for s in hdl if get_suffix(s) == env['CONFIG_SUFFIX']]
+        sfx  = [env['V_SUFFIX'], env['SV_SUFFIX'], env['V_HEADER_SUFFIX'], env['SV_HEADER_SUFFIX'], env['SV_PACKAGE_SUFFIX']]
+        preflight(env, hdr, 'parameters header HDL sources', check_src_lists, cfgs, env['CFG_PATH'], [env['BUILD_SRC_PATH']], sfx)
+        preflight(env, hdr, 'parameters header HDL sources', check_hdl_files,
+                  [os.path.abspath(s) for s in hdl if s not in cfgs], [env['BUILD_SRC_PATH']], sfx)
+    elif env['CFG_PARAMS_HDL_SOURCES']:
+        env.Depends(hdr, cfg_params_hdl_sources(env))
+
+    if env['CFG_PARAMS_HDL_SOURCES']:                   # unused parameters report
+        report = os.path.join(os.path.dirname(trg), trg0_name + '-unused.txt')
+        env.SideEffect(report, hdr)
+        env.Clean(hdr, report)
 
     return target
 
@@ -192,9 +304,17 @@ def create_cfg_params_tcl(env, trg, src):
             
         source.append(ss)
 
-    env.CfgParamsTcl(trg, source)
+    tcl = env.CfgParamsTcl(trg, source)
+    env.Precious(tcl)                                   # script is rewritten only if changed
+    preflight_configs(env, tcl, source)
 
     return trg
 
 #-------------------------------------------------------------------------------
+def preflight_configs(env, targets, source):
+    for s in source:
+        preflight(env, targets, 'parameters config: ' + s, check_config,
+                  s, 'parameters', env['CONFIG_SEARCH_PATH'], env['CONFIG_SUFFIX'])
+
+#-------------------------------------------------------------------------------
 
@@ -10,6 +10,8 @@ import os
 import re
 
 from utils import *
+from preflight import preflight, check_src_lists, check_dirs
+from manifest  import source_manifest, include_dirs, SourceManifestException
 
 #---------------------------------------------------------------------
 #
@@ -29,55 +31,21 @@ def vivado_project(target, source, env):
     #
     #   Classify sources
     #
-    syn     = []
-    sim     = []
-    ip      = []
-    bd      = []
-    xdc     = []
-    tcl     = []
-    incpath = env['INC_PATH']
-
-    for s in source:
-        s = str(s)
-        sfx = get_suffix(s)
-        if sfx not in [env['IP_CORE_SUFFIX'], env['BD_SUFFIX']] :
-            path   = search_file(s, env['CFG_PATH'])
-            suffix = get_suffix(path)
-            if suffix == env['TOOL_SCRIPT_SUFFIX']:
-                tcl.append( os.path.abspath(path) )
-
-            elif suffix == env['CONFIG_SUFFIX']:
-                try:
-                    path_list, used_in = read_sources(path, env['CFG_PATH'], True)
-                    
-                except SearchFileException as e:
-                    print_error('E: ' + e.msg)
-                    print_error('    while running "CreateVivadoProject" builder')
-                    Exit(-1)
-
-                for item in path_list:
-                    src_suffix = get_suffix(item)
-                    if src_suffix in [env['V_SUFFIX'], env['SV_SUFFIX'], env['SV_HEADER_SUFFIX'], env['SV_PACKAGE_SUFFIX']]:
-                        if used_in == 'syn':
-                            syn.append(item)
-                        elif used_in == 'sim':
-                            sim.append(item)
-                        else:
-                            print_error('E: unsupported "use_in" value: "' + used_in + '" in ' + path)
-                            return -2
-                        incpath.append(os.path.dirname(item))
-
-                    if src_suffix in env['CONSTRAINTS_SUFFIX']:
-                        xdc.append(item)
-            else:
-                print_error('E: unsupported file type. Only \'yml\', \'tcl\' file types supported')
-                return -1
-
-        elif sfx == env['IP_CORE_SUFFIX']:
-            ip.append(os.path.abspath(s))
-        else:
-            bd.append(os.path.abspath(s))
-            
+    try:
+        manifest = source_manifest(env, source).build()
+
+    except SourceManifestException as e:
+        print_error('E: ' + e.msg)
+        print_error('    while running "CreateVivadoProject" builder')
+        return e.rcode
+
+    syn     = manifest.syn.list()
+    sim     = manifest.sim.list()
+    ip      = manifest.ip.list()
+    bd      = manifest.bd.list()
+    xdc     = manifest.xdc.list()
+    tcl     = manifest.tcl.list()
+    incpath = manifest.incpath.list()
 
     #-------------------------------------------------------
     #
@@ -99,14 +67,15 @@ def vivado_project(target, source, env):
     'Vivado project "' + project_name + '" create script' + os.linesep*2 + \
     'This file is automatically generated. Do not edit the file manually.'
 
-    text  = 'set PROJECT_NAME ' + env['VIVADO_PROJECT_NAME'] + os.linesep
+    text  = Emitter()
+    text.title(title_text, '#')
+    text += 'set PROJECT_NAME ' + env['VIVADO_PROJECT_NAME'] + os.linesep
     text += 'set TOP_NAME '     + env['TOP_NAME']            + os.linesep
     text += 'set TOP_TB_NAME '  + env['TESTBENCH_NAME']      + os.linesep
     text += 'set DEVICE '       + env['DEVICE']              + os.linesep*2
 
     user_params = env['USER_DEFINED_PARAMS']
-    for key in user_params:
-        text += 'set ' + key + ' ' + user_params[key] + os.linesep
+    text.lines([key + ' ' + user_params[key] for key in user_params], 'set ')
 
     project_create_args = [env['PROJECT_CREATE_FLAGS'], '${PROJECT_NAME}.' + env['VIVADO_PROJECT_SUFFIX'], '.']
         
@@ -145,8 +114,7 @@ def vivado_project(target, source, env):
     text += 'puts "------------------------------------------------------------"' + os.linesep
     text += '# Add IP' + os.linesep
     text += 'puts "add IPs"' + os.linesep
-    for i in ip:
-        text += 'read_ip ' + i + os.linesep
+    text.lines(ip, 'read_ip ')
     text += os.linesep
 
     text += 'puts "------------------------------------------------------------"' + os.linesep
@@ -185,19 +153,14 @@ def vivado_project(target, source, env):
     text += '# User-defined scripts' + os.linesep
     text += 'puts "------------------------------------------------------------"' + os.linesep
     text += 'puts "add user hooks"' + os.linesep
-    for t in tcl:
-        text += 'source ' + t + os.linesep
+    text.lines(tcl, 'source ')
 
     text += 'close_project' + os.linesep
-
-    out = generate_title(title_text, '#')
-    out += text
-    out += generate_footer('#')
+    text.footer('#')
 
     script_name = project_name + '-project-create.' + env['TOOL_SCRIPT_SUFFIX']
     script_path = os.path.join(str(project_dir), script_name)
-    with open(script_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(script_path, text.text())
 
     #-------------------------------------------------------
     #
@@ -275,8 +238,7 @@ def synth_vivado_project(target, source, env):
 
     script_name = project_name + '-project-synth.' + env['TOOL_SCRIPT_SUFFIX']
     script_path = os.path.join(env['BUILD_SYN_PATH'], script_name)
-    with open(script_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(script_path, out)
 
     #-------------------------------------------------------
     #
@@ -296,7 +258,7 @@ def synth_vivado_project(target, source, env):
     if env['VERBOSE']:
         print(cmd)
 
-    rcode = pexec(cmd, project_dir, exec_env=env['ENV'])
+    rcode = pexec(cmd, project_dir, exec_env=env['ENV'], remote=remote_backend(env), manifest=[script_path])
     if rcode:
         msg = 'E: project synthesis ends with error code, see log for details'
         print_error('\n' + '*'*len(msg))
@@ -355,8 +317,7 @@ def impl_vivado_project(target, source, env):
 
     script_name = project_name + '-project-impl.' + env['TOOL_SCRIPT_SUFFIX']
     script_path = os.path.join(env['BUILD_SYN_PATH'], script_name)
-    with open(script_path, 'w') as ofile:
-        ofile.write(out)
+    write_if_changed(script_path, out)
 
     #-------------------------------------------------------
     #
@@ -376,7 +337,7 @@ def impl_vivado_project(target, source, env):
     if env['VERBOSE']:
         print(cmd)
         
-    rcode = pexec(cmd, env['BUILD_SYN_PATH'], exec_env=env['ENV'])
+    rcode = pexec(cmd, env['BUILD_SYN_PATH'], exec_env=env['ENV'], remote=remote_backend(env), manifest=[script_path])
     if rcode:
         msg = 'E: project build ends with error code, see log for details'
         print_error('\n' + '*'*len(msg))
@@ -444,6 +405,14 @@ def create_vivado_project(env, src, ip_cores = [], bd = []):
         source.append(path)
 
     env.VivadoProject(target, source + ip_cores + bd)
+    source_manifest(env, source + ip_cores + bd)
+
+    incpath = include_dirs(env)
+    hdl_sfx = [env['V_SUFFIX'], env['SV_SUFFIX'], env['V_HEADER_SUFFIX'], env['SV_HEADER_SUFFIX'], env['SV_PACKAGE_SUFFIX']]
+    cfgs    = [s for s in source if get_suffix(s) == env['CONFIG_SUFFIX']]
+    preflight(env, target, 'Vivado project sources', check_src_lists,
+              cfgs, env['CFG_PATH'], incpath + [env['BUILD_SRC_PATH']], hdl_sfx)
+    preflight(env, target, 'Vivado project include directories', check_dirs, incpath, 'include directory')
 
     return target
 
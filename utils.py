@@ -15,10 +15,17 @@ import re
 import glob
 import yaml
 import math
+import hashlib
+import pickle
+import threading
+import atexit
+import time
+import functools
 
 import select
 
 from SCons.Script import *
+from remote import RemoteDispatcher, RemoteError, RemoteRunError
 from colorama import Fore, Style
 
 config_search_path = []
@@ -38,7 +45,66 @@ def namegen(fullpath, ext):
     name     = os.path.splitext(basename)[0]
     return name + os.path.extsep + ext
 #-------------------------------------------------------------------------------
-def pexec(cmd, wdir = os.curdir, exec_env=os.environ.copy(), filter=[]):
+#
+#    'remote': RemoteDispatcher (see 'remote_backend') to run command at
+#    build worker, 'manifest': generated scripts and inputs of the command.
+#    Tool run time is accumulated per thread (build task) in 'pexec_time.total'
+#    if it is set, see build schedule
+#
+pexec_time = threading.local()
+
+def pexec(cmd, wdir = os.curdir, exec_env=os.environ.copy(), filter=[], handler=None, remote=None, manifest=[]):
+
+    start = time.time()
+    try:
+        return pexec_run(cmd, wdir, exec_env, filter, handler, remote, manifest)
+
+    finally:
+        if getattr(pexec_time, 'total', None) is not None:
+            pexec_time.total += time.time() - start
+
+#-------------------------------------------------------------------------------
+def pexec_run(cmd, wdir, exec_env, filter, handler, remote, manifest):
+
+    supp = OutputFilter(filter, os.path.join(wdir, 'suppresed-warnings.log')) if filter else None
+
+    def process(out):
+        if handler:
+            for line in out.splitlines(True):
+                handler(line)
+        match = False
+        if supp:
+            match = supp.suppress(out)
+
+            res = supp.summary.search(out)
+            if res:
+                warn = int(res.groups()[1])
+                out  = res.groups()[0] + str(warn - supp.count) + ' (Suppressed warnings: ' + str(supp.count) + ')'
+
+        if not match:
+            print(out.strip())
+
+    try:
+        return pexec_process(cmd, wdir, exec_env, process, remote, manifest)
+
+    finally:
+        if supp:
+            supp.close()
+
+#-------------------------------------------------------------------------------
+def pexec_process(cmd, wdir, exec_env, process, remote, manifest):
+
+    if remote:
+        try:
+            return remote.run(cmd.split(), wdir, exec_env, manifest, process)
+        except RemoteRunError as e:                 # may still run remotely, not restarted
+            print_error('E: remote execution failed: ' + e.msg)
+            print_error('    command: ' + cmd)
+            return -1
+        except RemoteError as e:
+            print_warning('W: remote execution failed: ' + e.msg)
+            print_warning('    run locally: ' + cmd)
+
     p = subprocess.Popen(cmd.split(),
                          cwd = str(wdir),
                          env=exec_env,
@@ -48,7 +114,6 @@ def pexec(cmd, wdir = os.curdir, exec_env=os.environ.copy(), filter=[]):
                          stderr   = subprocess.PIPE,
                          encoding = 'utf8')
 
-    supp_warn = []
     while True:
         rlist, wlist, xlist = select.select([p.stdout, p.stderr], [], [])
         out = ''
@@ -61,31 +126,236 @@ def pexec(cmd, wdir = os.curdir, exec_env=os.environ.copy(), filter=[]):
         if len(out) == 0 and p.poll() is not None:
             break
         if out:
-            match = False
-            if filter:
-                for item in filter:
-                    if re.search(item, out):
-                        supp_warn.append(out)
-                        match = True
-                        break
-
-                res = re.search('(Errors\:\s\d+,\sWarnings\:\s)(\d+)', out)
-                if res:
-                    warn = int(res.groups()[1])
-                    supp_warn_cnt = len(supp_warn)
-                    out = res.groups()[0] + str(warn - supp_warn_cnt) + ' (Suppressed warnings: ' + str(supp_warn_cnt) + ')'
-                    
-                    with open(os.path.join(wdir, 'suppresed-warnings.log'), 'w') as f:
-                        for item in supp_warn:
-                            f.write("%s" % item)                    
-                    
-            if not match:
-                print(out.strip())
+            process(out)
+
+    # output lines buffered by the streams after process termination
+    for stream in [p.stdout, p.stderr]:
+        for out in stream.readlines():
+            process(out)
 
     rcode = p.poll()
     
     return rcode
-    
+
+#-------------------------------------------------------------------------------
+#
+#    Tool output filter. Each rule is indexed by a word which any text
+#    matched by the rule contains as a whole word (e.g. 'vopt' or '2685' in
+#    'Warning: \(vopt-2685\)'), so only rules indexed by the words of an
+#    output line are searched. Rules without such word are compiled into
+#    one alternation of named groups, the group name gives the rule for hit
+#    counts; rules which can't be combined (own group names, backreferences,
+#    global flags) are searched separately. Suppressed lines are appended
+#    to the log as they come
+#
+FILTER_REPORT_MAX = 10                  # rules printed in hit count report
+
+filter_words = re.compile(r'\w+')
+
+#-------------------------------------------------------------------------------
+#
+#    Whole words of the rule: runs of literal word characters between literal
+#    non-word characters at top level of the regex
+#
+def filter_rule_words(rule):
+
+    items = []                          # literal character or None
+    depth = 0
+    i     = 0
+    while i < len(rule):
+        c = rule[i]
+        if c == '\\':
+            nxt = rule[i+1:i+2]
+            if depth == 0:
+                items.append(nxt if nxt and not nxt.isalnum() else None)
+            i += 2
+            continue
+
+        if depth:
+            depth += {'(' : 1, ')' : -1}.get(c, 0)
+            if depth == 0:
+                items.append(None)
+        elif c == '|':
+            return []
+        elif c == '(':
+            depth = 1
+        elif c == '[':
+            j = i + 1
+            j += rule[j:j+1] == '^'
+            j += rule[j:j+1] == ']'
+            while j < len(rule) and rule[j] != ']':
+                j += 2 if rule[j] == '\\' else 1
+            i = j
+            items.append(None)
+        elif c in '*?{':
+            if items:
+                items[-1] = None        # previous item is optional
+            if c == '{':
+                i = rule.find('}', i) if '}' in rule[i:] else len(rule)
+            items.append(None)
+        elif c in '+.^$)':
+            items.append(None)
+        else:
+            items.append(c)
+        i += 1
+
+    words = []
+    word  = None                        # None: word not bounded by literal at left
+    for c in items:
+        if c is not None and (c.isalnum() or c == '_'):
+            if word is not None:
+                word += c
+            continue
+
+        if word and c is not None:
+            words.append(word.lower())
+        word = '' if c is not None else None
+
+    return words
+
+#-------------------------------------------------------------------------------
+#
+#    Rules are (pattern, flags) pairs, rules compiled with flags are
+#    matched separately
+#
+@functools.lru_cache(maxsize=32)
+def compile_filter_rules(rules):
+
+    rule_words = [filter_rule_words(r) if not flags else [] for r, flags in rules]
+    freq       = {}
+    for words in rule_words:
+        for w in set(words):
+            freq[w] = freq.get(w, 0) + 1
+
+    index    = {}                       # { <word> : [<rule index>, ...] }
+    regexes  = {}
+    combined = []
+    separate = []
+    for i, (rule, flags) in enumerate(rules):
+        if rule_words[i]:
+            word = min(rule_words[i], key=lambda w: (freq[w], -len(w)))
+            index.setdefault(word, []).append(i)
+            regexes[i] = re.compile(rule)
+        elif flags or re.search(r'\(\?P[<=]|\\\d|\(\?\(|^\(\?[aiLmsux]+\)', rule):
+            separate.append((i, re.compile(rule, flags)))
+        else:
+            re.compile(rule)                            # bad rule is reported as is
+            combined.append('(?P<r' + str(i) + '>' + rule + ')')
+
+    regex = re.compile('|'.join(combined)) if combined else None
+
+    return index, regexes, regex, separate
+
+#-------------------------------------------------------------------------------
+class OutputFilter:
+
+    summary = re.compile(r'(Errors\:\s\d+,\sWarnings\:\s)(\d+)')
+
+    logs      = set()               # log paths in use by running commands
+    logs_lock = threading.Lock()
+
+    def __init__(self, rules, log_path):
+        rules         = [(r, 0) if isinstance(r, str) else (r.pattern, r.flags & ~re.UNICODE) for r in rules]
+        self.rules    = [r for r, flags in rules]
+        self.index, self.regexes, self.regex, self.separate = compile_filter_rules(tuple(rules))
+        self.log_path = os.path.abspath(log_path)
+        self.log      = None
+        self.count    = 0
+        self.hits     = {}
+
+    #-----------------------------------------------------------------
+    def match(self, text):
+        candidates = []
+        for w in set(filter_words.findall(text.lower())):
+            candidates += self.index.get(w, [])
+
+        for i in sorted(candidates):
+            if self.regexes[i].search(text):
+                return i
+
+        if self.regex:
+            m = self.regex.search(text)
+            if m:
+                return int(m.lastgroup[1:])
+
+        for i, regex in self.separate:
+            if regex.search(text):
+                return i
+
+        return None
+
+    #-----------------------------------------------------------------
+    def suppress(self, text):
+        rule = self.match(text)
+        if rule is None:
+            return False
+
+        if not self.log:
+            self.log = open(self.reserve_log(), 'w')
+        self.log.write(text)
+
+        self.count     += 1
+        self.hits[rule] = self.hits.get(rule, 0) + 1
+
+        return True
+
+    #-----------------------------------------------------------------
+    #
+    #    Commands run concurrently in the same directory get numbered
+    #    log files instead of overwriting each other's one
+    #
+    def reserve_log(self):
+        base, ext = os.path.splitext(self.log_path)
+        with OutputFilter.logs_lock:
+            n = 0
+            while self.log_path in OutputFilter.logs:
+                n += 1
+                self.log_path = base + '-' + str(n) + ext
+            OutputFilter.logs.add(self.log_path)
+
+        return self.log_path
+
+    #-----------------------------------------------------------------
+    def close(self):
+        if not self.log:
+            return
+
+        self.log.close()
+        self.log = None
+        with OutputFilter.logs_lock:
+            OutputFilter.logs.discard(self.log_path)
+
+        hits = sorted(self.hits.items(), key=lambda h: (-h[1], h[0]))
+        print_info('suppressed warnings: ' + str(self.count) + ' by ' + str(len(hits)) + ' of ' +
+                   str(len(self.rules)) + ' filter rules, see ' + self.log_path)
+        for rule, count in hits[:FILTER_REPORT_MAX]:
+            print_info('    ' + '{:8d}'.format(count) + '  ' + self.rules[rule])
+        if len(hits) > FILTER_REPORT_MAX:
+            print_info('    ... ' + str(len(hits) - FILTER_REPORT_MAX) + ' more rules')
+
+#-------------------------------------------------------------------------------
+#
+#    Remote execution backend for heavy tool runs: REMOTE_WORKERS holds
+#    '<host>[:<port>[:<capacity>]]' items, empty list means local execution
+#
+remote_dispatchers      = {}
+remote_dispatchers_lock = threading.Lock()
+
+def remote_backend(env):
+    workers = env.get('REMOTE_WORKERS')
+    if not workers:
+        return None
+
+    if not SCons.Util.is_List(workers):
+        workers = workers.split()
+
+    key = (tuple(workers), env.get('REMOTE_TOKEN', ''))
+    with remote_dispatchers_lock:
+        if key not in remote_dispatchers:
+            remote_dispatchers[key] = RemoteDispatcher(workers, key[1])
+
+        return remote_dispatchers[key]
+
 #-------------------------------------------------------------------------------
 def cexec(cmd, wdir = os.curdir, exec_env=os.environ.copy()):
     p = subprocess.Popen(cmd.split(), 
@@ -180,9 +450,177 @@ def add_check_exclude_path(path):
     else:
         check_exclude_path.append(path)
 
+#-------------------------------------------------------------------------------
+#
+#    Persistent snapshot of evaluated configs and resolved source lists
+#
+#    Each entry holds pickled result and stat signatures of all files
+#    probed while the result was computed (including missing ones on
+#    search paths), so the entry is valid while none of them has changed.
+#    Results depending on inputs which are not files (imported Python
+#    modules, '=' expressions) are marked volatile and never stored. Only
+#    entries used during current run are saved at exit.
+#
+class ConfigSnapshot:
+
+    VERSION  = 1
+    VOLATILE = '<volatile>'
+
+    def __init__(self):
+        self.path    = None
+        self.pending = None
+        self.entries = {}
+        self.used    = set()
+        self.dirty   = False
+        self.lock    = threading.Lock()
+        self.local   = threading.local()
+        self.hits    = 0
+        self.misses  = 0
+        atexit.register(self.save)
+
+    #-----------------------------------------------------------------
+    #
+    #    'path' may be a callable, then it is called to get the path at
+    #    first use of the snapshot
+    #
+    def open(self, path):
+        if callable(path):
+            self.pending = path
+            return
+
+        self.pending = None
+        if path == self.path:
+            return
+
+        self.save()
+        self.path    = path
+        self.entries = {}
+        self.used    = set()
+        self.dirty   = False
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, 'rb') as f:
+                version, entries = pickle.load(f)
+            if version == (self.VERSION, sys.version_info[:2]):
+                self.entries = entries
+        except Exception:
+            pass
+
+    #-----------------------------------------------------------------
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+
+        entries = { k : self.entries[k] for k in self.used if k in self.entries }
+        tmp = self.path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, 'wb') as f:
+                pickle.dump(((self.VERSION, sys.version_info[:2]), entries), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.path)
+            self.dirty = False
+        except OSError:
+            pass
+
+    #-----------------------------------------------------------------
+    @staticmethod
+    def signature(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    #-----------------------------------------------------------------
+    def recorders(self):
+        if not hasattr(self.local, 'recorders'):
+            self.local.recorders = []
+        return self.local.recorders
+
+    #-----------------------------------------------------------------
+    def track(self, path):
+        recorders = self.recorders()
+        if recorders:
+            sig = self.signature(path)
+            for r in recorders:
+                r[path] = sig
+
+    #-----------------------------------------------------------------
+    #
+    #    Result being computed depends on inputs not tracked by stat
+    #    signatures, so it and all enclosing results are not stored
+    #
+    def volatile(self):
+        for r in self.recorders():
+            r[self.VOLATILE] = None
+
+    #-----------------------------------------------------------------
+    def valid(self, deps):
+        for path in deps:
+            if self.signature(path) != deps[path]:
+                return False
+        return True
+
+    #-----------------------------------------------------------------
+    #
+    #    Returns result of 'func(*args)' from snapshot or computes and stores it
+    #
+    def cached(self, key, func, *args):
+        if self.pending:
+            with self.lock:
+                if self.pending:
+                    self.open(self.pending())
+
+        if not self.path:
+            return func(*args)
+
+        entry = self.entries.get(key)
+        if entry and self.valid(entry[1]):
+            with self.lock:
+                self.used.add(key)
+                self.hits += 1
+            for r in self.recorders():          # propagate dependencies to enclosing calls
+                r.update(entry[1])
+            return pickle.loads(entry[0])
+
+        deps = {}
+        self.recorders().append(deps)
+        try:
+            res = func(*args)
+        finally:
+            self.recorders().pop()
+
+        for r in self.recorders():
+            r.update(deps)
+
+        if self.VOLATILE in deps:
+            return res
+
+        try:
+            data = pickle.dumps(res, pickle.HIGHEST_PROTOCOL)
+        except Exception:                       # not serializable, e.g. evaluated to object
+            return res
+
+        with self.lock:
+            self.entries[key] = (data, deps)
+            self.used.add(key)
+            self.misses += 1
+            self.dirty = True
+
+        return pickle.loads(data)
+
+config_snapshot = ConfigSnapshot()
+
+#-------------------------------------------------------------------------------
+def open_config_snapshot(path):
+    config_snapshot.open(path)
+
 #-------------------------------------------------------------------------------
 def search_file(fn, search_path=[]):
     
+    config_snapshot.track(fn)
     if os.path.exists(fn):
         return os.path.abspath(fn)
         
@@ -193,6 +631,7 @@ def search_file(fn, search_path=[]):
     
     for p in spath:
         path = os.path.join(p, fn)
+        config_snapshot.track(path)
         if os.path.exists(path):
             return os.path.abspath(path)
     
@@ -202,6 +641,136 @@ def search_file(fn, search_path=[]):
     
     raise SearchFileException(msg)
 
+#-------------------------------------------------------------------------------
+#
+#    Shared cache of parsed YAML documents, validated by file stat
+#    signature. Documents are shared, so callers must not modify them
+#
+yaml_docs      = {}
+yaml_docs_lock = threading.Lock()
+dir_listings   = {}
+
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)     # libyaml based loader if available
+
+def load_yaml(path):
+    path = os.path.abspath(path)
+    sig  = ConfigSnapshot.signature(path)
+    item = yaml_docs.get(path)
+    if item and item[0] == sig:
+        return item[1]
+
+    with open(path) as f:
+        doc = yaml.load(f, Loader=YamlLoader)
+
+    with yaml_docs_lock:
+        yaml_docs[path] = (sig, doc)
+
+    return doc
+
+#-------------------------------------------------------------------------------
+#
+#    Fast read of top-level plain scalar values (e.g. 'import', 'type',
+#    'usedin') without construction of the whole document. Falls back
+#    to full load if a requested value is not a single-line plain scalar
+#    or a top-level key is quoted or complex
+#
+yaml_top_key_pattern = re.compile(r'^([\w\-]+)[ \t]*:(?:[ \t]+(.*?))?[ \t]*(?:[ \t]#.*)?$')
+
+def yaml_top_keys(path, keys):
+
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    res = {}
+    for n, line in enumerate(lines):
+        if line[:1] in ['\'', '"', '?']:
+            cfg = load_yaml(path)
+            return { k : cfg[k] for k in keys if isinstance(cfg, dict) and k in cfg }
+
+        if not line[:1].isalpha() and line[:1] != '_':
+            continue
+        m = yaml_top_key_pattern.match(line)
+        if not m or m.group(1) not in keys:
+            continue
+
+        value = m.group(2)
+        cont  = n + 1 < len(lines) and lines[n + 1][:1].isspace() and lines[n + 1].strip()[:1] not in ['', '#']
+        if not value or value[0] in '|>\'"[{&*!%@`' or cont:
+            cfg = load_yaml(path)
+            return { k : cfg[k] for k in keys if isinstance(cfg, dict) and k in cfg }
+
+        res[m.group(1)] = None if value in ['~', 'null', 'Null', 'NULL'] else value
+
+    return res
+
+#-------------------------------------------------------------------------------
+#
+#    Names of directory entries, listed again only if directory mtime has
+#    changed (e.g. configs generated into a search path during the build)
+#
+def dir_entries(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return set()
+
+    item = dir_listings.get(path)
+    if item and item[0] == mtime:
+        return item[1]
+
+    try:
+        entries = set(os.listdir(path))
+    except OSError:
+        entries = set()
+    dir_listings[path] = (mtime, entries)
+
+    return entries
+
+#-------------------------------------------------------------------------------
+class ConfigImportException(SearchFileException):
+    pass
+
+#-------------------------------------------------------------------------------
+#
+#    Transitive closure of config imports in depth-first order, imported
+#    files are looked up at 'search_path' directories
+#
+def config_imports(path, search_path, suffix='yml'):
+
+    closure = []
+    done    = set()
+
+    def visit(path, chain):
+        cfg = yaml_top_keys(path, ['import'])
+        if not cfg.get('import'):
+            return
+
+        for i in cfg['import'].split():
+            fn = i + '.' + suffix
+            for d in search_path:
+                if fn in dir_entries(d):
+                    imp_path = os.path.join(d, fn)
+                    break
+            else:
+                raise ConfigImportException('import config file ' + fn + ' not found' + os.linesep +
+                                            '    raised during processing "' + path + '"')
+
+            if imp_path in chain:
+                cycle = chain[chain.index(imp_path):] + [imp_path]
+                raise ConfigImportException('import cycle detected:' + os.linesep +
+                                            os.linesep.join(['    ' + c for c in cycle]))
+            if imp_path in done:
+                continue
+
+            done.add(imp_path)
+            closure.append(imp_path)
+            visit(imp_path, chain + [imp_path])
+
+    path = os.path.abspath(path)
+    visit(path, [path])
+
+    return closure
+
 #-------------------------------------------------------------------------------
 class ConfigDict(object):
 
@@ -233,6 +802,7 @@ def eval_cfg_dict(cfg_file_path: str, cfg_dict: dict, imps=None) -> dict:
         try:
             try:
                 if 'import_python' in key:
+                    config_snapshot.volatile()
                     mods = cfg_dict[key].split()
                     for mod in mods:
                         exec('import ' + mod)
@@ -263,6 +833,7 @@ def eval_cfg_dict(cfg_file_path: str, cfg_dict: dict, imps=None) -> dict:
                 
             if isinstance(cfg_dict[key], str):
                 if cfg_dict[key] and cfg_dict[key][0] == '=':
+                    config_snapshot.volatile()              # may use environment, time, Python modules
                     expr = cfg_dict[key][1:];
                     try:
                         cfg_dict[key] = eval(expr)            # evaluate new dict value
@@ -290,27 +861,56 @@ def eval_cfg_dict(cfg_file_path: str, cfg_dict: dict, imps=None) -> dict:
 
     return cfg_dict
 
+#-------------------------------------------------------------------------------
+def snapshot_key(*args):
+    args = [tuple(a) if SCons.Util.is_List(a) else a for a in args]
+    return tuple(args) + (tuple(config_search_path), os.getcwd())
+
 #-------------------------------------------------------------------------------
 def read_config(fn: str, param_sect='parameters', search_path=[]):
+    key = snapshot_key('read_config', fn, param_sect, search_path)
+    return config_snapshot.cached(key, eval_config, fn, param_sect, search_path)
+
+#-------------------------------------------------------------------------------
+def eval_config(fn: str, param_sect='parameters', search_path=[]):
 
     path = search_file(fn, search_path)
-    #path = search_file(fn)
-    with open( path ) as f:
-        cfg = yaml.safe_load(f)
-        
+    cfg  = load_yaml(path)
+
+    chain = config_chain()
+    if path in chain:
+        cycle = chain[chain.index(path):] + [path]
+        raise ConfigImportException('import cycle detected:' + os.linesep +
+                                    os.linesep.join(['    ' + c for c in cycle]))
+
     imps = {}
     if 'import' in cfg and cfg['import']:
         imports = cfg['import'].split()
 
-        for i in imports:
-            imp_fn = i + '.yml'                         # file name of imported data
-            imps[i] = read_config(imp_fn, search_path=search_path)
+        chain.append(path)
+        try:
+            for i in imports:
+                imp_fn = i + '.yml'                     # file name of imported data
+                imps[i] = read_config(imp_fn, search_path=search_path)
+        finally:
+            chain.pop()
                 
-    params = cfg[param_sect]
+    params = dict(cfg[param_sect])              # parsed document is shared
     params = eval_cfg_dict(path, params, imps)
 
     return params
 
+#-------------------------------------------------------------------------------
+#
+#    Configs being evaluated by current thread, outermost first
+#
+config_chains = threading.local()
+
+def config_chain():
+    if not hasattr(config_chains, 'chain'):
+        config_chains.chain = []
+    return config_chains.chain
+
 #-------------------------------------------------------------------------------
 def import_config(fn: str, search_path=[]):
     return ConfigDict( read_config(fn, 'parameters', search_path) )
@@ -319,9 +919,8 @@ def read_ip_config(fn, param_sect, search_path=[]):
 
     cfg_params = read_config(fn, param_sect, search_path)
     
-    with open( search_file(fn) ) as f:
-        cfg = yaml.safe_load(f)
-        
+    cfg = load_yaml( search_file(fn) )
+
     ip_cfg = {}
     ip_cfg['type']     = cfg['type']
     ip_cfg[param_sect] = cfg_params
@@ -332,9 +931,7 @@ def read_ip_config(fn, param_sect, search_path=[]):
 def read_src_list(fn: str, search_path=[]):
 
     path = search_file(fn, search_path)
-    
-    with open( path ) as f:
-        cfg = yaml.safe_load(f)
+    cfg  = load_yaml(path)
     
     if 'parameters' in cfg:
         params = read_config(fn, 'parameters', search_path)
@@ -369,8 +966,26 @@ def read_src_list(fn: str, search_path=[]):
 #    args[1], if specified, forces return 'usedin' attribute
 #
 def read_sources(fn, search_path='', get_usedin = False):
+    key = snapshot_key('read_sources', fn, search_path, get_usedin,
+                       tuple(check_exclude_path), os.path.abspath(str(Dir('#'))))
+    return config_snapshot.cached(key, resolve_sources, fn, search_path, get_usedin)
+
+#-------------------------------------------------------------------------------
+def source_prefix_path(search_path=''):
+    return [search_path, os.getcwd()] + get_search_path() + [os.path.abspath(str(Dir('#')))]
+
+#-------------------------------------------------------------------------------
+def source_excluded(path):
+    for exdir in check_exclude_path:
+        if exdir in path:
+            return True
+
+    return False
+
+#-------------------------------------------------------------------------------
+def resolve_sources(fn, search_path='', get_usedin = False):
     
-    prefix_path = [search_path, os.getcwd()] + get_search_path() + [os.path.abspath(str(Dir('#')))]
+    prefix_path = source_prefix_path(search_path)
     src, usedin, fn_path = read_src_list(fn, search_path)
     
     path_list = []
@@ -379,19 +994,14 @@ def read_sources(fn, search_path='', get_usedin = False):
             path_exists = False
             for pp in prefix_path:
                 path = os.path.abspath( os.path.join(pp, s) )
+                config_snapshot.track(path)
                 if os.path.exists(path):
                     path_list.append(path)
                     path_exists = True
                     break
               
             if not path_exists:
-                ignore = False
-                for exdir in check_exclude_path:
-                    if exdir in s:
-                        ignore = True
-                        break
-                    
-                if not ignore:
+                if not source_excluded(s):
                     print_error('E: file at relative path "' + s + '" not exists')
                     print_error('    detected while processing "' + fn_path +'"')
                     print(prefix_path)
@@ -412,9 +1022,8 @@ def get_dirs(flist):
 def prefix_suffix(fn, params):
     prefix = ''
     suffix = ''
-    with open( fn ) as f:
-        cfg = yaml.safe_load(f)
-        
+    cfg = load_yaml(fn)
+
     if 'options' in cfg:
         opt = cfg['options']
         if 'prefix' in opt:
@@ -431,6 +1040,32 @@ def prefix_suffix(fn, params):
     else:
         return params
     
+#-------------------------------------------------------------------------------
+#
+#    Evaluate parameters of single config file with prefix/suffix applied,
+#    the file is parsed once (see 'load_yaml')
+#
+def eval_cfg_file(path):
+    return prefix_suffix(path, read_config(path))
+
+#-------------------------------------------------------------------------------
+#
+#    Config evaluation pool worker: search paths are passed from the parent
+#    process, exit on config error is returned as exit code (error is
+#    already printed by the worker)
+#
+def init_cfg_eval_worker(search_path, exclude_path):
+    add_search_path(search_path)
+    add_check_exclude_path(exclude_path)
+
+#-------------------------------------------------------------------------------
+def eval_cfg_worker(path):
+    try:
+        return None, eval_cfg_file(path)
+
+    except SystemExit as e:
+        return e.code if e.code is not None else -1, None
+
 #-------------------------------------------------------------------------------
 def version_number(path):
     pattern = '(\d+)\.\d$'
@@ -441,6 +1076,48 @@ def version_number(path):
 def get_suffix(path):
     return os.path.splitext(path)[1][1:]
 
+#-------------------------------------------------------------------------------
+#
+#    Generated text emitter: parts are collected in a list and joined once,
+#    'text += part' appends part
+#
+class Emitter:
+
+    def __init__(self, *parts):
+        self.parts = list(parts)
+
+    def __iadd__(self, part):
+        self.parts.append(part)
+        return self
+
+    #-----------------------------------------------------------------
+    def line(self, text='', n=1):
+        self.parts.append(text + os.linesep*n)
+
+    #-----------------------------------------------------------------
+    def lines(self, items, prefix='', suffix=''):
+        self.parts.extend([prefix + i + suffix + os.linesep for i in items])
+
+    #-----------------------------------------------------------------
+    #
+    #    Name/value lines, value column starts at precomputed 'width'
+    #
+    def aligned(self, items, width, prefix='', sep='', suffix=''):
+        self.parts.extend([prefix + name + ' '*(width - len(name)) + sep + value + suffix + os.linesep
+                           for name, value in items])
+
+    #-----------------------------------------------------------------
+    def title(self, text, comment):
+        self.parts.append(generate_title(text, comment))
+
+    #-----------------------------------------------------------------
+    def footer(self, comment):
+        self.parts.append(generate_footer(comment))
+
+    #-----------------------------------------------------------------
+    def text(self) -> str:
+        return ''.join(self.parts)
+
 #-------------------------------------------------------------------------------
 def generate_title(text: str, comment: str) -> str:
     
@@ -493,4 +1170,41 @@ def create_dirs(dirs):
             Execute( Mkdir(i) )
     
 #-------------------------------------------------------------------------------
+#
+#    Atomically write generated file if its contents changed, otherwise
+#    the file (and its mtime) is left intact. Returns True if written
+#
+def write_if_changed(path: str, text: str) -> bool:
+    try:
+        with open(path) as f:
+            if f.read() == text:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
 
+    tmp = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+    with open(tmp, 'w') as ofile:
+        ofile.write(text)
+    os.replace(tmp, path)
+
+    return True
+
+#-------------------------------------------------------------------------------
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+#-------------------------------------------------------------------------------
+def text_digest(items) -> str:
+    h = hashlib.sha256()
+    for i in items:
+        h.update(str(i).encode('utf8'))
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+#-------------------------------------------------------------------------------
@@ -0,0 +1,124 @@
+#*******************************************************************************
+#*
+#*    Config YAML read benchmark
+#*
+#*        python3 yaml_bench.py [--count N] [--keys N] [--repeat N]
+#*
+#*    Generates synthetic configs with imports (some of them with quoted
+#*    keys or block values, which take the full parse path) in a temporary
+#*    directory and compares 'import' lookup by yaml.safe_load, by the
+#*    loader used by 'load_yaml' and by 'yaml_top_keys'. Lookup results of
+#*    all methods are checked to be equal.
+#*
+#*******************************************************************************
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import YamlLoader, yaml_top_keys
+
+#-------------------------------------------------------------------------------
+def generate_configs(root, count, keys):
+
+    paths = []
+    for i in range(count):
+        lines = []
+        if i % 50 == 7:
+            lines.append('\'import\': cfg_' + str(i - 1))
+        elif i % 50 == 9:
+            lines.append('import: >')
+            lines.append('    cfg_' + str(i - 1) + ' cfg_' + str(i - 2))
+        elif i:
+            lines.append('import: cfg_' + str(i - 1) + (' cfg_' + str(i // 2) if i > 2 else ''))
+
+        lines.append('# parameters of module ' + str(i))
+        lines.append('parameters:')
+        for k in range(keys):
+            if k % 3 == 0:
+                lines.append('    P' + str(k) + ' : ' + str(k * i))
+            elif k % 3 == 1:
+                lines.append('    P' + str(k) + ' : "name_' + str(k) + '"      # comment')
+            else:
+                lines.append('    P' + str(k) + ' : =P' + str(k - 2) + '*2')
+
+        path = os.path.join(root, 'cfg_' + str(i) + '.yml')
+        with open(path, 'w') as f:
+            f.write(os.linesep.join(lines) + os.linesep)
+        paths.append(path)
+
+    return paths
+
+#-------------------------------------------------------------------------------
+def best_time(func, paths, repeat):
+
+    best = None
+    for r in range(repeat):
+        start = time.perf_counter()
+        res   = [func(p) for p in paths]
+        t     = time.perf_counter() - start
+        best  = t if best is None else min(best, t)
+
+    return best, res
+
+#-------------------------------------------------------------------------------
+def safe_load_import(path):
+    with open(path) as f:
+        return yaml.safe_load(f).get('import')
+
+#-------------------------------------------------------------------------------
+def loader_import(path):
+    with open(path) as f:
+        return yaml.load(f, Loader=YamlLoader).get('import')
+
+#-------------------------------------------------------------------------------
+def top_keys_import(path):
+    return yaml_top_keys(path, ['import']).get('import')
+
+#-------------------------------------------------------------------------------
+def main(argv):
+
+    parser = argparse.ArgumentParser(description='Config YAML read benchmark')
+    parser.add_argument('--count',  type=int, default=600, help='number of configs')
+    parser.add_argument('--keys',   type=int, default=45,  help='parameters per config')
+    parser.add_argument('--repeat', type=int, default=3,   help='runs, best one is reported')
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='yaml-bench-')
+    try:
+        paths   = generate_configs(root, args.count, args.keys)
+        methods = [('yaml.safe_load',          safe_load_import),
+                   (YamlLoader.__name__,       loader_import),
+                   ('yaml_top_keys(\'import\')', top_keys_import)]
+
+        print(str(args.count) + ' configs, ' + str(args.keys) + ' keys each, best of ' + str(args.repeat) +
+              ' runs, PyYAML ' + yaml.__version__)
+        results = []
+        for name, func in methods:
+            t, res = best_time(func, paths, args.repeat)
+            results.append(res)
+            print('  ' + name.ljust(26) + '%.3f s' % t)
+
+    finally:
+        shutil.rmtree(root)
+
+    if any(r != results[0] for r in results[1:]):
+        print('E: \'import\' values differ between methods')
+        return 1
+
+    print('\'import\' values are the same for all methods')
+
+    return 0
+
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
+
+#-------------------------------------------------------------------------------